@@ -0,0 +1,145 @@
+"""Benchmark of the latency of the request listings as the number of requests grows.
+
+The benchmark runs against a temporary sqlite database (the database of the server is
+not touched) and reports, for every number of requests N, the time and number of SQL
+queries used by `Engine.get_all_requests` and `Engine.get_pending_requests`. For
+comparison it also reports the cost of hydrating the same rows by lazy loading the
+quantity and methods of every request, which is the N+1 pattern the listings used to
+follow.
+
+Usage:
+    python benchmarks/request_listing_benchmark.py --sizes 100 1000 10000
+"""
+
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import click
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import lazyload
+
+from FINALES2.db import Base
+from FINALES2.db import Request as DbRequest
+from FINALES2.db import session as db_session
+from FINALES2.engine.main import Engine
+from FINALES2.engine.server_manager import ServerManager
+from FINALES2.server.schemas import Request, RequestInfo
+
+SPECIFICATIONS = {
+    "type": "object",
+    "properties": {"temperature": {"type": "number"}},
+    "required": ["temperature"],
+}
+
+
+class QueryCounter:
+    """Counts the SQL statements executed through an engine."""
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+
+def populate(engine: Engine, number_of_requests: int):
+    """Adds the capabilities and the requests to the benchmark database."""
+    server_manager = ServerManager(database_context=db_session.get_db)
+    for method in ["method1", "method2"]:
+        server_manager.add_capability(
+            {
+                "quantity": "benchmark_quantity",
+                "method": method,
+                "json_schema_specifications": SPECIFICATIONS,
+                "json_schema_result_output": {},
+                "is_active": True,
+            }
+        )
+
+    tenant_uuid = str(uuid.uuid4())
+    batch_size = 1000
+    for batch_start in range(0, number_of_requests, batch_size):
+        batch_end = min(batch_start + batch_size, number_of_requests)
+        engine.create_requests(
+            [
+                Request(
+                    quantity="benchmark_quantity",
+                    methods=["method1", "method2"],
+                    parameters={
+                        "method1": {"temperature": index},
+                        "method2": {"temperature": index},
+                    },
+                    tenant_uuid=tenant_uuid,
+                )
+                for index in range(batch_start, batch_end)
+            ]
+        )
+
+
+def lazy_listing():
+    """Hydrates all requests lazily loading their quantity and methods (N+1)."""
+    query_inp = select(DbRequest).options(lazyload("*"))
+    with db_session.get_db() as session:
+        query_out = session.execute(query_inp).all()
+        return [RequestInfo.from_db_request(request) for (request,) in query_out]
+
+
+def measure(function, counter: QueryCounter):
+    """Returns the number of rows, time and number of queries used by a function."""
+    counter.count = 0
+    start = time.perf_counter()
+    rows = function()
+    elapsed = time.perf_counter() - start
+    return len(rows), elapsed, counter.count
+
+
+@click.command()
+@click.option(
+    "--sizes",
+    type=int,
+    multiple=True,
+    default=[100, 1000, 10000],
+    show_default=True,
+    help="Numbers of requests to benchmark (may be used multiple times).",
+)
+@click.option(
+    "--skip-lazy",
+    is_flag=True,
+    help="Skip the N+1 comparison, which is slow for large numbers of requests.",
+)
+def main(sizes, skip_lazy):
+    """Benchmark the request listings for growing numbers of requests."""
+    finales_engine = Engine()
+    listings = {
+        "all_requests": lambda: finales_engine.get_all_requests()[0],
+        "pending_requests": lambda: finales_engine.get_pending_requests()[0],
+    }
+    if not skip_lazy:
+        listings["lazy (N+1)"] = lazy_listing
+
+    click.echo(f"{'N':>8} {'listing':>18} {'rows':>8} {'time [s]':>10} {'queries':>8}")
+    for number_of_requests in sizes:
+        with tempfile.TemporaryDirectory() as tmp_dirpath:
+            db_path = Path(tmp_dirpath) / "benchmark.db"
+            engine = create_engine(
+                f"sqlite:///{db_path}", connect_args={"check_same_thread": False}
+            )
+            Base.metadata.create_all(bind=engine)
+            db_session.SessionLocal.configure(bind=engine)
+            populate(finales_engine, number_of_requests)
+
+            counter = QueryCounter(engine)
+            for name, listing in listings.items():
+                rows, elapsed, queries = measure(listing, counter)
+                click.echo(
+                    f"{number_of_requests:>8} {name:>18} {rows:>8} "
+                    f"{elapsed:>10.3f} {queries:>8}"
+                )
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ import json
 import click
 
 from FINALES2.db import Base
+from FINALES2.db.migrate import migrate_database
 from FINALES2.db.session import engine, get_db
 from FINALES2.engine.server_manager import ServerManager
 
@@ -22,6 +23,19 @@ def db_init():
         click.echo(f"   {table.name}")
 
 
+@cli_db.command("migrate")
+def db_migrate():
+    "Update the tables, columns and indexes of an existing database, keeping its data"
+    changes = migrate_database(engine)
+    if len(changes) == 0:
+        click.echo("The database is already up to date.")
+        return
+
+    click.echo("Applied the following changes to the database:")
+    for change in changes:
+        click.echo(f"   {change}")
+
+
 @cli_db.group("add")
 def cli_add():
     """Commands to add data to the database."""
@@ -55,6 +69,50 @@ def db_add_user(username, password, usergroup):
     click.echo(message)
 
 
+@click.argument(
+    "username",
+    type=str,
+)
+@click.option(
+    "--description",
+    type=str,
+    default="",
+    help="What the API key is used for, e.g. the name of the instrument.",
+)
+@cli_add.command("api-key")
+def db_add_api_key(username, description):
+    """Add an API key for an existing user.
+
+    The API key can be used as the bearer token instead of logging in. Only a hash of
+    it (keyed with the secret_key of the configuration) is stored, so it is only shown
+    once, and changing the secret_key invalidates all API keys."""
+    from FINALES2.user_management.user_manager import new_api_key
+
+    message = new_api_key(username=username, description=description)
+    click.echo(message)
+
+
+@cli_db.group("revoke")
+def cli_revoke():
+    """Commands to revoke access to the server."""
+
+
+@click.argument(
+    "api_key",
+    type=str,
+)
+@cli_revoke.command("api-key")
+def db_revoke_api_key(api_key):
+    """Revoke an API key, given either the key or its hash (see get api-keys).
+
+    A running server may still accept the API key for up to user_cache_ttl_s seconds
+    (see the configuration)."""
+    from FINALES2.user_management.user_manager import revoke_api_key
+
+    message = revoke_api_key(api_key=api_key)
+    click.echo(message)
+
+
 @click.option(
     "--input-filepath",
     required=True,
@@ -147,7 +205,7 @@ def db_alter_tenant_state(input_uuid, input_boolean):
 
 @cli_db.group("get")
 def cli_retrieve():
-    """Commands to retrieve information on tenants."""
+    """Commands to retrieve information on tenants and API keys."""
 
 
 @click.option(
@@ -163,3 +221,21 @@ def db_retrieve_tenant_specification(input_name=None):
 
     server_manager = ServerManager(database_context=get_db)
     server_manager.retrieve_tenant_uuid(input_name)
+
+
+@click.option(
+    "--username",
+    required=False,
+    type=str,
+    help="Only list the API keys of this user.",
+)
+@cli_retrieve.command("api-keys")
+def db_retrieve_api_keys(username=None):
+    "List the hash, user, description and creation time of all (or a user's) API keys"
+    from FINALES2.user_management.user_manager import all_api_keys
+
+    for api_key in all_api_keys(username=username):
+        click.echo(
+            f"{api_key['key_hash']}   {api_key['username']}   "
+            f"{api_key['description']}   {api_key['timestamp_added']}"
+        )
@@ -2,7 +2,11 @@ import click
 import uvicorn
 from fastapi import Depends, FastAPI
 
+from FINALES2.config import install_reload_signal_handler
+from FINALES2.engine.capability_registry import capability_registry
+from FINALES2.server.background import lifespan
 from FINALES2.server.endpoints import operations_router
+from FINALES2.server.middleware import query_statistics_middleware
 from FINALES2.user_management import user_manager
 from FINALES2.user_management.classes_user_manager import User
 
@@ -36,13 +40,17 @@ def cli_server():
 def server_start(ip, port):
     """Start the finales server with given ip and host."""
     logger.info("Starting FINALES server")
+    install_reload_signal_handler()
+    capability_registry.load()
     app = FastAPI(
         title="FINALES2",
         description="FINALES2 accepting requests, managing queues and serving queries",
         version="0.0.1",
+        lifespan=lifespan,
     )
     app.include_router(router=user_manager.user_router)
     app.include_router(router=operations_router)
+    app.middleware("http")(query_statistics_middleware)
 
     @app.get("/")
     def Hello(token: User = Depends(user_manager.get_active_user)):
@@ -4,6 +4,7 @@ from .tables.link_quantity_result import LinkQuantityResult
 from .tables.quantities import Quantity
 from .tables.requests import Request
 from .tables.results import Result
+from .tables.status_counters import StatusCounter
 from .tables.status_log_requests import StatusLogRequest
 from .tables.status_log_results import StatusLogResult
 from .tables.tenants import Tenant
@@ -18,4 +19,5 @@ __all__ = [
     "LinkQuantityResult",
     "StatusLogRequest",
     "StatusLogResult",
+    "StatusCounter",
 ]
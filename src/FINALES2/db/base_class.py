@@ -2,6 +2,7 @@
 
 from typing import Any
 
+from sqlalchemy import MetaData
 from sqlalchemy.ext.declarative import as_declarative, declared_attr
 
 # Declarative system provided by the SQLAlchemy ORM in order to define classes mapped to
@@ -12,6 +13,7 @@ from sqlalchemy.ext.declarative import as_declarative, declared_attr
 class Base:
     id: Any
     __name__: str
+    metadata: MetaData
 
     # to generate tablename from classname
     @declared_attr
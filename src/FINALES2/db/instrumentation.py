@@ -0,0 +1,77 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Generator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from FINALES2.logging.logger import loggerConfig
+
+logger = loggerConfig().get_logger()
+
+
+class QueryStatistics:
+    """Number and duration of the SQL statements executed within a unit of work."""
+
+    def __init__(self):
+        """Initializes the statistics without any statements."""
+        self.count = 0
+        self.total_duration_s = 0.0
+        self.max_duration_s = 0.0
+
+    def record(self, duration_s: float):
+        """Adds an executed statement to the statistics."""
+        self.count += 1
+        self.total_duration_s += duration_s
+        self.max_duration_s = max(self.max_duration_s, duration_s)
+
+
+# The statistics of the unit of work (e.g. HTTP request) currently being processed
+_current_statistics: ContextVar[Optional[QueryStatistics]] = ContextVar(
+    "query_statistics", default=None
+)
+
+
+@contextmanager
+def track_queries() -> Generator[QueryStatistics, None, None]:
+    """Collects the statistics of the statements executed within the context.
+
+    The statistics are kept in a context variable, so the statements executed by
+    concurrent HTTP requests (or threads started from them) are counted separately.
+    """
+    statistics = QueryStatistics()
+    token = _current_statistics.set(statistics)
+    try:
+        yield statistics
+    finally:
+        _current_statistics.reset(token)
+
+
+def instrument_engine(engine: Engine, slow_query_threshold_ms: float):
+    """Adds the listeners timing every statement executed through the engine.
+
+    The duration of every statement is added to the statistics of the current unit of
+    work (see `track_queries`), and statements slower than the threshold are logged
+    together with their parameters.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        """Stores the start time of the statement in the connection."""
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def stop_timer(conn, cursor, statement, parameters, context, executemany):
+        """Records the duration of the statement."""
+        duration_s = time.perf_counter() - conn.info["query_start_time"].pop()
+
+        statistics = _current_statistics.get()
+        if statistics is not None:
+            statistics.record(duration_s)
+
+        if duration_s * 1000 >= slow_query_threshold_ms:
+            logger.warning(
+                f"Slow query ({duration_s * 1000:.1f} ms): {statement} "
+                f"[parameters: {parameters}]"
+            )
@@ -0,0 +1,76 @@
+from typing import List
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateColumn
+
+from FINALES2.db import StatusCounter
+from FINALES2.db.base_class import Base
+from FINALES2.db.status_counters import rebuild_status_counters
+from FINALES2.logging.logger import loggerConfig
+
+logger = loggerConfig().get_logger()
+
+
+def migrate_database(engine) -> List[str]:
+    """Brings the schema of an existing database up to date with the table classes.
+
+    Missing tables are created, missing columns are added to the existing tables and
+    missing indexes are created. Nothing is dropped or rewritten, so the data already
+    in the database is kept and the migration can be run any number of times. When
+    the table of the status counters is created, the counters are computed from the
+    existing requests and results.
+
+    Returns the list of the changes applied (empty if the database was up to date).
+    """
+    changes = []
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            table.create(bind=engine)
+            changes.append(f"Created table {table.name}")
+            continue
+
+        existing_columns = {
+            column["name"] for column in inspector.get_columns(table.name)
+        }
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            column_definition = CreateColumn(column).compile(dialect=engine.dialect)
+            with engine.begin() as connection:
+                connection.execute(
+                    text(f"ALTER TABLE {table.name} ADD COLUMN {column_definition}")
+                )
+            changes.append(f"Added column {table.name}.{column.name}")
+
+        existing_indexes = {
+            index["name"] for index in inspector.get_indexes(table.name)
+        }
+        for index in table.indexes:
+            if index.name in existing_indexes:
+                continue
+            try:
+                index.create(bind=engine)
+            except IntegrityError:
+                logger.raise_value_error(
+                    logger=logger,
+                    msg=(
+                        f"The unique index {index.name} can not be created because "
+                        f"the table {table.name} contains duplicated entries for the "
+                        f"columns {', '.join(index.columns.keys())}. Please resolve "
+                        "the duplicates and run the migration again"
+                    ),
+                )
+            changes.append(f"Created index {index.name} on {table.name}")
+
+    if StatusCounter.__tablename__ not in existing_tables:
+        with Session(engine) as session:
+            counter_number = rebuild_status_counters(session)
+            session.commit()
+        changes.append(f"Counted the statuses into {counter_number} status counters")
+
+    return changes
@@ -1,31 +1,163 @@
-import pathlib
+import sqlite3
 from contextlib import contextmanager
-from typing import Generator
+from typing import Any, Callable, Dict, Generator, Optional, TypeVar, cast
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import URL, Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
 
+from FINALES2.config import FinalesConfiguration, get_configuration
+from FINALES2.db.instrumentation import instrument_engine
 
-def get_db_path():
-    """Allowing easy access for the file path of the db file."""
-    DIRPATH_THIS = pathlib.Path(__file__).parent.resolve()
-    return f"{DIRPATH_THIS}/sql_app.db"
+T = TypeVar("T")
 
+# Drivers of the async database engine for each database backend
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
 
-db_path = get_db_path()
-SQLALCHEMY_DATABASE_URL = f"sqlite:///{db_path}"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, echo=True, connect_args={"check_same_thread": False}
-)
-# connect_args articular connection in a thread which is not the one in which it was
-# created
+def get_db_path() -> Optional[str]:
+    """Allowing easy access for the file path of the db file.
+
+    Returns None if the database is not a sqlite file (e.g. a postgresql database).
+    """
+    url = make_url(SQLALCHEMY_DATABASE_URL)
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        return None
+    return url.database
+
+
+def create_database_engine(config: FinalesConfiguration) -> Engine:
+    """Creates the engine for the database given in the configuration.
+
+    For sqlite databases every new connection is set up to use the write-ahead log,
+    so that readers are not blocked by a writer (and the other way around), to wait
+    for locks instead of failing immediately and to use a larger page cache.
+
+    The statements are timed (see `instrument_engine`), and they are only printed if
+    sql_echo is enabled in the configuration.
+    """
+    url = make_url(config.database_url)
+    engine_kwargs: Dict[str, Any] = {}
+
+    if url.get_backend_name() == "sqlite":
+        # connect_args articular connection in a thread which is not the one in which
+        # it was created
+        engine_kwargs["connect_args"] = {"check_same_thread": False}
+    else:
+        # Connections to a database server may be closed from the server side
+        engine_kwargs["pool_pre_ping"] = True
+
+    # In-memory sqlite databases live in a single connection, so there is no pool
+    if url.database not in (None, "", ":memory:"):
+        engine_kwargs["pool_size"] = config.database_pool_size
+        engine_kwargs["max_overflow"] = config.database_max_overflow
+        engine_kwargs["pool_timeout"] = config.database_pool_timeout_s
+        engine_kwargs["pool_recycle"] = config.database_pool_recycle_s
+
+    engine = create_engine(url, echo=config.sql_echo, **engine_kwargs)
+    instrument_engine(engine, config.slow_query_threshold_ms)
+
+    if url.get_backend_name() == "sqlite":
+        set_sqlite_pragmas(engine, config)
+
+    return engine
+
+
+def async_database_url(database_url: str) -> URL:
+    """Returns the URL of the database for the async driver of its backend."""
+    url = make_url(database_url)
+    return url.set(
+        drivername=f"{url.get_backend_name()}+{ASYNC_DRIVERS[url.get_backend_name()]}"
+    )
+
+
+def create_async_database_engine(config: FinalesConfiguration) -> AsyncEngine:
+    """Creates the async engine (SQLAlchemy asyncio) for the database given in the
+    configuration.
+
+    The database is accessed with aiosqlite or asyncpg, so waiting for the database
+    does not block the event loop of the server. The connections are set up in the
+    same way as the ones of `create_database_engine`.
+    """
+    url = async_database_url(config.database_url)
+    engine_kwargs: Dict[str, Any] = {}
+
+    if url.get_backend_name() != "sqlite":
+        engine_kwargs["pool_pre_ping"] = True
+
+    if url.database not in (None, "", ":memory:"):
+        engine_kwargs["pool_size"] = config.database_pool_size
+        engine_kwargs["max_overflow"] = config.database_max_overflow
+        engine_kwargs["pool_timeout"] = config.database_pool_timeout_s
+        engine_kwargs["pool_recycle"] = config.database_pool_recycle_s
+
+    async_engine = create_async_engine(url, echo=config.sql_echo, **engine_kwargs)
+    # The events of async engines are handled by the sync engine they wrap
+    instrument_engine(async_engine.sync_engine, config.slow_query_threshold_ms)
+
+    if url.get_backend_name() == "sqlite":
+        set_sqlite_pragmas(async_engine.sync_engine, config)
+
+    return async_engine
+
+
+def set_sqlite_pragmas(engine: Engine, config: FinalesConfiguration):
+    """Sets up every new connection of the engine to a sqlite database to use the
+    write-ahead log, to wait for locks and to use a larger page cache."""
+
+    @event.listens_for(engine, "connect")
+    def set_connection_pragmas(dbapi_connection, connection_record):
+        """Sets the pragmas of every new sqlite connection."""
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(config.sqlite_busy_timeout_ms)}")
+        # A negative cache_size is a size in KiB instead of a number of pages
+        cursor.execute(f"PRAGMA cache_size=-{int(config.sqlite_cache_size_kib)}")
+        cursor.close()
+
+
+def backup_database(target_path: str):
+    """Writes a consistent copy of the (sqlite) database to the target path.
+
+    The copy is made with the backup API of sqlite, so it includes the changes that
+    are still in the write-ahead log and is not affected by concurrent writes.
+    """
+    if get_db_path() is None:
+        raise ValueError(
+            "A copy of the database can only be made for sqlite database files, use "
+            "the backup tools of the database server instead"
+        )
+
+    connection = engine.raw_connection()
+    try:
+        sqlite_connection = cast(sqlite3.Connection, connection.driver_connection)
+        target_connection = sqlite3.connect(target_path)
+        try:
+            sqlite_connection.backup(target_connection)
+        finally:
+            target_connection.close()
+    finally:
+        connection.close()
+
+
+config = get_configuration()
+SQLALCHEMY_DATABASE_URL = config.database_url
+
+engine = create_database_engine(config)
 
 # Then, we are creating a SessionLocal.
-# Once we create an instance of the SessionLocal class, this instance will be the actual
+# Once we create an instance of the SessionLocal class, this instance will be the actual
 # database session.
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# The async engine is used by the async endpoints of the server
+async_engine = create_async_database_engine(config)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+
 
 @contextmanager
 def get_db() -> Generator:
@@ -34,3 +166,26 @@ def get_db() -> Generator:
         yield db
     finally:
         db.close()
+
+
+async def run_with_async_db(function: Callable[[Callable], T]) -> T:
+    """Runs a function taking a database_context (like `get_db`) with a session of the
+    async engine, without blocking the event loop.
+
+    The function is run with `AsyncSession.run_sync`, so the sync code of e.g. the
+    `Engine` and `ServerManager` can be used as is: the statements it executes wait for
+    the async driver instead of a thread. Every database session opened by the
+    function is the same session, which is closed when the function returns.
+    """
+
+    def run(session: Session) -> T:
+        """Runs the function with the sync facade of the async session."""
+
+        @contextmanager
+        def database_context() -> Generator:
+            yield session
+
+        return function(database_context)
+
+    async with AsyncSessionLocal() as async_session:
+        return await async_session.run_sync(run)
@@ -0,0 +1,147 @@
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import Select, delete, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from FINALES2.db import (
+    LinkQuantityRequest,
+    LinkQuantityResult,
+    Quantity,
+    Request,
+    Result,
+    StatusCounter,
+)
+
+REQUEST_KIND = "request"
+RESULT_KIND = "result"
+
+# (kind, quantity, method, status)
+CounterKey = Tuple[str, str, str, str]
+
+# kind -> quantity -> method -> status -> count
+StatusCounts = Dict[str, Dict[str, Dict[str, Dict[str, int]]]]
+
+
+class StatusCounterChanges:
+    """Changes of the status counters, collected while a transaction is prepared and
+    written with `apply` as part of it."""
+
+    def __init__(self):
+        """Initializes the changes without any status change."""
+        self._deltas: Dict[CounterKey, int] = {}
+
+    def change(
+        self,
+        kind: str,
+        capabilities: Iterable[Tuple[str, str]],
+        old_status: Optional[str],
+        new_status: Optional[str],
+    ):
+        """Count a status change (or a new object if old_status is None) of a request
+        or result for each of its (quantity, method) pairs."""
+        if old_status == new_status:
+            return
+        for quantity, method in capabilities:
+            if old_status is not None:
+                self._add((kind, quantity, method, old_status), -1)
+            if new_status is not None:
+                self._add((kind, quantity, method, new_status), 1)
+
+    def apply(self, session):
+        """Adds the changes to the counters within the transaction of the session."""
+        rows = [
+            {
+                "kind": kind,
+                "quantity": quantity,
+                "method": method,
+                "status": status,
+                "count": delta,
+            }
+            for (kind, quantity, method, status), delta in self._deltas.items()
+            if delta != 0
+        ]
+        if len(rows) == 0:
+            return
+
+        if session.get_bind().dialect.name == "postgresql":
+            query_inp = postgresql.insert(StatusCounter)
+        else:
+            query_inp = sqlite.insert(StatusCounter)
+        query_inp = query_inp.on_conflict_do_update(
+            index_elements=["kind", "quantity", "method", "status"],
+            set_={"count": StatusCounter.count + query_inp.excluded.count},
+        )
+        session.execute(query_inp, rows)
+        self._deltas.clear()
+
+    def _add(self, counter_key: CounterKey, delta: int):
+        """Adds a delta to the change of a counter."""
+        self._deltas[counter_key] = self._deltas.get(counter_key, 0) + delta
+
+
+def rebuild_status_counters(session) -> int:
+    """Recounts the statuses of all requests and results, replacing the counters.
+
+    Returns the number of counters written.
+    """
+    query_inp_requests: Select = (
+        select(
+            Quantity.quantity, Quantity.method, Request.status, func.count(Request.uuid)
+        )
+        .join(LinkQuantityRequest, LinkQuantityRequest.request_uuid == Request.uuid)
+        .join(Quantity, Quantity.uuid == LinkQuantityRequest.method_uuid)
+        .group_by(Quantity.quantity, Quantity.method, Request.status)
+    )
+    query_inp_results: Select = (
+        select(
+            Quantity.quantity, Quantity.method, Result.status, func.count(Result.uuid)
+        )
+        .join(LinkQuantityResult, LinkQuantityResult.result_uuid == Result.uuid)
+        .join(Quantity, Quantity.uuid == LinkQuantityResult.method_uuid)
+        .group_by(Quantity.quantity, Quantity.method, Result.status)
+    )
+
+    # Deactivated and active rows of the quantity table can have the same quantity
+    # and method, so the counts are summed up per counter
+    counts: Dict[CounterKey, int] = {}
+    for kind, query_inp in (
+        (REQUEST_KIND, query_inp_requests),
+        (RESULT_KIND, query_inp_results),
+    ):
+        for quantity, method, status, count in session.execute(query_inp).all():
+            counter_key = (kind, quantity, method, status)
+            counts[counter_key] = counts.get(counter_key, 0) + count
+
+    session.execute(delete(StatusCounter))
+    for (kind, quantity, method, status), count in counts.items():
+        session.add(
+            StatusCounter(
+                **{
+                    "kind": kind,
+                    "quantity": quantity,
+                    "method": method,
+                    "status": status,
+                    "count": count,
+                }
+            )
+        )
+    return len(counts)
+
+
+def read_status_counts(
+    session, quantity: Optional[str] = None, method: Optional[str] = None
+) -> StatusCounts:
+    """Return the number of requests and results with each status, for every quantity
+    and method (or only the given ones)."""
+    query_inp = select(StatusCounter).where(StatusCounter.count != 0)
+    if quantity is not None:
+        query_inp = query_inp.where(StatusCounter.quantity == quantity)
+    if method is not None:
+        query_inp = query_inp.where(StatusCounter.method == method)
+
+    status_counts: StatusCounts = {REQUEST_KIND: {}, RESULT_KIND: {}}
+    for (counter,) in session.execute(query_inp).all():
+        status_counts.setdefault(counter.kind, {}).setdefault(
+            counter.quantity, {}
+        ).setdefault(counter.method, {})[counter.status] = counter.count
+    return status_counts
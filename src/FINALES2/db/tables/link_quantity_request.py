@@ -1,4 +1,5 @@
 from sqlalchemy import TIMESTAMP, Column, ForeignKey
+from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from sqlalchemy_utils import UUIDType
 
@@ -24,12 +25,17 @@ class LinkQuantityRequest(Base):
         UUIDType(binary=False),
         ForeignKey("quantity.uuid"),
         nullable=False,
+        index=True,
     )
     request_uuid = Column(
         UUIDType(binary=False),
         ForeignKey("request.uuid"),
         nullable=False,
+        index=True,
     )
     load_time = Column(
         TIMESTAMP, server_default=func.now(), onupdate=func.current_timestamp()
     )
+
+    quantity = relationship("Quantity")
+    request = relationship("Request", back_populates="quantity_links")
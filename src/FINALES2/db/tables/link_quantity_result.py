@@ -28,6 +28,7 @@ class LinkQuantityResult(Base):
         UUIDType(binary=False),
         ForeignKey("result.uuid"),
         nullable=False,
+        index=True,
     )
     load_time = Column(
         TIMESTAMP, server_default=func.now(), onupdate=func.current_timestamp()
@@ -1,4 +1,4 @@
-from sqlalchemy import TIMESTAMP, Boolean, Column, String
+from sqlalchemy import TIMESTAMP, Boolean, Column, Index, String, text
 from sqlalchemy.sql import func
 from sqlalchemy_utils import UUIDType
 
@@ -20,8 +20,25 @@ class Quantity(Base):
                                 type is not active, until a new is_active=1 with newer
                                 load_time is added.
         load_time (Datetime):  Timestamp for when the row is added
+
+    Only one row may be active for each quantity and method, which is enforced by a
+    partial unique index on the active rows.
     """
 
+    __table_args__ = (
+        Index(
+            "ix_quantity_quantity_method_is_active", "quantity", "method", "is_active"
+        ),
+        Index(
+            "uq_quantity_quantity_method_active",
+            "quantity",
+            "method",
+            unique=True,
+            sqlite_where=text("is_active = 1"),
+            postgresql_where=text("is_active"),
+        ),
+    )
+
     uuid = Column(
         UUIDType(binary=False),
         primary_key=True,
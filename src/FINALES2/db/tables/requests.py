@@ -1,4 +1,5 @@
-from sqlalchemy import TIMESTAMP, Column, DateTime, ForeignKey, String
+from sqlalchemy import TIMESTAMP, Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from sqlalchemy_utils import UUIDType
 
@@ -15,8 +16,20 @@ class Request(Base):
         requesting_recieved_timestamp (Boolean): Timestamp for when the request was
                                                  recieved
         bugdet (String):        Budget associated with the request...
+        priority (Integer):     Priority of the request, higher values are worked on
+                                first
+        lease_expires_at (DateTime): Deadline for the next heartbeat of the tenant that
+                                claimed the request, after which the request is
+                                pending again (None if not claimed)
+        reserved_by_tenant_uuid (UUIDType (32)): uuid of the tenant that claimed the
+                                request, which is the only one that can extend the
+                                lease (None if not claimed)
         status (String):        String representing the current status of the entry
         load_time (Datetime):   Timestamp for when the row is added
+
+    The relationship quantity_links gives access to the rows of the
+    link_quantity_request table, and through them to the quantity and methods of the
+    request.
     """
 
     uuid = Column(
@@ -30,9 +43,18 @@ class Request(Base):
         ForeignKey("tenant.uuid"),
         nullable=False,
     )
-    requesting_recieved_timestamp = Column(DateTime, nullable=False)
+    requesting_recieved_timestamp = Column(DateTime, nullable=False, index=True)
     budget = Column(String, nullable=True)
-    status = Column(String, nullable=False)
+    priority = Column(Integer, nullable=False, default=0, server_default="0")
+    lease_expires_at = Column(DateTime, nullable=True, index=True)
+    reserved_by_tenant_uuid = Column(
+        UUIDType(binary=False),
+        ForeignKey("tenant.uuid"),
+        nullable=True,
+    )
+    status = Column(String, nullable=False, index=True)
     load_time = Column(
         TIMESTAMP, server_default=func.now(), onupdate=func.current_timestamp()
     )
+
+    quantity_links = relationship("LinkQuantityRequest", back_populates="request")
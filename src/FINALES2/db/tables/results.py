@@ -28,6 +28,7 @@ class Result(Base):
         UUIDType(binary=False),
         ForeignKey("request.uuid"),
         nullable=False,
+        index=True,
     )
     parameters = Column(
         String,
@@ -44,6 +45,7 @@ class Result(Base):
     posting_recieved_timestamp = Column(
         DateTime,
         nullable=False,
+        index=True,
     )
     load_time = Column(
         TIMESTAMP, server_default=func.now(), onupdate=func.current_timestamp()
@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, String
+
+from FINALES2.db.base_class import Base
+
+
+class StatusCounter(Base):
+    """
+    This table contains the number of requests and results with each status for every
+    quantity and method, with the following columns:
+        kind (VARCHAR):     'request' or 'result'
+        quantity (VARCHAR): Quantity of the requests/results
+        method (VARCHAR):   Method of the requests/results, requests with several
+                            methods are counted for each of them
+        status (VARCHAR):   Status of the requests/results
+        count (Integer):    Number of requests/results with the status
+
+    The counts are updated in the same transactions as the status changes (see
+    `FINALES2.db.status_counters`), so they can be read without scanning the request
+    and result tables.
+    """
+
+    kind = Column(String, primary_key=True, nullable=False)
+    quantity = Column(String, primary_key=True, nullable=False)
+    method = Column(String, primary_key=True, nullable=False)
+    status = Column(String, primary_key=True, nullable=False)
+    count = Column(Integer, nullable=False, default=0, server_default="0")
@@ -25,6 +25,7 @@ class StatusLogRequest(Base):
         UUIDType(binary=False),
         ForeignKey("request.uuid"),
         nullable=False,
+        index=True,
     )
     status = Column(
         String,
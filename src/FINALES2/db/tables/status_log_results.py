@@ -25,6 +25,7 @@ class StatusLogResult(Base):
         UUIDType(binary=False),
         ForeignKey("result.uuid"),
         nullable=False,
+        index=True,
     )
     status = Column(
         String,
@@ -0,0 +1,164 @@
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+from sqlalchemy import Select, case, func, select
+
+from FINALES2.db import Quantity
+from FINALES2.db.session import get_db
+from FINALES2.engine.schema_validators import validator_cache
+from FINALES2.server.schemas import CapabilityInfo
+
+from . import logger
+
+
+class RegisteredCapability(BaseModel):
+    """An active row of the quantity table, with its schemas already parsed."""
+
+    uuid: uuid.UUID
+    specifications: str
+    info: CapabilityInfo
+
+
+class CapabilityRegistry:
+    """In-memory registry of the active capabilities (quantity + method) of the server.
+
+    The registry resolves a quantity and method to the uuid of the corresponding
+    active row of the quantity table and its parsed schemas, so that the write paths
+    of the engine do not need to query the database for them on every call.
+
+    It is built on first use (or explicitly at server start with `load`) and every
+    rebuild increases its `version`. Changes done through the `ServerManager` of this
+    process call `invalidate`, and changes done by other processes (e.g. the CLI) are
+    detected through a cheap fingerprint query of the quantity table, that is run at
+    most once every `refresh_check_interval_s` seconds.
+    """
+
+    refresh_check_interval_s: float = 5.0
+
+    def __init__(self, database_context):
+        """Initializes the (empty) registry."""
+        self._database_context = database_context
+        self._capabilities: Dict[str, Dict[str, List[RegisteredCapability]]] = {}
+        self._fingerprint: Optional[Tuple] = None
+        self._last_check: Optional[float] = None
+        self._version = 0
+        self._lock = threading.Lock()
+
+    @property
+    def database_context(self):
+        """The database_context the registry is built from."""
+        return self._database_context
+
+    @property
+    def version(self) -> int:
+        """Number of times the registry has been (re)built."""
+        return self._version
+
+    def load(self):
+        """(Re)builds the registry from the active rows of the quantity table."""
+        query_inp = select(Quantity).where(Quantity.is_active.is_(True))
+        with self._lock:
+            with self._database_context() as session:
+                fingerprint = self._query_fingerprint(session)
+                query_out = session.execute(query_inp).all()
+
+            capabilities: Dict[str, Dict[str, List[RegisteredCapability]]] = {}
+            for (capability,) in query_out:
+                registered_capability = RegisteredCapability(
+                    uuid=capability.uuid,
+                    specifications=capability.specifications,
+                    info=CapabilityInfo.from_db_quantity(capability),
+                )
+                capabilities.setdefault(capability.quantity, {}).setdefault(
+                    capability.method, []
+                ).append(registered_capability)
+
+            self._capabilities = capabilities
+            self._fingerprint = fingerprint
+            self._last_check = time.monotonic()
+            self._version += 1
+
+        # The capabilities changed, so the compiled validators are not needed anymore
+        validator_cache.invalidate()
+
+    def invalidate(self):
+        """Mark the registry as stale, so it is rebuilt on the next access."""
+        self._last_check = None
+        self._fingerprint = None
+
+    def has_quantity(self, quantity: str) -> bool:
+        """Return whether there is an active capability for the quantity."""
+        self.ensure_fresh()
+        return quantity in self._capabilities
+
+    def has_capability(self, quantity: str, method: str) -> bool:
+        """Return whether there is an active capability for the quantity and method."""
+        self.ensure_fresh()
+        return method in self._capabilities.get(quantity, {})
+
+    def lookup(self, quantity: str, method: str) -> RegisteredCapability:
+        """Return the single active capability for the quantity and method."""
+        self.ensure_fresh()
+        registered_capabilities = self._capabilities.get(quantity, {}).get(method, [])
+
+        # Check that the number of active entries is as intended
+        if len(registered_capabilities) != 1:
+            logger.raise_value_error(
+                logger=logger,
+                msg=(
+                    f"The method {method} for quantity {quantity} has several entries "
+                    f"({len(registered_capabilities)}) in the quantity table which are "
+                    "active"
+                ),
+            )
+
+        return registered_capabilities[0]
+
+    def capabilities(
+        self, quantity: Optional[str] = None, method: Optional[str] = None
+    ) -> List[RegisteredCapability]:
+        """Return all active capabilities, optionally filtered by quantity/method."""
+        self.ensure_fresh()
+        registered_capabilities = []
+        for quantity_key, methods in self._capabilities.items():
+            if quantity is not None and quantity_key != quantity:
+                continue
+            for method_key, method_capabilities in methods.items():
+                if method is not None and method_key != method:
+                    continue
+                registered_capabilities.extend(method_capabilities)
+        return registered_capabilities
+
+    def ensure_fresh(self):
+        """Rebuilds the registry if it is stale or the quantity table changed."""
+        if self._fingerprint is None or self._last_check is None:
+            self.load()
+            return
+
+        if time.monotonic() - self._last_check < self.refresh_check_interval_s:
+            return
+
+        with self._database_context() as session:
+            fingerprint = self._query_fingerprint(session)
+        self._last_check = time.monotonic()
+        if fingerprint != self._fingerprint:
+            self.load()
+
+    @staticmethod
+    def _query_fingerprint(session) -> Tuple:
+        """
+        Summary of the quantity table that changes whenever a capability is added or
+        (de)activated, since the load_time of a row is updated on every change
+        """
+        query_inp: Select = select(
+            func.count(Quantity.uuid),
+            func.sum(case((Quantity.is_active.is_(True), 1), else_=0)),
+            func.max(Quantity.load_time),
+        )
+        return tuple(session.execute(query_inp).one())
+
+
+capability_registry = CapabilityRegistry(database_context=get_db)
@@ -0,0 +1,122 @@
+import asyncio
+import threading
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from pydantic import BaseModel
+
+# Topic of the events published when a request becomes pending, either because it
+# was created or because its status was changed back to pending
+PENDING_REQUEST_TOPIC = "pending_request"
+
+# Topic of the events published when a result is posted, the event is its ResultInfo
+NEW_RESULT_TOPIC = "new_result"
+
+
+class PendingRequestEvent(BaseModel):
+    """Event published when a request becomes pending."""
+
+    request_uuid: uuid.UUID
+    quantity: str
+    methods: List[str]
+    parameters: Dict[str, Dict[str, Any]]
+
+    def matches(self, quantity: Optional[str], method: Optional[str]) -> bool:
+        """Return whether the request is for the quantity and method (if given)."""
+        if quantity is not None and quantity != self.quantity:
+            return False
+        if method is not None and method not in self.methods:
+            return False
+        return True
+
+
+class Subscription:
+    """Subscription of an asyncio task to the events of a topic.
+
+    The events are delivered to a queue of the event loop the subscription was created
+    in, so they can be awaited with `next_event` while they are published from any
+    thread (e.g. the worker threads of the synchronous endpoints).
+    """
+
+    def __init__(
+        self,
+        broker: "EventBroker",
+        topic: str,
+        match: Optional[Callable[[Any], bool]] = None,
+    ):
+        """Initializes the subscription, must be called from within an event loop."""
+        self.topic = topic
+        self._broker = broker
+        self._match = match
+        self._loop = asyncio.get_running_loop()
+        self._queue: asyncio.Queue = asyncio.Queue()
+
+    def deliver(self, event: Any):
+        """Adds the event to the queue of the subscription if it matches."""
+        if self._match is not None and not self._match(event):
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, event)
+        except RuntimeError:
+            # The event loop of the subscriber was closed in the meantime
+            pass
+
+    async def next_event(self, timeout: Optional[float] = None) -> Optional[Any]:
+        """Wait for the next matching event, returns None if the timeout expires."""
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        """Stops the delivery of events to the subscription."""
+        self._broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class EventBroker:
+    """Publishes in-process notifications to the tasks waiting for them.
+
+    Publishing is thread-safe and does not block, so it can be done by the engine right
+    after a transaction is committed. The broker only reaches the subscribers of the
+    same server process.
+    """
+
+    def __init__(self):
+        """Initializes the broker without subscriptions."""
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(
+        self, topic: str, match: Optional[Callable[[Any], bool]] = None
+    ) -> Subscription:
+        """Subscribe to the events of a topic, optionally only the matching ones."""
+        subscription = Subscription(broker=self, topic=topic, match=match)
+        with self._lock:
+            self._subscriptions.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """Remove a subscription, so it does not receive further events."""
+        with self._lock:
+            self._subscriptions.get(subscription.topic, set()).discard(subscription)
+
+    def publish(self, topic: str, event: Any):
+        """Deliver an event to all the subscriptions of the topic."""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(topic, set()))
+        for subscription in subscriptions:
+            subscription.deliver(event)
+
+    def subscriber_count(self, topic: str) -> int:
+        """Number of subscriptions to a topic."""
+        with self._lock:
+            return len(self._subscriptions.get(topic, set()))
+
+
+event_broker = EventBroker()
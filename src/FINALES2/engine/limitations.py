@@ -0,0 +1,231 @@
+import json
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from FINALES2.db import Tenant
+from FINALES2.db.session import get_db
+
+from . import logger
+
+Matcher = Callable[[Any], bool]
+
+RANGE_KEYS = {"min", "max", "step"}
+
+# Relative tolerance for deciding if a value is on the grid of a range with a step
+STEP_TOLERANCE = 1e-9
+
+
+def compile_limitation(limitation: Any) -> Matcher:
+    """Compiles a limitation into a function checking if a value satisfies it.
+
+    The limitations have the form described by `limitations_schema_translation`:
+    a limitation is either a single allowed instance or a list of alternatives, where
+    each alternative is an allowed value, a range of numbers given by (any of) min,
+    max and step, an object with limitations for (some of) its properties or, for list
+    values, a list of the allowed items. Properties without limitations are not
+    restricted.
+    """
+    if not isinstance(limitation, list):
+        return _compile_alternative(limitation)
+
+    alternatives = [_compile_alternative(alternative) for alternative in limitation]
+    # For list values, a list of anything but lists is a single allowed instance and
+    # not a list of alternatives
+    is_single_instance = not all(isinstance(item, list) for item in limitation)
+    single_instance = _compile_list(limitation)
+
+    def matches(value: Any) -> bool:
+        if isinstance(value, list) and is_single_instance:
+            return single_instance(value)
+        return any(alternative(value) for alternative in alternatives)
+
+    return matches
+
+
+def _compile_alternative(alternative: Any) -> Matcher:
+    """Compiles a single alternative of a limitation."""
+    if isinstance(alternative, dict):
+        if len(alternative) > 0 and set(alternative.keys()) <= RANGE_KEYS:
+            return _compile_range(alternative)
+        return _compile_object(alternative)
+    if isinstance(alternative, list):
+        return _compile_list(alternative)
+    return _compile_value(alternative)
+
+
+def _compile_value(allowed_value: Any) -> Matcher:
+    """Compiles an allowed value."""
+
+    def matches(value: Any) -> bool:
+        # Booleans are not equal to numbers in the json sense
+        if isinstance(value, bool) != isinstance(allowed_value, bool):
+            return False
+        return value == allowed_value
+
+    return matches
+
+
+def _compile_range(number_range: Dict[str, Any]) -> Matcher:
+    """Compiles a range of numbers with optional bounds and step."""
+    minimum = number_range.get("min")
+    maximum = number_range.get("max")
+    step = number_range.get("step")
+    # The grid of the step starts at the bound of the range
+    start = minimum if minimum is not None else maximum
+
+    def matches(value: Any) -> bool:
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return False
+        if minimum is not None and value < minimum:
+            return False
+        if maximum is not None and value > maximum:
+            return False
+        if step:
+            number_of_steps = (value - (start or 0)) / step
+            deviation = abs(number_of_steps - round(number_of_steps))
+            if deviation > STEP_TOLERANCE * max(1.0, abs(number_of_steps)):
+                return False
+        return True
+
+    return matches
+
+
+def _compile_object(limitations: Dict[str, Any]) -> Matcher:
+    """Compiles the limitations of the properties of an object."""
+    property_matchers = {
+        property_name: compile_limitation(property_limitation)
+        for property_name, property_limitation in limitations.items()
+    }
+
+    def matches(value: Any) -> bool:
+        if not isinstance(value, dict):
+            return False
+        # Properties not given in the value are not restricted by the limitations
+        return all(
+            property_matcher(value[property_name])
+            for property_name, property_matcher in property_matchers.items()
+            if property_name in value
+        )
+
+    return matches
+
+
+def _compile_list(allowed_items: List[Any]) -> Matcher:
+    """Compiles a list of allowed items, which all items of a list must be one of."""
+    item_matchers = [compile_limitation(item) for item in allowed_items]
+
+    def matches(value: Any) -> bool:
+        if not isinstance(value, list):
+            return False
+        return all(
+            any(item_matcher(item) for item_matcher in item_matchers) for item in value
+        )
+
+    return matches
+
+
+class TenantLimitations:
+    """The compiled limitations of a tenant for each of its quantities and methods."""
+
+    def __init__(self, limitations: List[Dict[str, Any]]):
+        """Compiles the limitations as stored in the tenant table."""
+        self._matchers: Dict[Tuple[str, str], List[Matcher]] = {}
+        for limitation in limitations:
+            capability = (limitation["quantity"], limitation["method"])
+            self._matchers.setdefault(capability, []).append(
+                compile_limitation(limitation["limitations"])
+            )
+
+    @property
+    def capabilities(self) -> List[Tuple[str, str]]:
+        """The (quantity, method) pairs the tenant has limitations for."""
+        return list(self._matchers.keys())
+
+    def has_capability(self, quantity: str, method: str) -> bool:
+        """Return whether the tenant works on the quantity with the method."""
+        return (quantity, method) in self._matchers
+
+    def accepts(self, quantity: str, method: str, parameters: Dict[str, Any]) -> bool:
+        """Return whether the tenant can use the method with the given parameters."""
+        matchers = self._matchers.get((quantity, method), [])
+        return any(matcher(parameters) for matcher in matchers)
+
+    def accepts_request(
+        self,
+        quantity: str,
+        methods: List[str],
+        parameters: Dict[str, Dict[str, Any]],
+        only_method: Optional[str] = None,
+    ) -> bool:
+        """Return whether the tenant can work on a request with any of its methods
+        (or with the given one of its methods)."""
+        return any(
+            self.accepts(quantity, method, parameters.get(method, {}))
+            for method in methods
+            if only_method is None or method == only_method
+        )
+
+
+class LimitationsCache:
+    """Cache of the compiled limitations of the active tenants.
+
+    The limitations of a tenant are compiled the first time they are needed. The
+    `ServerManager` of this process calls `invalidate` when tenants are added or
+    (de)activated, and changes done by other processes (e.g. the CLI) are detected by
+    checking the load_time of the tenant row at most once every
+    `refresh_check_interval_s` seconds.
+    """
+
+    refresh_check_interval_s: float = 5.0
+
+    def __init__(self, database_context):
+        """Initializes the (empty) cache."""
+        self._database_context = database_context
+        self._entries: Dict[str, Tuple[Any, float, TenantLimitations]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, tenant_uuid: str) -> TenantLimitations:
+        """Return the compiled limitations of an active tenant."""
+        tenant_uuid = str(uuid.UUID(tenant_uuid))
+        entry = self._entries.get(tenant_uuid)
+        if entry is not None:
+            load_time, last_check, tenant_limitations = entry
+            if time.monotonic() - last_check < self.refresh_check_interval_s:
+                return tenant_limitations
+
+        query_inp = select(Tenant).where(Tenant.uuid == uuid.UUID(tenant_uuid))
+        with self._database_context() as session:
+            tenant = session.execute(query_inp).scalar_one_or_none()
+            if tenant is None or not tenant.is_active:
+                with self._lock:
+                    self._entries.pop(tenant_uuid, None)
+                logger.raise_value_error(
+                    logger=logger,
+                    msg=f"There is no active tenant with the uuid {tenant_uuid}",
+                )
+
+            if entry is None or entry[0] != tenant.load_time:
+                tenant_limitations = TenantLimitations(json.loads(tenant.limitations))
+            with self._lock:
+                self._entries[tenant_uuid] = (
+                    tenant.load_time,
+                    time.monotonic(),
+                    tenant_limitations,
+                )
+
+        return tenant_limitations
+
+    def invalidate(self, tenant_uuid: Optional[str] = None):
+        """Drop the limitations of a tenant (or all tenants) from the cache."""
+        with self._lock:
+            if tenant_uuid is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(str(uuid.UUID(tenant_uuid)), None)
+
+
+limitations_cache = LimitationsCache(database_context=get_db)
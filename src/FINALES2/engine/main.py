@@ -1,13 +1,18 @@
+import itertools
 import json
 import os
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 from enum import Enum
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, cast
 
-from jsonschema import validate
-from sqlalchemy import select
+from jsonschema.exceptions import ValidationError
+from sqlalchemy import Select, and_, false, insert, or_, select, update
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.sql.elements import ColumnElement
 
+from FINALES2.config import get_configuration
 from FINALES2.db import LinkQuantityRequest as DbLinkQuantityRequest
 from FINALES2.db import LinkQuantityResult as DbLinkQuantityResult
 from FINALES2.db import Quantity as DbQuantity
@@ -16,7 +21,37 @@ from FINALES2.db import Result as DbResult
 from FINALES2.db import StatusLogRequest as DbStatusLogRequest
 from FINALES2.db import StatusLogResult as DbStatusLogResult
 from FINALES2.db.session import get_db
-from FINALES2.server.schemas import Request, RequestInfo, Result, ResultInfo
+from FINALES2.db.status_counters import (
+    REQUEST_KIND,
+    RESULT_KIND,
+    StatusCounterChanges,
+    StatusCounts,
+    read_status_counts,
+)
+from FINALES2.engine.capability_registry import capability_registry
+from FINALES2.engine.events import (
+    NEW_RESULT_TOPIC,
+    PENDING_REQUEST_TOPIC,
+    PendingRequestEvent,
+    event_broker,
+)
+from FINALES2.engine.limitations import limitations_cache
+from FINALES2.engine.pagination import (
+    decode_scheduler_cursor,
+    encode_scheduler_cursor,
+    paginate_query,
+    split_page,
+)
+from FINALES2.engine.scheduler import request_scheduler
+from FINALES2.engine.schema_validators import validator_cache
+from FINALES2.server.schemas import (
+    BatchItemOutcome,
+    Request,
+    RequestInfo,
+    Result,
+    ResultInfo,
+    StatusChange,
+)
 
 from . import logger
 
@@ -38,11 +73,27 @@ class ResultStatus(Enum):
 class Engine:
     """This class is the outermost manager of the functionalities of finales."""
 
+    # Number of rows read from the database at a time when streaming listings
+    stream_batch_size: int = 500
+
+    # Time a tenant has for sending a heartbeat for a request it claimed, before the
+    # request is returned to the pending requests (see `release_expired_leases`)
+    reservation_lease_s: float = get_configuration().reservation_lease_s
+
+    def __init__(self, database_context=get_db):
+        """Initializes the engine for the database sessions of the database_context
+        (by default the sessions of the sync database engine)."""
+        self._database_context = database_context
+
     def get_request(self, object_id: str) -> Optional[RequestInfo]:
         """Retrieve a request entry from the database by id."""
-        query_inp = select(DbRequest).where(DbRequest.uuid == uuid.UUID(object_id))
-        with get_db() as session:
-            query_out = session.execute(query_inp).all()
+        query_inp = (
+            select(DbRequest)
+            .options(RequestInfo.loader_options())
+            .where(DbRequest.uuid == uuid.UUID(object_id))
+        )
+        with self._database_context() as session:
+            query_out = session.execute(query_inp).unique().all()
 
         if len(query_out) == 0:
             return None
@@ -52,13 +103,23 @@ class Engine:
 
     def get_result(self, object_id: str) -> Optional[ResultInfo]:
         """Retrieve a result entry from the database by id."""
-        query_inp = select(DbResult).where(DbResult.uuid == uuid.UUID(object_id))
-        with get_db() as session:
+        query_inp = ResultInfo.query_with_capability().where(
+            DbResult.uuid == uuid.UUID(object_id)
+        )
+        with self._database_context() as session:
             query_out = session.execute(query_inp).all()
 
         if len(query_out) == 0:
             return None
-        api_response = ResultInfo.from_db_result(query_out[0][0])
+        if len(query_out) > 1:
+            logger.raise_value_error(
+                logger=logger,
+                msg=(
+                    f"Db corrupted: Several output ({len(query_out)}) for retrieval of "
+                    f"method and quantity related to a result, only 1 output expected"
+                ),
+            )
+        api_response = ResultInfo.from_db_result(*query_out[0])
         return api_response
 
     def create_request(
@@ -75,86 +136,136 @@ class Engine:
 
         When creating the request object, it assigns a new uuid (and returns it).
         """
-        self.validate_submission(
-            request_data.quantity, request_data.methods, request_data.parameters
-        )
-        ctime = datetime.now()
-
-        request_uuid = str(uuid.uuid4())
-        request_obj = DbRequest(
-            **{
-                "uuid": request_uuid,
-                "parameters": json.dumps(request_data.parameters),
-                "requesting_tenant_uuid": request_data.tenant_uuid,
-                "requesting_recieved_timestamp": ctime,
-                "budget": "not currently implemented in the API",
-                "status": RequestStatus.PENDING.value,
-            }
+        (request_uuid,) = self.create_requests(
+            [request_data], unsolicited_result_tag=unsolicited_result_tag
         )
+        return request_uuid
+
+    def create_requests(
+        self, requests_data: List[Request], unsolicited_result_tag=False
+    ) -> List[str]:
+        """Create several new request entries in the database in a single transaction.
+
+        All requests are validated before anything is written, so a single invalid
+        request rejects the whole batch (raised as a ValueError naming the position of
+        the invalid request, if there are several). The uuid of every distinct
+        quantity + method capability is looked up only once, and the rows for the
+        requests, their status logs and their links to the quantity table are bulk
+        inserted with one commit. The requests of a batch are received one
+        microsecond apart, so they keep the order of the input list wherever requests
+        are ordered by time.
+
+        Returns the uuids of the new requests in the order of the input list.
+        """
+        if len(requests_data) == 0:
+            return []
 
-        status_log_obj = DbStatusLogRequest(
-            **{
-                "uuid": str(uuid.uuid4()),
-                "request_uuid": request_uuid,
-                "status": RequestStatus.PENDING.value,
-                "status_change_message": "The requests was created in the server",
-            }
+        for index, request_data in enumerate(requests_data):
+            try:
+                self.validate_submission(
+                    request_data.quantity, request_data.methods, request_data.parameters
+                )
+            except (ValueError, ValidationError) as error_message:
+                if isinstance(error_message, ValidationError):
+                    detail = error_message.message
+                else:
+                    detail = str(error_message)
+                # The position is only of use if several requests were posted
+                if len(requests_data) > 1:
+                    msg = f"The request at position {index} is invalid: {detail}"
+                elif isinstance(error_message, ValidationError):
+                    msg = f"The parameters of the request are invalid: {detail}"
+                else:
+                    raise
+                logger.raise_value_error(logger=logger, msg=msg)
+
+        request_uuids = []
+        request_rows = []
+        status_log_rows = []
+        link_rows = []
+        status_counter_changes = StatusCounterChanges()
+        method_uuids = self._resolve_method_uuids(
+            [
+                (request_data.quantity, method_name)
+                for request_data in requests_data
+                for method_name in request_data.methods
+            ]
         )
 
-        # Tag reserved for a request that is triggered by posting data with no prior
-        # request (unsolicited)
-        if unsolicited_result_tag:
-            request_obj.status = RequestStatus.UNSOLICITED.value
-            status_log_obj.status = RequestStatus.UNSOLICITED.value
-
-        link_uuid = str(uuid.uuid4())
-        with get_db() as session:
-            # Add the request to the session
-            session.add(request_obj)
-            session.add(status_log_obj)
-
-            # Loop thorugh the methods to add entries to DbLinkQuantityRequest
-            list_of_link_quantity_request_obj = []
-            for method_name in request_data.methods:
-                # Find uuid for method in quantity table
-                query_inp_method = (
-                    select(DbQuantity.uuid)
-                    .where(DbQuantity.quantity == request_data.quantity)
-                    .where(DbQuantity.method == method_name)
-                    .where(DbQuantity.is_active == 1)
-                )
-                query_out = session.execute(query_inp_method).all()
-
-                # Check that the query output sizes is as intended
-                if len(query_out) != 1:
-                    logger.raise_value_error(
-                        logger=logger,
-                        msg=(
-                            f"The method {method_name} for quantity "
-                            f"{request_data.quantity} has several entries "
-                            f"({len(query_out)}) in the quantity table which are active"
-                        ),
-                    )
-
-                uuid_method = query_out[0][0]
-
-                link_quantity_request_obj = DbLinkQuantityRequest(
-                    **{
-                        "link_uuid": link_uuid,
-                        "method_uuid": uuid_method,
+        with self._database_context() as session:
+            # Tag reserved for a request that is triggered by posting data with no
+            # prior request (unsolicited)
+            if unsolicited_result_tag:
+                status = RequestStatus.UNSOLICITED.value
+            else:
+                status = RequestStatus.PENDING.value
+
+            ctime = datetime.now()
+            received_timestamps = [
+                ctime + timedelta(microseconds=index)
+                for index in range(len(requests_data))
+            ]
+            for request_data, received_timestamp in zip(
+                requests_data, received_timestamps
+            ):
+                request_uuid = str(uuid.uuid4())
+                request_uuids.append(request_uuid)
+                request_rows.append(
+                    {
+                        "uuid": request_uuid,
+                        "parameters": json.dumps(request_data.parameters),
+                        "requesting_tenant_uuid": request_data.tenant_uuid,
+                        "requesting_recieved_timestamp": received_timestamp,
+                        "budget": "not currently implemented in the API",
+                        "priority": request_data.priority,
+                        "status": status,
+                    }
+                )
+                status_log_rows.append(
+                    {
+                        "uuid": str(uuid.uuid4()),
                         "request_uuid": request_uuid,
+                        "status": status,
+                        "status_change_message": (
+                            "The requests was created in the server"
+                        ),
                     }
                 )
-                list_of_link_quantity_request_obj.append(link_quantity_request_obj)
-                session.add(link_quantity_request_obj)
+                status_counter_changes.change(
+                    REQUEST_KIND,
+                    [
+                        (request_data.quantity, method_name)
+                        for method_name in request_data.methods
+                    ],
+                    None,
+                    status,
+                )
+                for method_name in request_data.methods:
+                    link_rows.append(
+                        {
+                            "link_uuid": str(uuid.uuid4()),
+                            "method_uuid": method_uuids[
+                                (request_data.quantity, method_name)
+                            ],
+                            "request_uuid": request_uuid,
+                        }
+                    )
 
+            session.execute(insert(DbRequest), request_rows)
+            session.execute(insert(DbStatusLogRequest), status_log_rows)
+            session.execute(insert(DbLinkQuantityRequest), link_rows)
+            status_counter_changes.apply(session)
             session.commit()
-            session.refresh(request_obj)
-            session.refresh(status_log_obj)
-            for link_object in list_of_link_quantity_request_obj:
-                session.refresh(link_object)
 
-        return str(request_obj.uuid)
+        if status == RequestStatus.PENDING.value:
+            for request_uuid, request_data, received_timestamp in zip(
+                request_uuids, requests_data, received_timestamps
+            ):
+                self._queue_pending_request(
+                    uuid.UUID(request_uuid), request_data, received_timestamp
+                )
+
+        return request_uuids
 
     def create_result(self, received_data: Result, unsolicited_result_tag=False) -> str:
         """Create a new result entry in the database.
@@ -166,39 +277,11 @@ class Engine:
         A row is also added to the link_quantity_result table for uuid link between
         result and quantity method.
 
-        When creating the result object, it assigns a new uuid (and returns it).
+        When creating the result object, it assigns a new uuid (and returns it). If the
+        status of the request is changed concurrently, a RuntimeError is raised and the
+        result is not stored.
         """
-        # Note: for the results we are currently using a similar structure
-        # than the request, so the method is a list with a single entry and
-        # the parameters is a dict with a single key, named the same as the
-        # method.
-
-        # Validations specific to posting results
-        if len(received_data.method) != 1:
-            logger.raise_value_error(
-                logger=logger,
-                msg=(
-                    "Wrong length of method string for recieved result. "
-                    "A list with a single method is expected, the recieved list "
-                    f"{received_data.method} does not comply with this"
-                ),
-            )
-        if len(received_data.parameters) != 1:
-            logger.raise_value_error(
-                logger=logger,
-                msg=(
-                    "Wrong number of keys in passed parameters. A single key with the "
-                    "specific method was expected, the recieved parameters has the "
-                    f"following keys {list(received_data.parameters.keys())} and does "
-                    "not comply with this"
-                ),
-            )
-
-        method_name = received_data.method[0]
-        wrapped_params = {method_name: received_data.parameters[method_name]}
-        self.validate_submission(
-            received_data.quantity, received_data.method, wrapped_params
-        )
+        method_name = self._validate_result(received_data)
 
         request_uuid = received_data.request_uuid
         query_inp = select(DbRequest).where(DbRequest.uuid == uuid.UUID(request_uuid))
@@ -219,7 +302,7 @@ class Engine:
             }
         )
 
-        with get_db() as session:
+        with self._database_context() as session:
             # Retrieve original request for the result and update request status
             query_out = session.execute(query_inp).all()
             if len(query_out) == 0:
@@ -231,28 +314,9 @@ class Engine:
             session.add(db_obj)
 
             # Add link between method for the result and the quantity table
-            query_inp_method = (
-                select(DbQuantity.uuid)
-                .where(DbQuantity.quantity == received_data.quantity)
-                .where(DbQuantity.method == method_name)
-                .where(DbQuantity.is_active == 1)
-            )
-
-            query_out_method = session.execute(query_inp_method).all()
-
-            # Check that the query output sizes is as intended
-            if len(query_out_method) != 1:
-                logger.raise_value_error(
-                    logger=logger,
-                    msg=(
-                        f"The method {method_name} for quantity "
-                        f"{received_data.quantity} has several entries "
-                        f"({len(query_out_method)}) in the quantity "
-                        f"table which are active"
-                    ),
-                )
-
-            uuid_method = query_out_method[0][0]
+            uuid_method = capability_registry.lookup(
+                received_data.quantity, method_name
+            ).uuid
             link_quantity_result_obj = DbLinkQuantityResult(
                 **{
                     "link_uuid": str(uuid.uuid4()),
@@ -274,11 +338,37 @@ class Engine:
 
             session.add(result_status_log_obj)
 
+            status_counter_changes = StatusCounterChanges()
+            status_counter_changes.change(
+                RESULT_KIND,
+                [(received_data.quantity, method_name)],
+                None,
+                ResultStatus.ORIGINAL.value,
+            )
+
             # Retrieve original request
             original_request = query_out[0][0]
             # Retrieves the object to be for changing the request status to resolved
             # as well as logging of the change
             if not unsolicited_result_tag:
+                old_status = original_request.status
+                if not self._apply_request_status(
+                    session, original_request, RequestStatus.RESOLVED
+                ):
+                    session.rollback()
+                    logger.raise_runtime_error(
+                        logger=logger,
+                        msg=(
+                            f"The status of the request {request_uuid} was changed "
+                            "while the result was posted, please post it again"
+                        ),
+                    )
+                status_counter_changes.change(
+                    REQUEST_KIND,
+                    self._request_capabilities(original_request),
+                    old_status,
+                    RequestStatus.RESOLVED.value,
+                )
                 (
                     original_request,
                     request_status_log_obj,
@@ -289,6 +379,7 @@ class Engine:
                     status_change_message="Result posted for corresponding request",
                 )
                 session.add(request_status_log_obj)
+            status_counter_changes.apply(session)
 
             # Commit all additions and refresh
             session.commit()
@@ -299,59 +390,466 @@ class Engine:
                 session.refresh(original_request)
                 session.refresh(request_status_log_obj)
 
+            result_info = ResultInfo.from_db_result(
+                db_obj, received_data.quantity, method_name
+            )
+
+        if not unsolicited_result_tag:
+            request_scheduler.remove(uuid.UUID(request_uuid))
+
+        # Push the result to the clients waiting for it
+        event_broker.publish(NEW_RESULT_TOPIC, result_info)
+
         return str(db_obj.uuid)
 
+    def create_results(self, results_data: List[Result]) -> List[BatchItemOutcome]:
+        """Create several new result entries in the database in a single transaction.
+
+        Every result is validated like in `create_result`, and the requests of all
+        results are retrieved with a single query. The rows for the results, their
+        links to the quantity table and their status logs are bulk inserted, and the
+        requests are resolved, with one commit. A result that is invalid (or for a
+        request that does not exist) is not stored, but does not stop the others.
+
+        Returns the outcome for each result, in the order of the input list, with the
+        uuid of the new result if it was stored.
+        """
+        outcomes: List[Optional[BatchItemOutcome]] = [None] * len(results_data)
+        method_names: Dict[int, str] = {}
+        request_uuids = []
+        for index, received_data in enumerate(results_data):
+            try:
+                method_names[index] = self._validate_result(received_data)
+                request_uuids.append(uuid.UUID(received_data.request_uuid))
+            except (ValueError, ValidationError) as error_message:
+                outcomes[index] = BatchItemOutcome(
+                    uuid=None, success=False, detail=str(error_message)
+                )
+
+        query_inp = (
+            select(DbRequest)
+            .options(RequestInfo.loader_options())
+            .where(DbRequest.uuid.in_(request_uuids))
+        )
+
+        ctime = datetime.now()
+        result_rows = []
+        link_rows = []
+        result_status_log_rows = []
+        request_status_log_rows = []
+        resolved_request_uuids = set()
+        status_counter_changes = StatusCounterChanges()
+        with self._database_context() as session:
+            query_out = session.execute(query_inp).unique().all()
+            requests_by_uuid = {
+                original_request.uuid: original_request
+                for (original_request,) in query_out
+            }
+
+            for index, received_data in enumerate(results_data):
+                if outcomes[index] is not None:
+                    continue
+                original_request = requests_by_uuid.get(
+                    uuid.UUID(received_data.request_uuid)
+                )
+                if original_request is None:
+                    outcomes[index] = BatchItemOutcome(
+                        uuid=None,
+                        success=False,
+                        detail=(
+                            "Submitted result has no request: "
+                            f"{received_data.request_uuid}"
+                        ),
+                    )
+                    continue
+
+                old_status = original_request.status
+                if not self._apply_request_status(
+                    session, original_request, RequestStatus.RESOLVED
+                ):
+                    outcomes[index] = BatchItemOutcome(
+                        uuid=None,
+                        success=False,
+                        detail=(
+                            f"The status of the request {original_request.uuid} was "
+                            "changed while the result was posted"
+                        ),
+                    )
+                    continue
+
+                method_name = method_names[index]
+                result_uuid = str(uuid.uuid4())
+                result_rows.append(
+                    {
+                        "uuid": result_uuid,
+                        "request_uuid": original_request.uuid,
+                        "parameters": json.dumps(received_data.parameters),
+                        "data": json.dumps(received_data.data),
+                        "posting_tenant_uuid": received_data.tenant_uuid,
+                        "cost": "Not implemented in the API yet",
+                        "status": ResultStatus.ORIGINAL.value,
+                        "posting_recieved_timestamp": ctime,
+                    }
+                )
+                link_rows.append(
+                    {
+                        "link_uuid": str(uuid.uuid4()),
+                        "method_uuid": capability_registry.lookup(
+                            received_data.quantity, method_name
+                        ).uuid,
+                        "result_uuid": result_uuid,
+                    }
+                )
+                result_status_log_rows.append(
+                    {
+                        "uuid": str(uuid.uuid4()),
+                        "result_uuid": result_uuid,
+                        "status": ResultStatus.ORIGINAL.value,
+                        "status_change_message": "Result posted",
+                    }
+                )
+                status_counter_changes.change(
+                    RESULT_KIND,
+                    [(received_data.quantity, method_name)],
+                    None,
+                    ResultStatus.ORIGINAL.value,
+                )
+
+                status_counter_changes.change(
+                    REQUEST_KIND,
+                    self._request_capabilities(original_request),
+                    old_status,
+                    RequestStatus.RESOLVED.value,
+                )
+                request_status_log_rows.append(
+                    {
+                        "uuid": str(uuid.uuid4()),
+                        "request_uuid": original_request.uuid,
+                        "status": RequestStatus.RESOLVED.value,
+                        "status_change_message": (
+                            "Result posted for corresponding request"
+                        ),
+                    }
+                )
+                resolved_request_uuids.add(original_request.uuid)
+                outcomes[index] = BatchItemOutcome(
+                    uuid=result_uuid, success=True, detail="Result posted"
+                )
+
+            if len(result_rows) > 0:
+                session.execute(insert(DbResult), result_rows)
+                session.execute(insert(DbLinkQuantityResult), link_rows)
+                session.execute(insert(DbStatusLogResult), result_status_log_rows)
+                session.execute(insert(DbStatusLogRequest), request_status_log_rows)
+            status_counter_changes.apply(session)
+            session.commit()
+
+        for request_uuid in resolved_request_uuids:
+            request_scheduler.remove(request_uuid)
+
+        # Push the results to the clients waiting for them, which needs the stored
+        # results, so they are only retrieved if there is someone waiting
+        if len(result_rows) > 0 and event_broker.subscriber_count(NEW_RESULT_TOPIC) > 0:
+            query_inp_results = ResultInfo.query_with_capability().where(
+                DbResult.uuid.in_([uuid.UUID(row["uuid"]) for row in result_rows])
+            )
+            with self._database_context() as session:
+                query_out_results = session.execute(query_inp_results).all()
+            for query_out_result in query_out_results:
+                event_broker.publish(
+                    NEW_RESULT_TOPIC, ResultInfo.from_db_result(*query_out_result)
+                )
+
+        return cast(List[BatchItemOutcome], outcomes)
+
     def get_pending_requests(
         self,
         quantity: Optional[str] = None,
         method: Optional[str] = None,
-    ) -> List[RequestInfo]:
-        """Return all pending requests."""
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+        tenant_uuid: Optional[str] = None,
+    ) -> Tuple[List[RequestInfo], Optional[str]]:
+        """Return all pending requests.
+
+        The requests are ordered by their effective priority (see `RequestScheduler`),
+        and if a limit is given only that many requests are returned together with the
+        cursor to pass for retrieving the next page in this order (None if there are no
+        more requests). Requests created in the meantime with a higher effective
+        priority than the ones already returned are not part of the next pages. When a
+        time window (or a cursor of such a listing) is given, the requests are ordered
+        by the time they were received instead.
+
+        If a tenant is given, only the requests the tenant can work on are returned,
+        i.e. the ones for which the parameters of one of the methods are within the
+        limitations of the tenant.
+        """
+        tenant_limitations = None
+        capabilities: List[Tuple[Optional[str], Optional[str]]] = [(quantity, method)]
+        if tenant_uuid is not None:
+            tenant_limitations = limitations_cache.get(tenant_uuid)
+            capabilities = [
+                (tenant_quantity, tenant_method)
+                for tenant_quantity, tenant_method in tenant_limitations.capabilities
+                if quantity in (None, tenant_quantity)
+                and method in (None, tenant_method)
+            ]
+
+        def accepts(request_obj: RequestInfo) -> bool:
+            return tenant_limitations is None or tenant_limitations.accepts_request(
+                request_obj.request.quantity,
+                request_obj.request.methods,
+                request_obj.request.parameters,
+                only_method=method,
+            )
+
+        scheduled_after = None
+        if cursor is not None:
+            scheduled_after = decode_scheduler_cursor(cursor)
+        if (
+            created_after is None
+            and created_before is None
+            and (cursor is None or scheduled_after is not None)
+        ):
+            return self._get_scheduled_requests_page(
+                capabilities, accepts, limit, scheduled_after
+            )
+
         query_inp = (
             select(DbRequest)
-            .join(DbLinkQuantityRequest)
-            .join(DbQuantity)
+            .options(RequestInfo.loader_options())
             .where(DbRequest.status == RequestStatus.PENDING.value)
         )
 
-        if quantity is not None:
-            query_inp = query_inp.where(DbQuantity.quantity == quantity)
-        if method is not None:
-            query_inp = query_inp.where(DbQuantity.method == method)
+        query_inp = self._filter_requests_by_capability(query_inp, quantity, method)
 
-        with get_db() as session:
-            query_out = session.execute(query_inp).all()
+        if tenant_limitations is None:
+            return self._get_requests_page(
+                query_inp, limit, cursor, created_after, created_before
+            )
 
-        api_response = []
-        for (request_info,) in query_out:
-            request_obj = RequestInfo.from_db_request(request_info)
-            api_response.append(request_obj)
+        query_inp = self._filter_requests_by_capabilities(
+            query_inp, tenant_limitations.capabilities
+        )
+        return self._get_filtered_requests_page(
+            query_inp, accepts, limit, cursor, created_after, created_before
+        )
 
-        return api_response
+    def get_all_requests(
+        self,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+    ) -> Tuple[List[RequestInfo], Optional[str]]:
+        """Return all requests.
+
+        The requests are ordered by the time they were received. If a limit is given,
+        only that many requests are returned together with the cursor to pass for
+        retrieving the next page (None if there are no more requests).
+        """
+        query_inp = select(DbRequest).options(RequestInfo.loader_options())
 
-    def get_all_requests(self) -> List[RequestInfo]:
-        """Return all requests."""
-        query_inp = select(DbRequest)
+        return self._get_requests_page(
+            query_inp, limit, cursor, created_after, created_before
+        )
 
-        with get_db() as session:
-            query_out = session.execute(query_inp).all()
+    def claim_request(
+        self, quantity: str, method: str, tenant_uuid: str
+    ) -> Optional[RequestInfo]:
+        """Reserve the pending request with the highest effective priority for the
+        quantity and method that is within the limitations of the tenant.
 
-        api_response = []
-        for (request_info,) in query_out:
-            request_obj = RequestInfo.from_db_request(request_info)
-            api_response.append(request_obj)
+        The status is changed with an UPDATE that is guarded on the request still being
+        pending, so each request is reserved by exactly one tenant even if several
+        tenants claim requests for the same method at the same time. Returns None if
+        there is no pending request the tenant can work on.
+        """
+        if not capability_registry.has_capability(quantity, method):
+            logger.raise_value_error(
+                logger=logger,
+                msg=f"There is no active method {method} for the quantity {quantity}",
+            )
+        tenant_limitations = limitations_cache.get(tenant_uuid)
+        if not tenant_limitations.has_capability(quantity, method):
+            logger.raise_value_error(
+                logger=logger,
+                msg=(
+                    f"The tenant {tenant_uuid} has no limitations for the method "
+                    f"{method} of the quantity {quantity}"
+                ),
+            )
 
-        return api_response
+        candidates = self._iter_scheduled_requests([(quantity, method)])
+
+        for candidate in candidates:
+            if not tenant_limitations.accepts_request(
+                quantity,
+                candidate.request.methods,
+                candidate.request.parameters,
+                only_method=method,
+            ):
+                continue
+
+            # Each attempt is a separate (short) write transaction, which starts with
+            # the guarded UPDATE, so concurrent claims are serialized by the database
+            query_inp = (
+                update(DbRequest)
+                .where(DbRequest.uuid == uuid.UUID(candidate.uuid))
+                .where(DbRequest.status == RequestStatus.PENDING.value)
+                .values(
+                    status=RequestStatus.RESERVED.value,
+                    lease_expires_at=self._lease_deadline(),
+                    reserved_by_tenant_uuid=uuid.UUID(tenant_uuid),
+                )
+                .execution_options(synchronize_session=False)
+            )
+            with self._database_context() as session:
+                if session.execute(query_inp).rowcount != 1:
+                    # The request was claimed by another tenant in the meantime
+                    session.rollback()
+                    request_scheduler.remove(uuid.UUID(candidate.uuid))
+                    continue
+
+                request_status_log_obj = DbStatusLogRequest(
+                    **{
+                        "uuid": str(uuid.uuid4()),
+                        "request_uuid": candidate.uuid,
+                        "status": RequestStatus.RESERVED.value,
+                        "status_change_message": f"Claimed by the tenant {tenant_uuid}",
+                    }
+                )
+                session.add(request_status_log_obj)
+                status_counter_changes = StatusCounterChanges()
+                status_counter_changes.change(
+                    REQUEST_KIND,
+                    [
+                        (quantity, candidate_method)
+                        for candidate_method in candidate.request.methods
+                    ],
+                    RequestStatus.PENDING.value,
+                    RequestStatus.RESERVED.value,
+                )
+                status_counter_changes.apply(session)
+                session.commit()
+
+            request_scheduler.remove(uuid.UUID(candidate.uuid))
+            return self.get_request(candidate.uuid)
+
+        return None
+
+    def extend_lease(self, request_id: str, tenant_uuid: str) -> datetime:
+        """Extend the lease of a claimed request (heartbeat of the tenant that claimed
+        it) by `reservation_lease_s` from now, and return the new deadline.
+
+        Raises a RuntimeError if the request is not reserved by the tenant (anymore),
+        e.g. because its lease already expired and it was returned to the pending
+        requests or claimed by another tenant, so the tenant has to stop working on it.
+        """
+        lease_expires_at = self._lease_deadline()
+        query_inp = (
+            update(DbRequest)
+            .where(DbRequest.uuid == uuid.UUID(request_id))
+            .where(DbRequest.status == RequestStatus.RESERVED.value)
+            .where(DbRequest.reserved_by_tenant_uuid == uuid.UUID(tenant_uuid))
+            .values(lease_expires_at=lease_expires_at)
+            .execution_options(synchronize_session=False)
+        )
+        with self._database_context() as session:
+            rowcount = session.execute(query_inp).rowcount
+            session.commit()
+
+        if rowcount != 1:
+            if self.get_request(request_id) is None:
+                logger.raise_value_error(
+                    logger=logger, msg=f"No request with id: {request_id}"
+                )
+            logger.raise_runtime_error(
+                logger=logger,
+                msg=(
+                    f"The request {request_id} is not reserved by the tenant "
+                    f"{tenant_uuid}, so its lease can not be extended"
+                ),
+            )
+
+        return lease_expires_at
+
+    def release_expired_leases(self) -> List[str]:
+        """Return the reserved requests whose lease expired to the pending requests.
+
+        The status change is logged for each of them, and the tenants waiting for
+        requests are notified. Returns the uuids of the released requests.
+        """
+        now = datetime.now()
+        lease_expired = cast(ColumnElement[bool], DbRequest.lease_expires_at < now)
+        query_inp = (
+            select(DbRequest)
+            .options(RequestInfo.loader_options())
+            .where(DbRequest.status == RequestStatus.RESERVED.value)
+            .where(lease_expired)
+        )
+
+        released_requests = []
+        status_log_rows = []
+        status_counter_changes = StatusCounterChanges()
+        with self._database_context() as session:
+            query_out = session.execute(query_inp).unique().all()
+            for (expired_request,) in query_out:
+                # Guarded on the lease not having been extended in the meantime
+                query_inp_release = (
+                    update(DbRequest)
+                    .where(DbRequest.uuid == expired_request.uuid)
+                    .where(DbRequest.status == RequestStatus.RESERVED.value)
+                    .where(lease_expired)
+                    .values(
+                        status=RequestStatus.PENDING.value,
+                        lease_expires_at=None,
+                        reserved_by_tenant_uuid=None,
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                if session.execute(query_inp_release).rowcount != 1:
+                    continue
+
+                status_log_rows.append(
+                    {
+                        "uuid": str(uuid.uuid4()),
+                        "request_uuid": expired_request.uuid,
+                        "status": RequestStatus.PENDING.value,
+                        "status_change_message": (
+                            "The lease of the reservation expired at "
+                            f"{expired_request.lease_expires_at} without a heartbeat"
+                        ),
+                    }
+                )
+                status_counter_changes.change(
+                    REQUEST_KIND,
+                    self._request_capabilities(expired_request),
+                    RequestStatus.RESERVED.value,
+                    RequestStatus.PENDING.value,
+                )
+                released_requests.append(RequestInfo.from_db_request(expired_request))
+            # Bulk inserted, like the logs of the other batch status changes
+            if len(status_log_rows) > 0:
+                session.execute(insert(DbStatusLogRequest), status_log_rows)
+            status_counter_changes.apply(session)
+            session.commit()
+
+        for request_obj in released_requests:
+            self._queue_pending_request(
+                uuid.UUID(request_obj.uuid), request_obj.request, request_obj.ctime
+            )
+
+        return [request_obj.uuid for request_obj in released_requests]
 
     def validate_submission(
         self, quantity: str, methods: List[str], parameters: Dict[str, dict]
     ):
-        """Validates"""
-        query_inp = select(DbQuantity).where(DbQuantity.quantity == quantity)
-        with get_db() as session:
-            query_out = session.execute(query_inp).all()
-
-        if len(query_out) == 0:
+        """Validates the parameters of a submission against the schemas of the
+        active capabilities for the quantity and methods."""
+        if not capability_registry.has_quantity(quantity):
             logger.raise_value_error(
                 logger=logger, msg=f"No records for this quantity: {quantity}"
             )
@@ -373,60 +871,133 @@ class Engine:
                     msg=f"Method {method} not found in parameters: {parameters.keys()}",
                 )
 
-            match_found = False
-            specific_params = parameters[method]
-            for (quantity_dbobj,) in query_out:
-                schema_specs = json.loads(quantity_dbobj.specifications)
-                if method == quantity_dbobj.method:
-                    validate(instance=specific_params, schema=schema_specs)
-                    match_found = True
-                    break
-            if not match_found:
+            if not capability_registry.has_capability(quantity, method):
                 logger.raise_value_error(
                     logger=logger, msg=f"No records for this method: {method}"
                 )
 
+            capability = capability_registry.lookup(quantity, method)
+            validator_cache.validate(
+                capability.uuid, capability.specifications, parameters[method]
+            )
+
     def get_result_by_request(self, request_id: str) -> Optional[ResultInfo]:
         """Return the result corresponding to a given request ID."""
-        query_inp = select(DbResult).where(
+        query_inp = ResultInfo.query_with_capability().where(
             DbResult.request_uuid == uuid.UUID(request_id)
         )
-        with get_db() as session:
+        with self._database_context() as session:
             query_out = session.execute(query_inp).all()
 
         if len(query_out) == 0:
             return None
 
-        api_response = ResultInfo.from_db_result(query_out[0][0])
+        api_response = ResultInfo.from_db_result(*query_out[0])
         return api_response
 
     def get_all_results(
         self,
         quantity: Optional[str] = None,
         method: Optional[str] = None,
-    ) -> List[Result]:
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+    ) -> Tuple[List[ResultInfo], Optional[str]]:
         """Returns all results a given tenant has access to.
 
         Currently there is no tenant verification so this just returns
         all available results.
 
-        Filtering currently supported only for quantity and method.
+        Filtering currently supported only for quantity and method, and for the time
+        the results were posted. The results are ordered by the time they were posted
+        and, if a limit is given, only that many results are returned together with
+        the cursor to pass for retrieving the next page (None if there are no more).
         """
-        query_inp = select(DbResult).join(DbLinkQuantityResult).join(DbQuantity)
-        if quantity is not None:
-            query_inp = query_inp.where(DbQuantity.quantity == quantity)
-        if method is not None:
-            query_inp = query_inp.where(DbQuantity.method == method)
+        # The posting timestamp is used for the pagination instead of the load_time,
+        # since the latter changes with every status change of the result
+        query_inp = paginate_query(
+            self._results_query(quantity, method),
+            DbResult.posting_recieved_timestamp,
+            DbResult.uuid,
+            limit=limit,
+            cursor=cursor,
+            created_after=created_after,
+            created_before=created_before,
+        )
 
-        with get_db() as session:
+        with self._database_context() as session:
             query_out = session.execute(query_inp).all()
 
+        query_out, next_cursor = split_page(
+            query_out,
+            limit,
+            lambda row: (row[0].posting_recieved_timestamp, row[0].uuid),
+        )
+
         api_response = []
-        for (result_info,) in query_out:
-            result_obj = ResultInfo.from_db_result(result_info)
+        for result_info, result_quantity, result_method in query_out:
+            result_obj = ResultInfo.from_db_result(
+                result_info, result_quantity, result_method
+            )
             api_response.append(result_obj)
 
-        return api_response
+        return api_response, next_cursor
+
+    def iter_all_requests(
+        self,
+        cursor: Optional[str] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+    ) -> Iterator[RequestInfo]:
+        """Iterate over all requests, in the same order as `get_all_requests`.
+
+        The rows are read from the database in batches of `stream_batch_size` while
+        iterating, so the memory used does not grow with the number of requests.
+        """
+        # Joined eager loading of collections can not be combined with yield_per, so
+        # the quantity and methods are loaded with one extra query per batch instead
+        query_inp = select(DbRequest).options(
+            selectinload(DbRequest.quantity_links).joinedload(
+                DbLinkQuantityRequest.quantity
+            )
+        )
+        query_inp = paginate_query(
+            query_inp,
+            DbRequest.requesting_recieved_timestamp,
+            DbRequest.uuid,
+            cursor=cursor,
+            created_after=created_after,
+            created_before=created_before,
+        )
+        return self._stream_query(
+            query_inp, lambda row: RequestInfo.from_db_request(row[0])
+        )
+
+    def iter_all_results(
+        self,
+        quantity: Optional[str] = None,
+        method: Optional[str] = None,
+        cursor: Optional[str] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+    ) -> Iterator[ResultInfo]:
+        """Iterate over all results, in the same order as `get_all_results`.
+
+        The rows are read from the database in batches of `stream_batch_size` while
+        iterating, so the memory used does not grow with the number of results.
+        """
+        query_inp = paginate_query(
+            self._results_query(quantity, method),
+            DbResult.posting_recieved_timestamp,
+            DbResult.uuid,
+            cursor=cursor,
+            created_after=created_after,
+            created_before=created_before,
+        )
+        return self._stream_query(
+            query_inp, lambda row: ResultInfo.from_db_result(*row)
+        )
 
     def change_status_request(
         self,
@@ -441,21 +1012,15 @@ class Engine:
         Passing the same status which is already currently logged, won't result in an
         error, since a new status_change_message can accompany the new log entry for a
         further/new description.
+        Raises a RuntimeError if the status is changed concurrently by someone else.
         """
 
         # return if status change it not allowed
-        if status == RequestStatus.RESOLVED or status == RequestStatus.UNSOLICITED:
-            logger.raise_value_error(
-                logger=logger,
-                msg=(
-                    f"It is not possible to change the status to {status.value}, "
-                    "since this is handled entirely on ther server side"
-                ),
-            )
+        self._check_new_request_status(status)
 
         # Change status and log change
         query_inp = select(DbRequest).where(DbRequest.uuid == uuid.UUID(request_id))
-        with get_db() as session:
+        with self._database_context() as session:
             # Retrieve original request and update request status
             query_out = session.execute(query_inp).all()
             if len(query_out) == 0:
@@ -464,25 +1029,25 @@ class Engine:
                 )
 
             original_request = query_out[0][0]
+            self._check_request_status_changeable(original_request)
 
-            # Raise error if the status is 'resolved'
-            if original_request.status == RequestStatus.RESOLVED:
-                logger.raise_value_error(
+            old_status = original_request.status
+            if not self._apply_request_status(session, original_request, status):
+                session.rollback()
+                logger.raise_runtime_error(
                     logger=logger,
                     msg=(
-                        "The requests is connected to an already posted results and"
-                        "therefore has the status 'resolved' which cannot be changed."
-                    ),
-                )
-            if original_request.status == RequestStatus.UNSOLICITED:
-                logger.raise_value_error(
-                    logger=logger,
-                    msg=(
-                        "The requests was created to accomadate posting a result "
-                        "without a request being present, the status 'unsolicited' can "
-                        "therefore not be changed."
+                        f"The status of the request {request_id} was changed "
+                        "concurrently, please retry the change"
                     ),
                 )
+            status_counter_changes = StatusCounterChanges()
+            status_counter_changes.change(
+                REQUEST_KIND,
+                self._request_capabilities(original_request),
+                old_status,
+                status.value,
+            )
 
             # Retrieves the object to be for changing the request status as well as
             # logging of the change
@@ -494,11 +1059,22 @@ class Engine:
             )
 
             session.add(request_status_log_obj)
+            status_counter_changes.apply(session)
             session.commit()
 
             session.refresh(request_status_log_obj)
             session.refresh(original_request)
 
+            # The request can be worked on again
+            if status == RequestStatus.PENDING:
+                self._queue_pending_request(
+                    original_request.uuid,
+                    Request.from_db_request(original_request),
+                    original_request.requesting_recieved_timestamp,
+                )
+            else:
+                request_scheduler.remove(original_request.uuid)
+
         api_response = f"Successful change of status to {status.value}"
         return api_response
 
@@ -519,25 +1095,28 @@ class Engine:
 
         # Here it is enforced that it is not possible to change status to 'original'
         # since this is reserved for the status when the data is initially posted
-        if status == ResultStatus.ORIGINAL:
-            logger.raise_value_error(
-                logger=logger,
-                msg=(
-                    f"Not possible to change status to '{ResultStatus.ORIGINAL.value}' "
-                    "since this is reserved only for the initial posting"
-                ),
-            )
+        self._check_new_result_status(status)
 
         # Change status and log change
-        query_inp = select(DbResult).where(DbResult.uuid == uuid.UUID(result_id))
-        with get_db() as session:
+        query_inp = ResultInfo.query_with_capability().where(
+            DbResult.uuid == uuid.UUID(result_id)
+        )
+        with self._database_context() as session:
             # Retrieve original result and update result status
             query_out = session.execute(query_inp).all()
             if len(query_out) == 0:
                 logger.raise_value_error(
                     logger=logger, msg=f"No result with id: {result_id}"
                 )
-            original_result = query_out[0][0]
+            original_result, result_quantity, result_method = query_out[0]
+
+            status_counter_changes = StatusCounterChanges()
+            status_counter_changes.change(
+                RESULT_KIND,
+                [(result_quantity, result_method)],
+                original_result.status,
+                status.value,
+            )
 
             # Update value
             original_result.status = status.value
@@ -551,6 +1130,7 @@ class Engine:
             )
 
             session.add(result_status_log_obj)
+            status_counter_changes.apply(session)
             session.commit()
             session.refresh(result_status_log_obj)
             session.refresh(original_result)
@@ -558,17 +1138,493 @@ class Engine:
         api_response = f"Successful change of status to {status.value}"
         return api_response
 
+    def change_status_requests(
+        self, status_changes: List[StatusChange]
+    ) -> List[BatchItemOutcome]:
+        """Change the status of several requests in a single transaction.
+
+        The same rules as for `change_status_request` apply to each change, but a
+        change that is not allowed (or for a request that does not exist) does not
+        stop the others. The requests are retrieved with a single query and all
+        changes and their status log entries are committed at once.
+
+        Returns the outcome of each change, in the order of the input list.
+        """
+        outcomes: List[Optional[BatchItemOutcome]] = [None] * len(status_changes)
+        request_uuids = self._parse_batch_uuids(status_changes, outcomes)
+
+        query_inp = (
+            select(DbRequest)
+            .options(RequestInfo.loader_options())
+            .where(DbRequest.uuid.in_(request_uuids))
+        )
+        changed_requests = {}
+        with self._database_context() as session:
+            query_out = session.execute(query_inp).unique().all()
+            requests_by_uuid = {
+                original_request.uuid: original_request
+                for (original_request,) in query_out
+            }
+
+            status_counter_changes = StatusCounterChanges()
+            status_log_rows = []
+            for index, status_change in enumerate(status_changes):
+                if outcomes[index] is not None:
+                    continue
+                try:
+                    status = RequestStatus(status_change.new_status)
+                    self._check_new_request_status(status)
+                    original_request = requests_by_uuid.get(
+                        uuid.UUID(status_change.uuid)
+                    )
+                    if original_request is None:
+                        logger.raise_value_error(
+                            logger=logger,
+                            msg=f"No request with id: {status_change.uuid}",
+                        )
+                    self._check_request_status_changeable(original_request)
+                except ValueError as error_message:
+                    outcomes[index] = BatchItemOutcome(
+                        uuid=status_change.uuid,
+                        success=False,
+                        detail=str(error_message),
+                    )
+                    continue
+
+                old_status = original_request.status
+                if not self._apply_request_status(session, original_request, status):
+                    outcomes[index] = BatchItemOutcome(
+                        uuid=status_change.uuid,
+                        success=False,
+                        detail=(
+                            f"The status of the request {status_change.uuid} was "
+                            "changed concurrently"
+                        ),
+                    )
+                    continue
+                status_counter_changes.change(
+                    REQUEST_KIND,
+                    self._request_capabilities(original_request),
+                    old_status,
+                    status.value,
+                )
+                status_log_rows.append(
+                    {
+                        "uuid": str(uuid.uuid4()),
+                        "request_uuid": original_request.uuid,
+                        "status": status.value,
+                        "status_change_message": status_change.status_change_message,
+                    }
+                )
+                changed_requests[original_request.uuid] = (
+                    status,
+                    Request.from_db_request(original_request),
+                    original_request.requesting_recieved_timestamp,
+                )
+                outcomes[index] = BatchItemOutcome(
+                    uuid=status_change.uuid,
+                    success=True,
+                    detail=f"Successful change of status to {status.value}",
+                )
+
+            if len(status_log_rows) > 0:
+                session.execute(insert(DbStatusLogRequest), status_log_rows)
+            status_counter_changes.apply(session)
+            session.commit()
+
+        # Only the last change of a request (if it was changed several times) counts
+        for request_uuid, (
+            final_status,
+            request_data,
+            ctime,
+        ) in changed_requests.items():
+            if final_status == RequestStatus.PENDING:
+                self._queue_pending_request(request_uuid, request_data, ctime)
+            else:
+                request_scheduler.remove(request_uuid)
+
+        return cast(List[BatchItemOutcome], outcomes)
+
+    def change_status_results(
+        self, status_changes: List[StatusChange]
+    ) -> List[BatchItemOutcome]:
+        """Change the status of several results in a single transaction.
+
+        The same rules as for `change_status_result` apply to each change, but a
+        change that is not allowed (or for a result that does not exist) does not stop
+        the others. The results are retrieved with a single query and all changes and
+        their status log entries are committed at once.
+
+        Returns the outcome of each change, in the order of the input list.
+        """
+        outcomes: List[Optional[BatchItemOutcome]] = [None] * len(status_changes)
+        result_uuids = self._parse_batch_uuids(status_changes, outcomes)
+
+        query_inp = ResultInfo.query_with_capability().where(
+            DbResult.uuid.in_(result_uuids)
+        )
+        with self._database_context() as session:
+            query_out = session.execute(query_inp).all()
+            results_by_uuid = {
+                original_result.uuid: (original_result, result_quantity, result_method)
+                for original_result, result_quantity, result_method in query_out
+            }
+
+            status_counter_changes = StatusCounterChanges()
+            status_log_rows = []
+            for index, status_change in enumerate(status_changes):
+                if outcomes[index] is not None:
+                    continue
+                try:
+                    status = ResultStatus(status_change.new_status)
+                    self._check_new_result_status(status)
+                    result_uuid = uuid.UUID(status_change.uuid)
+                    if result_uuid not in results_by_uuid:
+                        logger.raise_value_error(
+                            logger=logger,
+                            msg=f"No result with id: {status_change.uuid}",
+                        )
+                except ValueError as error_message:
+                    outcomes[index] = BatchItemOutcome(
+                        uuid=status_change.uuid,
+                        success=False,
+                        detail=str(error_message),
+                    )
+                    continue
+
+                original_result, result_quantity, result_method = results_by_uuid[
+                    result_uuid
+                ]
+                status_counter_changes.change(
+                    RESULT_KIND,
+                    [(result_quantity, result_method)],
+                    original_result.status,
+                    status.value,
+                )
+                original_result.status = status.value
+                status_log_rows.append(
+                    {
+                        "uuid": str(uuid.uuid4()),
+                        "result_uuid": result_uuid,
+                        "status": status.value,
+                        "status_change_message": status_change.status_change_message,
+                    }
+                )
+                outcomes[index] = BatchItemOutcome(
+                    uuid=status_change.uuid,
+                    success=True,
+                    detail=f"Successful change of status to {status.value}",
+                )
+
+            if len(status_log_rows) > 0:
+                session.execute(insert(DbStatusLogResult), status_log_rows)
+            status_counter_changes.apply(session)
+            session.commit()
+
+        return cast(List[BatchItemOutcome], outcomes)
+
+    def get_status_counts(
+        self, quantity: Optional[str] = None, method: Optional[str] = None
+    ) -> StatusCounts:
+        """Return the number of requests and results with each status for every
+        quantity and method (or only the given ones).
+
+        The counts are read from counters that are updated together with every status
+        change, so the request and result tables are not scanned. A request with
+        several methods is counted for each of its methods.
+        """
+        with self._database_context() as session:
+            return read_status_counts(session, quantity=quantity, method=method)
+
+    def _filter_requests_by_capability(
+        self, query_inp, quantity: Optional[str], method: Optional[str]
+    ):
+        """
+        Function for restricting a query of requests to the ones for the given quantity
+        and method. This is done with a subquery, so that each request is only
+        returned once regardless of how many methods it has
+        """
+        if quantity is None and method is None:
+            return query_inp
+
+        query_inp_capability: Select = select(DbLinkQuantityRequest.request_uuid).join(
+            DbQuantity
+        )
+        if quantity is not None:
+            query_inp_capability = query_inp_capability.where(
+                DbQuantity.quantity == quantity
+            )
+        if method is not None:
+            query_inp_capability = query_inp_capability.where(
+                DbQuantity.method == method
+            )
+        return query_inp.where(DbRequest.uuid.in_(query_inp_capability))
+
+    def _filter_requests_by_capabilities(
+        self, query_inp, capabilities: List[Tuple[str, str]]
+    ):
+        """
+        Function for restricting a query of requests to the ones for any of the given
+        (quantity, method) pairs
+        """
+        query_inp_capability: Select = (
+            select(DbLinkQuantityRequest.request_uuid)
+            .join(DbQuantity)
+            .where(
+                or_(
+                    false(),
+                    *[
+                        and_(
+                            DbQuantity.quantity == quantity, DbQuantity.method == method
+                        )
+                        for quantity, method in capabilities
+                    ],
+                )
+            )
+        )
+        return query_inp.where(DbRequest.uuid.in_(query_inp_capability))
+
+    def _iter_requests_in_batches(
+        self,
+        query_inp,
+        cursor: Optional[str] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+    ) -> Iterator[Tuple[RequestInfo, Tuple[datetime, Any]]]:
+        """
+        Generator of the requests of a listing together with their position (for the
+        cursor), read from the database in batches of `stream_batch_size` requests
+        with a separate session each, so no transaction is kept open while iterating
+        """
+        while True:
+            query_inp_batch = paginate_query(
+                query_inp,
+                DbRequest.requesting_recieved_timestamp,
+                DbRequest.uuid,
+                limit=self.stream_batch_size,
+                cursor=cursor,
+                created_after=created_after,
+                created_before=created_before,
+            )
+            with self._database_context() as session:
+                query_out = session.execute(query_inp_batch).unique().all()
+                query_out, cursor = split_page(
+                    query_out,
+                    self.stream_batch_size,
+                    lambda row: (row[0].requesting_recieved_timestamp, row[0].uuid),
+                )
+                batch = [
+                    (
+                        RequestInfo.from_db_request(request_info),
+                        (request_info.requesting_recieved_timestamp, request_info.uuid),
+                    )
+                    for (request_info,) in query_out
+                ]
+
+            yield from batch
+            if cursor is None:
+                return
+
+    def _iter_scheduled_requests(
+        self,
+        capabilities: List[Tuple[Optional[str], Optional[str]]],
+        first_batch_size: int = 1,
+        after: Optional[Tuple[float, uuid.UUID]] = None,
+    ) -> Iterator[RequestInfo]:
+        """
+        Generator of the pending requests for any of the (quantity, method) pairs in
+        the order of the scheduler (after the given position, if any). The requests
+        are read from the database by uuid, in batches growing from first_batch_size
+        up to `stream_batch_size`, and the ones that are no longer pending are skipped
+        """
+        scheduled_uuids = request_scheduler.iter_pending(capabilities, after=after)
+        batch_size = max(1, min(first_batch_size, self.stream_batch_size))
+        while True:
+            batch_uuids = list(itertools.islice(scheduled_uuids, batch_size))
+            if len(batch_uuids) == 0:
+                return
+
+            query_inp = (
+                select(DbRequest)
+                .options(RequestInfo.loader_options())
+                .where(DbRequest.uuid.in_(batch_uuids))
+                .where(DbRequest.status == RequestStatus.PENDING.value)
+            )
+            with self._database_context() as session:
+                query_out = session.execute(query_inp).unique().all()
+                requests_by_uuid = {
+                    request_info.uuid: RequestInfo.from_db_request(request_info)
+                    for (request_info,) in query_out
+                }
+
+            for request_uuid in batch_uuids:
+                if request_uuid in requests_by_uuid:
+                    yield requests_by_uuid[request_uuid]
+            batch_size = min(2 * batch_size, self.stream_batch_size)
+
+    def _get_scheduled_requests_page(
+        self,
+        capabilities: List[Tuple[Optional[str], Optional[str]]],
+        accepts: Callable[[RequestInfo], bool],
+        limit: Optional[int],
+        after: Optional[Tuple[float, uuid.UUID]] = None,
+    ) -> Tuple[List[RequestInfo], Optional[str]]:
+        """
+        Function for retrieving a page of the pending requests for any of the
+        (quantity, method) pairs accepted by a filter, in the order of the scheduler
+        after the given position, with the cursor for the next page
+        """
+        if limit is not None and limit < 1:
+            logger.raise_value_error(
+                logger=logger, msg=f"The limit must be a positive integer, not {limit}"
+            )
+
+        # One extra request beyond the limit is looked for to know if there is a
+        # next page
+        accepted_requests = []
+        scheduled_requests = self._iter_scheduled_requests(
+            capabilities,
+            first_batch_size=self.stream_batch_size if limit is None else limit + 1,
+            after=after,
+        )
+        for request_obj in scheduled_requests:
+            if accepts(request_obj):
+                accepted_requests.append(request_obj)
+            if limit is not None and len(accepted_requests) > limit:
+                break
+
+        if limit is None or len(accepted_requests) <= limit:
+            return accepted_requests, None
+
+        accepted_requests = accepted_requests[:limit]
+        last_request = accepted_requests[-1]
+        next_cursor = encode_scheduler_cursor(
+            request_scheduler.sort_key(
+                last_request.request.priority, last_request.ctime
+            ),
+            last_request.uuid,
+        )
+        return accepted_requests, next_cursor
+
+    def _get_filtered_requests_page(
+        self,
+        query_inp,
+        accepts: Callable[[RequestInfo], bool],
+        limit: Optional[int],
+        cursor: Optional[str],
+        created_after: Optional[datetime],
+        created_before: Optional[datetime],
+    ) -> Tuple[List[RequestInfo], Optional[str]]:
+        """
+        Function for retrieving a page of a listing of requests, keeping only the
+        requests accepted by a filter that can not be done in the query, with the
+        cursor for the next page
+        """
+        if limit is not None and limit < 1:
+            logger.raise_value_error(
+                logger=logger, msg=f"The limit must be a positive integer, not {limit}"
+            )
+
+        # One extra request beyond the limit is looked for to know if there is a
+        # next page (see `split_page`)
+        accepted_requests = []
+        requests_in_batches = self._iter_requests_in_batches(
+            query_inp, cursor, created_after, created_before
+        )
+        for request_obj, position in requests_in_batches:
+            if accepts(request_obj):
+                accepted_requests.append((request_obj, position))
+            if limit is not None and len(accepted_requests) > limit:
+                break
+
+        accepted_requests, next_cursor = split_page(
+            accepted_requests, limit, lambda row: row[1]
+        )
+        return [request_obj for request_obj, _ in accepted_requests], next_cursor
+
+    def _get_requests_page(
+        self,
+        query_inp,
+        limit: Optional[int],
+        cursor: Optional[str],
+        created_after: Optional[datetime],
+        created_before: Optional[datetime],
+    ) -> Tuple[List[RequestInfo], Optional[str]]:
+        """
+        Function for retrieving a page of a listing of requests, with the cursor for
+        the next page
+        """
+        query_inp = paginate_query(
+            query_inp,
+            DbRequest.requesting_recieved_timestamp,
+            DbRequest.uuid,
+            limit=limit,
+            cursor=cursor,
+            created_after=created_after,
+            created_before=created_before,
+        )
+
+        with self._database_context() as session:
+            query_out = session.execute(query_inp).unique().all()
+
+        query_out, next_cursor = split_page(
+            query_out,
+            limit,
+            lambda row: (row[0].requesting_recieved_timestamp, row[0].uuid),
+        )
+
+        api_response = []
+        for (request_info,) in query_out:
+            request_obj = RequestInfo.from_db_request(request_info)
+            api_response.append(request_obj)
+
+        return api_response, next_cursor
+
+    def _results_query(self, quantity: Optional[str], method: Optional[str]):
+        """
+        Function for creating the query of the results with their quantity and method,
+        optionally filtered by quantity and method
+        """
+        query_inp = ResultInfo.query_with_capability()
+        if quantity is not None:
+            query_inp = query_inp.where(DbQuantity.quantity == quantity)
+        if method is not None:
+            query_inp = query_inp.where(DbQuantity.method == method)
+        return query_inp
+
+    def _stream_query(self, query_inp, hydrate: Callable[[Any], Any]) -> Iterator:
+        """
+        Generator hydrating the rows of a query while they are read from the database
+        in batches, keeping the session open until the iteration finishes
+        """
+        query_inp = query_inp.execution_options(yield_per=self.stream_batch_size)
+        with self._database_context() as session:
+            for row in session.execute(query_inp):
+                yield hydrate(row)
+
+    def _resolve_method_uuids(
+        self, capabilities: List[Tuple[str, str]]
+    ) -> Dict[Tuple[str, str], uuid.UUID]:
+        """
+        Function for retrieving the uuids of the active entries in the quantity table
+        for a list of (quantity, method) pairs, each distinct pair being resolved once
+        """
+        method_uuids = {}
+        for quantity, method_name in set(capabilities):
+            method_uuids[(quantity, method_name)] = capability_registry.lookup(
+                quantity, method_name
+            ).uuid
+        return method_uuids
+
     def _object_instances_for_request_status_change(
         self, original_request, request_id, status, status_change_message
     ):
         """
         Function for returning the request and log object to be stored when changing
-        status of a request
+        status of a request (the status of the request is set by
+        `_apply_request_status`)
         """
 
-        # Update value
-        original_request.status = status.value
-
         request_status_log_obj = DbStatusLogRequest(
             **{
                 "uuid": str(uuid.uuid4()),
@@ -580,6 +1636,194 @@ class Engine:
 
         return original_request, request_status_log_obj
 
+    def _validate_result(self, received_data: Result) -> str:
+        """
+        Function for validating a result before it is stored, returns the name of its
+        method
+        """
+        # Note: for the results we are currently using a similar structure
+        # than the request, so the method is a list with a single entry and
+        # the parameters is a dict with a single key, named the same as the
+        # method.
+
+        # Validations specific to posting results
+        if len(received_data.method) != 1:
+            logger.raise_value_error(
+                logger=logger,
+                msg=(
+                    "Wrong length of method string for recieved result. "
+                    "A list with a single method is expected, the recieved list "
+                    f"{received_data.method} does not comply with this"
+                ),
+            )
+        if len(received_data.parameters) != 1:
+            logger.raise_value_error(
+                logger=logger,
+                msg=(
+                    "Wrong number of keys in passed parameters. A single key with the "
+                    "specific method was expected, the recieved parameters has the "
+                    f"following keys {list(received_data.parameters.keys())} and does "
+                    "not comply with this"
+                ),
+            )
+
+        method_name = received_data.method[0]
+        if method_name not in received_data.parameters:
+            logger.raise_value_error(
+                logger=logger,
+                msg=(
+                    "The key of the passed parameters does not match the method of "
+                    f"the recieved result: {method_name}"
+                ),
+            )
+        wrapped_params = {method_name: received_data.parameters[method_name]}
+        self.validate_submission(
+            received_data.quantity, received_data.method, wrapped_params
+        )
+
+        return method_name
+
+    def _check_new_request_status(self, status: RequestStatus):
+        """
+        Function for raising an error if the status can not be set by a user, since it
+        is only assigned by the server
+        """
+        if status == RequestStatus.RESOLVED or status == RequestStatus.UNSOLICITED:
+            logger.raise_value_error(
+                logger=logger,
+                msg=(
+                    f"It is not possible to change the status to {status.value}, "
+                    "since this is handled entirely on ther server side"
+                ),
+            )
+
+    def _check_request_status_changeable(self, original_request):
+        """
+        Function for raising an error if the status of a request can not be changed
+        anymore
+        """
+        # Raise error if the status is 'resolved'
+        if original_request.status == RequestStatus.RESOLVED.value:
+            logger.raise_value_error(
+                logger=logger,
+                msg=(
+                    "The requests is connected to an already posted results and"
+                    "therefore has the status 'resolved' which cannot be changed."
+                ),
+            )
+        if original_request.status == RequestStatus.UNSOLICITED.value:
+            logger.raise_value_error(
+                logger=logger,
+                msg=(
+                    "The requests was created to accomadate posting a result "
+                    "without a request being present, the status 'unsolicited' can "
+                    "therefore not be changed."
+                ),
+            )
+
+    def _check_new_result_status(self, status: ResultStatus):
+        """
+        Function for raising an error if the status can not be set by a user, since it
+        is reserved for the initial posting
+        """
+        if status == ResultStatus.ORIGINAL:
+            logger.raise_value_error(
+                logger=logger,
+                msg=(
+                    f"Not possible to change status to '{ResultStatus.ORIGINAL.value}' "
+                    "since this is reserved only for the initial posting"
+                ),
+            )
+
+    def _parse_batch_uuids(
+        self, items: List[Any], outcomes: List[Optional[BatchItemOutcome]]
+    ) -> List[uuid.UUID]:
+        """
+        Function for parsing the uuids of the items of a batch, the outcome of the
+        items with an invalid uuid is set to a failure
+        """
+        parsed_uuids = []
+        for index, item in enumerate(items):
+            try:
+                parsed_uuids.append(uuid.UUID(item.uuid))
+            except ValueError:
+                outcomes[index] = BatchItemOutcome(
+                    uuid=item.uuid, success=False, detail=f"Invalid uuid: {item.uuid}"
+                )
+        return parsed_uuids
+
+    def _request_capabilities(self, db_request) -> List[Tuple[str, str]]:
+        """
+        Function for returning the (quantity, method) pairs of a request orm object,
+        loaded through its quantity_links relationship
+        """
+        return [
+            (link.quantity.quantity, link.quantity.method)
+            for link in db_request.quantity_links
+        ]
+
+    def _apply_request_status(
+        self, session, original_request, status: RequestStatus
+    ) -> bool:
+        """
+        Function for setting the status of a request orm object with an UPDATE that is
+        guarded on the request still having the status it was read with, which ends
+        the lease of a claim. Requests reserved this way have no lease, since it is not
+        known which tenant works on them. Returns False (and changes nothing) if the
+        status was changed concurrently
+        """
+        query_inp = (
+            update(DbRequest)
+            .where(DbRequest.uuid == original_request.uuid)
+            .where(DbRequest.status == original_request.status)
+            .values(
+                status=status.value, lease_expires_at=None, reserved_by_tenant_uuid=None
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if session.execute(query_inp).rowcount != 1:
+            return False
+
+        # The orm object is only brought up to date, it has nothing left to flush
+        set_committed_value(original_request, "status", status.value)
+        set_committed_value(original_request, "lease_expires_at", None)
+        set_committed_value(original_request, "reserved_by_tenant_uuid", None)
+        return True
+
+    def _lease_deadline(self) -> datetime:
+        """
+        Function for returning the deadline of a lease for a request reserved (or with
+        a heartbeat) now
+        """
+        return datetime.now() + timedelta(seconds=self.reservation_lease_s)
+
+    def _queue_pending_request(
+        self,
+        request_uuid: uuid.UUID,
+        request_data: Request,
+        received_timestamp: datetime,
+    ):
+        """
+        Function for adding a request that became pending (after the change was
+        committed) to the scheduler, and waking up the tenants waiting for requests
+        """
+        request_scheduler.add(
+            request_uuid,
+            request_data.quantity,
+            request_data.methods,
+            request_data.priority,
+            received_timestamp,
+        )
+        event_broker.publish(
+            PENDING_REQUEST_TOPIC,
+            PendingRequestEvent(
+                request_uuid=request_uuid,
+                quantity=request_data.quantity,
+                methods=request_data.methods,
+                parameters=request_data.parameters,
+            ),
+        )
+
     def database_dump_key_authentication(self, access_key_user_provided):
         """
         Authenticating the key from the user with the environment variable key.
@@ -0,0 +1,109 @@
+import base64
+import binascii
+import json
+import uuid
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+
+from . import logger
+
+
+def encode_cursor(timestamp: datetime, object_uuid: Any) -> str:
+    """Encodes the position of an entry in a listing as an opaque cursor string."""
+    position = {"timestamp": timestamp.isoformat(), "uuid": str(object_uuid)}
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    """Decodes a cursor string created by `encode_cursor`."""
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        timestamp = datetime.fromisoformat(position["timestamp"])
+        object_uuid = uuid.UUID(position["uuid"])
+    except (binascii.Error, KeyError, TypeError, ValueError):
+        logger.raise_value_error(logger=logger, msg=f"Invalid cursor: {cursor}")
+
+    return timestamp, object_uuid
+
+
+def encode_scheduler_cursor(sort_key: float, object_uuid: Any) -> str:
+    """Encodes the position of a request in the order of the scheduler (see
+    `RequestScheduler.sort_key`) as an opaque cursor string."""
+    position = {"sort_key": sort_key, "uuid": str(object_uuid)}
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_scheduler_cursor(cursor: str) -> Optional[Tuple[float, uuid.UUID]]:
+    """Decodes a cursor string created by `encode_scheduler_cursor`, returns None if
+    the cursor is not such a cursor (e.g. one created by `encode_cursor`)."""
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(position, dict) or "sort_key" not in position:
+            return None
+        sort_key = float(position["sort_key"])
+        object_uuid = uuid.UUID(position["uuid"])
+    except (binascii.Error, KeyError, TypeError, ValueError):
+        logger.raise_value_error(logger=logger, msg=f"Invalid cursor: {cursor}")
+
+    return sort_key, object_uuid
+
+
+def paginate_query(
+    query_inp,
+    timestamp_column,
+    uuid_column,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+):
+    """Adds the keyset pagination and time window to a listing query.
+
+    The entries are ordered by (timestamp, uuid), and the cursor marks the last entry
+    of the previous page, so every page is retrieved with an index range scan instead
+    of skipping the entries of the previous pages. One extra entry beyond the limit is
+    queried to know whether there is a next page (see `split_page`).
+    """
+    if created_after is not None:
+        query_inp = query_inp.where(timestamp_column >= created_after)
+    if created_before is not None:
+        query_inp = query_inp.where(timestamp_column < created_before)
+
+    if cursor is not None:
+        cursor_timestamp, cursor_uuid = decode_cursor(cursor)
+        query_inp = query_inp.where(
+            or_(
+                timestamp_column > cursor_timestamp,
+                and_(timestamp_column == cursor_timestamp, uuid_column > cursor_uuid),
+            )
+        )
+
+    query_inp = query_inp.order_by(timestamp_column, uuid_column)
+
+    if limit is not None:
+        if limit < 1:
+            logger.raise_value_error(
+                logger=logger, msg=f"The limit must be a positive integer, not {limit}"
+            )
+        query_inp = query_inp.limit(limit + 1)
+
+    return query_inp
+
+
+def split_page(
+    rows: List[Any],
+    limit: Optional[int],
+    position: Callable[[Any], Tuple[datetime, Any]],
+) -> Tuple[List[Any], Optional[str]]:
+    """Returns the rows of the page and the cursor for the next page (if any).
+
+    The `position` function returns the (timestamp, uuid) of a row.
+    """
+    if limit is None or len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    next_cursor = encode_cursor(*position(rows[-1]))
+    return rows, next_cursor
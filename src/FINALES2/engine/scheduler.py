@@ -0,0 +1,329 @@
+import heapq
+import itertools
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from pydantic import BaseModel
+from sqlalchemy import func, select
+
+from FINALES2.config import get_configuration
+from FINALES2.db import LinkQuantityRequest, Quantity, Request, StatusLogRequest
+from FINALES2.db.session import get_db
+
+# Key of the heap of the pending requests for a quantity and method, where None stands
+# for any quantity or any method
+HeapKey = Tuple[Optional[str], Optional[str]]
+
+# Entry of a heap: the sort key and uuid of a request, and the sequence number of the
+# addition of the request to the queues (see `RequestScheduler._is_live`)
+HeapEntry = Tuple[float, uuid.UUID, int]
+
+# Value of RequestStatus.PENDING of the engine
+PENDING_STATUS = "pending"
+
+
+class ScheduledRequest(BaseModel):
+    """A pending request known to the scheduler."""
+
+    sort_key: float
+    quantity: str
+    methods: List[str]
+    sequence: int
+
+
+class RequestScheduler:
+    """In-memory priority queues of the pending requests.
+
+    There is a binary heap of the pending requests for every quantity and method (and
+    for every quantity, every method and all requests), so the next request to work on
+    is found in O(log n) instead of sorting the pending requests in the database on
+    every poll.
+
+    The requests are ordered by their effective priority, which is their priority plus
+    `aging_per_hour` for every hour they have been waiting, so requests with a low
+    priority are not starved by a steady flow of requests with a higher priority. Since
+    all requests age at the same rate, the order does not change over time and is
+    given by the key `aging_per_hour * received_hours - priority` (lowest first), with
+    the uuid breaking ties. Without any priorities this is the order of arrival.
+
+    The engine adds the requests that become pending and removes the ones that stop
+    being pending. Removed requests are only marked as such and skipped when they are
+    found in a heap (lazy deletion), and the heaps are rebuilt when they are mostly
+    made of removed requests. The scheduler is built from the database on first use,
+    and changes done by other processes are detected by comparing a summary of the
+    requests (see `_query_fingerprint`) with the database at most once every
+    `refresh_check_interval_s` seconds.
+    """
+
+    refresh_check_interval_s: float = 5.0
+
+    def __init__(self, database_context, aging_per_hour: float):
+        """Initializes the (empty) scheduler."""
+        self._database_context = database_context
+        self.aging_per_hour = aging_per_hour
+        self._scheduled: Dict[uuid.UUID, ScheduledRequest] = {}
+        self._heaps: Dict[HeapKey, List[HeapEntry]] = {}
+        self._heap_entries = 0
+        self._live_heap_entries = 0
+        self._sequence = itertools.count()
+        self._last_check: Optional[float] = None
+        self._fingerprint: Optional[Tuple] = None
+        # Increased whenever the layout of the heaps changes, so that iterations that
+        # are in progress know they have to start over
+        self._version = 0
+        self._lock = threading.RLock()
+
+    def sort_key(self, priority: int, received_timestamp: datetime) -> float:
+        """Return the key ordering a request in the queues (lowest first)."""
+        received_hours = received_timestamp.timestamp() / 3600
+        return self.aging_per_hour * received_hours - priority
+
+    def load(self):
+        """(Re)builds the queues from the pending requests in the database."""
+        query_inp = (
+            select(
+                Request.uuid,
+                Request.priority,
+                Request.requesting_recieved_timestamp,
+                Quantity.quantity,
+                Quantity.method,
+            )
+            .join(LinkQuantityRequest, LinkQuantityRequest.request_uuid == Request.uuid)
+            .join(Quantity, Quantity.uuid == LinkQuantityRequest.method_uuid)
+            .where(Request.status == PENDING_STATUS)
+        )
+        with self._database_context() as session:
+            fingerprint = self._query_fingerprint(session)
+            query_out = session.execute(query_inp).all()
+
+        scheduled: Dict[uuid.UUID, ScheduledRequest] = {}
+        for request_uuid, priority, received_timestamp, quantity, method in query_out:
+            if request_uuid not in scheduled:
+                scheduled[request_uuid] = ScheduledRequest(
+                    sort_key=self.sort_key(priority, received_timestamp),
+                    quantity=quantity,
+                    methods=[],
+                    sequence=next(self._sequence),
+                )
+            scheduled[request_uuid].methods.append(method)
+
+        with self._lock:
+            self._scheduled = scheduled
+            self._rebuild_heaps()
+            self._fingerprint = fingerprint
+            self._last_check = time.monotonic()
+
+    def invalidate(self):
+        """Mark the queues as stale, so they are rebuilt on the next access."""
+        self._last_check = None
+        self._fingerprint = None
+
+    def add(
+        self,
+        request_uuid: uuid.UUID,
+        quantity: str,
+        methods: List[str],
+        priority: int,
+        received_timestamp: datetime,
+    ):
+        """Add a request that became pending to the queues."""
+        if self._last_check is None:
+            # Not built yet, the request is included when it is loaded
+            return
+        scheduled_request = ScheduledRequest(
+            sort_key=self.sort_key(priority, received_timestamp),
+            quantity=quantity,
+            methods=methods,
+            sequence=next(self._sequence),
+        )
+        with self._lock:
+            self._remove(request_uuid)
+            self._scheduled[request_uuid] = scheduled_request
+            for heap_key in self._heap_keys(scheduled_request):
+                heapq.heappush(
+                    self._heaps.setdefault(heap_key, []),
+                    self._heap_entry(request_uuid, scheduled_request),
+                )
+                self._heap_entries += 1
+                self._live_heap_entries += 1
+            self._version += 1
+
+    def remove(self, request_uuid: uuid.UUID):
+        """Remove a request that is no longer pending from the queues."""
+        with self._lock:
+            self._remove(request_uuid)
+
+    def iter_pending(
+        self,
+        capabilities: Optional[List[HeapKey]] = None,
+        after: Optional[Tuple[float, uuid.UUID]] = None,
+    ) -> Iterator[uuid.UUID]:
+        """Iterate over the uuids of the pending requests for any of the (quantity,
+        method) pairs (all of them by default), where None stands for any quantity or
+        method, from the highest effective priority to the lowest.
+
+        The requests stay queued, so the ones skipped by the caller (e.g. because they
+        are not within the limitations of a tenant) are still returned to others. If
+        the (sort key, uuid) of a request is given as `after`, only the requests that
+        come after it are returned, which is used for paging through the requests.
+        """
+        if capabilities is None:
+            capabilities = [(None, None)]
+        self._ensure_fresh()
+        returned: Set[uuid.UUID] = set()
+        heap_iterators = [self._iter_heap(heap_key) for heap_key in set(capabilities)]
+        for sort_key, request_uuid, _ in heapq.merge(*heap_iterators):
+            if after is not None and (sort_key, request_uuid) <= after:
+                continue
+            # A request with several methods can be in several of the heaps
+            if request_uuid not in returned:
+                returned.add(request_uuid)
+                yield request_uuid
+
+    def _iter_heap(self, heap_key: HeapKey) -> Iterator[HeapEntry]:
+        """
+        Generator of the entries of the pending requests in a heap in order. The heap
+        is traversed without popping from it (the lowest entry not visited yet is always
+        a child of a visited one), and if the heap changes in between two entries the
+        traversal starts over, skipping the requests already returned
+        """
+        returned: Set[uuid.UUID] = set()
+        frontier: List[Tuple[HeapEntry, int]] = []
+        version = None
+
+        while True:
+            next_entry = None
+            with self._lock:
+                heap = self._heaps.get(heap_key, [])
+                if version != self._version:
+                    version = self._version
+                    frontier = [(heap[0], 0)] if len(heap) > 0 else []
+
+                while len(frontier) > 0 and next_entry is None:
+                    heap_entry, index = heapq.heappop(frontier)
+                    for child_index in (2 * index + 1, 2 * index + 2):
+                        if child_index < len(heap):
+                            heapq.heappush(frontier, (heap[child_index], child_index))
+
+                    if self._is_live(heap_entry) and heap_entry[1] not in returned:
+                        next_entry = heap_entry
+
+            if next_entry is None:
+                return
+            returned.add(next_entry[1])
+            yield next_entry
+
+    def __len__(self) -> int:
+        """Number of pending requests in the queues."""
+        self._ensure_fresh()
+        return len(self._scheduled)
+
+    def _remove(self, request_uuid: uuid.UUID):
+        """
+        Function for marking a request as removed, its entries are left in the heaps
+        until they reach the top of a heap or the heaps are rebuilt
+        """
+        scheduled_request = self._scheduled.pop(request_uuid, None)
+        if scheduled_request is None:
+            return
+
+        heap_keys = self._heap_keys(scheduled_request)
+        self._live_heap_entries -= len(heap_keys)
+        if self._heap_entries > 2 * self._live_heap_entries + 64:
+            self._rebuild_heaps()
+            return
+
+        # Removed entries at the top of the heaps are popped right away
+        changed = False
+        for heap_key in heap_keys:
+            heap = self._heaps.get(heap_key, [])
+            while len(heap) > 0 and not self._is_live(heap[0]):
+                heapq.heappop(heap)
+                self._heap_entries -= 1
+                changed = True
+        if changed:
+            self._version += 1
+
+    def _is_live(self, heap_entry: HeapEntry) -> bool:
+        """Return whether a heap entry belongs to a request that is still pending.
+
+        The entries of a request that was removed and added again are told apart from
+        the current ones by the sequence number of the addition, since the sort key is
+        the same.
+        """
+        _, request_uuid, sequence = heap_entry
+        scheduled_request = self._scheduled.get(request_uuid)
+        return scheduled_request is not None and scheduled_request.sequence == sequence
+
+    def _rebuild_heaps(self):
+        """Rebuilds the heaps from the pending requests, dropping removed entries."""
+        heaps: Dict[HeapKey, List[HeapEntry]] = {}
+        for request_uuid, scheduled_request in self._scheduled.items():
+            for heap_key in self._heap_keys(scheduled_request):
+                heaps.setdefault(heap_key, []).append(
+                    self._heap_entry(request_uuid, scheduled_request)
+                )
+        for heap in heaps.values():
+            heapq.heapify(heap)
+        self._heaps = heaps
+        self._heap_entries = sum(len(heap) for heap in heaps.values())
+        self._live_heap_entries = self._heap_entries
+        self._version += 1
+
+    def _ensure_fresh(self):
+        """Builds the queues if needed, or rebuilds them if the requests in the
+        database changed since they were built."""
+        if self._last_check is None:
+            self.load()
+            return
+
+        if time.monotonic() - self._last_check < self.refresh_check_interval_s:
+            return
+
+        with self._database_context() as session:
+            fingerprint = self._query_fingerprint(session)
+        self._last_check = time.monotonic()
+        if fingerprint != self._fingerprint:
+            self.load()
+
+    @staticmethod
+    def _query_fingerprint(session) -> Tuple:
+        """
+        Summary of the requests that changes whenever a request is created or its
+        status changes, since every such change adds a row to the (append only) status
+        log of the requests. The number of pending requests is part of it as well, for
+        changes of the status that are done without adding to the log
+        """
+        query_inp_pending = select(func.count(Request.uuid)).where(
+            Request.status == PENDING_STATUS
+        )
+        query_inp_status_log = select(func.count(StatusLogRequest.uuid))
+        return (
+            session.execute(query_inp_pending).scalar_one(),
+            session.execute(query_inp_status_log).scalar_one(),
+        )
+
+    @staticmethod
+    def _heap_entry(
+        request_uuid: uuid.UUID, scheduled_request: ScheduledRequest
+    ) -> HeapEntry:
+        """The entry of a request in the heaps."""
+        return scheduled_request.sort_key, request_uuid, scheduled_request.sequence
+
+    @staticmethod
+    def _heap_keys(scheduled_request: ScheduledRequest) -> Set[HeapKey]:
+        """The keys of the heaps a request is queued in."""
+        heap_keys: Set[HeapKey] = {(None, None), (scheduled_request.quantity, None)}
+        for method in scheduled_request.methods:
+            heap_keys.add((scheduled_request.quantity, method))
+            heap_keys.add((None, method))
+        return heap_keys
+
+
+request_scheduler = RequestScheduler(
+    database_context=get_db,
+    aging_per_hour=get_configuration().request_aging_per_hour,
+)
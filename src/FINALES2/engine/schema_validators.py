@@ -0,0 +1,57 @@
+import json
+import uuid
+from typing import Any, Dict, Union
+
+from jsonschema.exceptions import best_match
+from jsonschema.validators import validator_for
+
+
+class SchemaValidatorCache:
+    """Process-wide cache of the compiled json-schema validators of the capabilities.
+
+    The validators are keyed by the uuid of the row in the quantity table, and are
+    compiled lazily the first time a capability is used for validating a submission.
+    The specifications of a given row never change, but the cache is still cleared
+    whenever the quantity table is modified so that it only holds used capabilities.
+    """
+
+    def __init__(self):
+        """Initializes the (empty) cache."""
+        self._validators: Dict[str, Any] = {}
+
+    def get(self, capability_uuid: Union[str, uuid.UUID], specifications: str) -> Any:
+        """Return the compiled validator for a capability, compiling it if needed."""
+        key = str(capability_uuid)
+        validator = self._validators.get(key)
+        if validator is None:
+            schema = json.loads(specifications)
+            validator_class = validator_for(schema)
+            validator_class.check_schema(schema)
+            validator = validator_class(schema)
+            self._validators[key] = validator
+        return validator
+
+    def validate(
+        self,
+        capability_uuid: Union[str, uuid.UUID],
+        specifications: str,
+        instance: Any,
+    ):
+        """Validate an instance against the schema of a capability.
+
+        Raises the same `ValidationError` that `jsonschema.validate` would raise.
+        """
+        validator = self.get(capability_uuid, specifications)
+        error = best_match(validator.iter_errors(instance))
+        if error is not None:
+            raise error
+
+    def invalidate(self):
+        """Remove all the compiled validators from the cache."""
+        self._validators.clear()
+
+    def __len__(self) -> int:
+        return len(self._validators)
+
+
+validator_cache = SchemaValidatorCache()
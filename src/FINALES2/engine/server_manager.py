@@ -7,6 +7,8 @@ from jsonschema import validate
 from sqlalchemy import select
 
 from FINALES2.db import Quantity, Tenant
+from FINALES2.engine.capability_registry import capability_registry
+from FINALES2.engine.limitations import limitations_cache
 from FINALES2.server.schemas import CapabilityInfo, LimitationsInfo, TenantInfo
 
 from . import logger
@@ -44,13 +46,15 @@ class ServerManager:
             session.commit()
             session.refresh(new_capability)
 
+        capability_registry.invalidate()
+
     def add_tenant(self, tenant_specs):
         """Adds new tenant to the server."""
         tenant_limitations = tenant_specs["limitations"]
         for limitations in tenant_limitations:
             self.validate_limitations(limitations)
 
-        is_active = 1
+        is_active = True
         tenant_data = {
             "uuid": str(uuid.uuid4()),
             "name": tenant_specs["name"],
@@ -68,6 +72,8 @@ class ServerManager:
             session.commit()
             session.refresh(new_tenant)
 
+        limitations_cache.invalidate()
+
     def get_capabilities(
         self,
         quantity: Optional[str] = None,
@@ -83,17 +89,12 @@ class ServerManager:
         """
 
         # Filter for the quantities tenants can register for
-        query_inp = select(Quantity).where(Quantity.is_active == 1)
-        if quantity is not None:
-            query_inp = query_inp.where(Quantity.quantity == quantity)
-        if method is not None:
-            query_inp = query_inp.where(Quantity.method == method)
-
-        with self._database_context() as session:
-            query_out = session.execute(query_inp).all()
+        registered_capabilities = self._active_capabilities(
+            quantity=quantity, method=method
+        )
 
         # Retrieve all current active tenants
-        query_inp_tenant = select(Tenant).where(Tenant.is_active == 1)
+        query_inp_tenant = select(Tenant).where(Tenant.is_active.is_(True))
         with self._database_context() as session:
             query_out_tenant = session.execute(query_inp_tenant).all()
 
@@ -106,12 +107,11 @@ class ServerManager:
                     active_method_list.append(limitation["method"])
 
         api_response = []
-        for (capability,) in query_out:
+        for capability in registered_capabilities:
             # If currently_available=True we need to also check that the capability is
             # currently being provided by an active tenant in the MAP
             if not currently_available or capability.method in active_method_list:
-                new_object = CapabilityInfo.from_db_quantity(capability)
-                api_response.append(new_object)
+                api_response.append(capability)
 
         return api_response
 
@@ -130,7 +130,7 @@ class ServerManager:
         query_inp = select(Tenant)
         # Filters for all currently available tenants
         if currently_available:
-            query_inp = query_inp.where(Tenant.is_active == 1)
+            query_inp = query_inp.where(Tenant.is_active.is_(True))
 
         with self._database_context() as session:
             query_out = session.execute(query_inp).all()
@@ -220,6 +220,34 @@ class ServerManager:
         limitations = limitations["limitations"]
         validate(instance=limitations, schema=limitations_schema)
 
+    def _active_capabilities(
+        self, quantity: Optional[str] = None, method: Optional[str] = None
+    ) -> List[CapabilityInfo]:
+        """
+        Method for returning the active capabilities (optionally for a quantity and
+        method) of the database of the server manager. They are taken from the
+        capability registry if it is built from the same database, and queried
+        otherwise (e.g. with the session of the async engine in the endpoints)
+        """
+        if self._database_context is capability_registry.database_context:
+            return [
+                registered_capability.info
+                for registered_capability in capability_registry.capabilities(
+                    quantity=quantity, method=method
+                )
+            ]
+
+        query_inp = select(Quantity).where(Quantity.is_active.is_(True))
+        if quantity is not None:
+            query_inp = query_inp.where(Quantity.quantity == quantity)
+        if method is not None:
+            query_inp = query_inp.where(Quantity.method == method)
+        with self._database_context() as session:
+            query_out = session.execute(query_inp).all()
+        return [
+            CapabilityInfo.from_db_quantity(capability) for (capability,) in query_out
+        ]
+
     def _dublicate_capability_db_check(self, db_entry):
         """
         Method for checking if the method being added to the capabilities is already
@@ -292,7 +320,7 @@ class ServerManager:
         query_inp = (
             select(Quantity)
             .where(Quantity.method == method_name)
-            .where(Quantity.is_active == 1)
+            .where(Quantity.is_active.is_(True))
         )
 
         with self._database_context() as session:
@@ -306,11 +334,12 @@ class ServerManager:
 
             capability = query_out[0][0]
             # Updating the is_active column
-            capability.is_active = 0
+            capability.is_active = False
 
             session.commit()
             session.refresh(capability)
 
+        capability_registry.invalidate()
         logger.info(f"The method {method_name} has been deactivated in the map")
         return
 
@@ -343,7 +372,7 @@ class ServerManager:
             query_inp_name_check = (
                 select(Tenant)
                 .where(Tenant.name == tenant.name)
-                .where(Tenant.is_active == 1)
+                .where(Tenant.is_active.is_(True))
             )
             with self._database_context() as session:
                 query_out_name_check = session.execute(query_inp_name_check).all()
@@ -366,6 +395,8 @@ class ServerManager:
             session.commit()
             session.refresh(tenant)
 
+        limitations_cache.invalidate(tenant_uuid)
+
         logger.info(
             f"The is_active state of tenant with uuid ({tenant_uuid}) was successfully "
             f"changed to ({new_is_active_state})"
@@ -45,7 +45,10 @@ class loggerConfig:
 
         formatter = logging.Formatter(formatter, dateFormat)
         stream.setFormatter(formatter)
-        logger.addHandler(stream)
+        # Every package configures the same logger, so the stream handler is only
+        # added once to avoid printing every message several times
+        if not logger.handlers:
+            logger.addHandler(stream)
 
         self.logger = logger
 
@@ -0,0 +1,44 @@
+import asyncio
+from contextlib import asynccontextmanager, suppress
+
+from anyio.to_thread import current_default_thread_limiter
+from fastapi import FastAPI
+from starlette.concurrency import run_in_threadpool
+
+from FINALES2.config import get_configuration
+from FINALES2.engine.main import Engine
+
+from . import logger
+
+
+async def sweep_expired_leases(interval_s: float):
+    """Returns the reserved requests with an expired lease to the pending requests
+    every interval_s seconds, until the task is cancelled."""
+    engine = Engine()
+    while True:
+        await asyncio.sleep(interval_s)
+        try:
+            released_requests = await run_in_threadpool(engine.release_expired_leases)
+        except Exception as error_message:
+            # The sweeper has to keep running, e.g. if the database is locked
+            logger.error(f"Releasing the expired leases failed: {error_message}")
+            continue
+        if len(released_requests) > 0:
+            logger.info(
+                f"Released the requests {released_requests} since their lease expired"
+            )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Runs the background tasks of the server while it is running."""
+    current_default_thread_limiter().total_tokens = (
+        get_configuration().server_threadpool_size
+    )
+    sweeper = asyncio.create_task(
+        sweep_expired_leases(get_configuration().lease_sweep_interval_s)
+    )
+    yield
+    sweeper.cancel()
+    with suppress(asyncio.CancelledError):
+        await sweeper
@@ -9,21 +9,40 @@ fetching all pending requests, and obtaining the capabilities of the system.
 The module uses FastAPI's APIRouter to define the routes and handle the requests.
 """
 
-from typing import Any, Dict, List, Optional
-
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import FileResponse
-
-from FINALES2.db.session import get_db_path
+import os
+import shutil
+import sqlite3
+import tempfile
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import BaseModel
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request as HTTPRequest
+
+from FINALES2.db.session import backup_database, get_db_path, run_with_async_db
+from FINALES2.engine.events import (
+    NEW_RESULT_TOPIC,
+    PENDING_REQUEST_TOPIC,
+    PendingRequestEvent,
+    event_broker,
+)
+from FINALES2.engine.limitations import limitations_cache
 from FINALES2.engine.main import Engine, RequestStatus, ResultStatus, get_db
 from FINALES2.engine.server_manager import ServerManager
 from FINALES2.server.schemas import (
+    BatchItemOutcome,
     CapabilityInfo,
     LimitationsInfo,
     Request,
     RequestInfo,
     Result,
     ResultInfo,
+    StatusChange,
     TenantInfo,
 )
 from FINALES2.user_management import user_manager
@@ -33,28 +52,66 @@ from . import logger
 
 operations_router = APIRouter(tags=["Data Operations"])
 
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def set_next_cursor_header(response: Response, next_cursor: Optional[str]):
+    """Adds the cursor for the next page of a listing to the response headers."""
+    if next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Longest time a client can wait for an event in a single call
+MAX_WAIT_TIMEOUT_S = 300.0
+
+SSE_MEDIA_TYPE = "text/event-stream"
+# Time after which a comment is sent on an idle stream of server-sent events
+SSE_KEEPALIVE_INTERVAL_S = 15.0
+
+
+def server_sent_event(event: str, data: BaseModel) -> str:
+    """Formats an object as a server-sent event."""
+    return f"event: {event}\ndata: {data.model_dump_json()}\n\n"
+
+
+def accepts_ndjson(accept: Optional[str]) -> bool:
+    """Returns whether the client asked for a newline delimited JSON response."""
+    return accept is not None and NDJSON_MEDIA_TYPE in accept
+
+
+def ndjson_response(objects: Iterable[BaseModel]) -> StreamingResponse:
+    """Streams the objects as newline delimited JSON, one object per line."""
+    return StreamingResponse(
+        (obj.model_dump_json() + "\n" for obj in objects),
+        media_type=NDJSON_MEDIA_TYPE,
+    )
+
 
 @operations_router.get("/requests/{object_id}")
-def get_request(
+async def get_request(
     object_id: str, token: User = Depends(user_manager.get_active_user)
 ) -> Optional[RequestInfo]:
     """API endpoint to get requests by id."""
-    engine = Engine()
     try:
-        return engine.get_request(object_id)
+        return await run_with_async_db(
+            lambda database_context: Engine(database_context).get_request(object_id)
+        )
     except ValueError as error_message:
         logger.error(error_message)
         raise HTTPException(status_code=400, detail=str(error_message))
 
 
 @operations_router.get("/results/{object_id}")
-def get_result(
+async def get_result(
     object_id: str, token: User = Depends(user_manager.get_active_user)
 ) -> Optional[ResultInfo]:
     """API endpoint to get results by id."""
-    engine = Engine()
     try:
-        return engine.get_result(object_id)
+        return await run_with_async_db(
+            lambda database_context: Engine(database_context).get_result(object_id)
+        )
     except ValueError as error_message:
         logger.error(error_message)
         raise HTTPException(status_code=400, detail=str(error_message))
@@ -73,6 +130,48 @@ def post_request(
         raise HTTPException(status_code=400, detail=str(error_message))
 
 
+@operations_router.post("/requests/batch")
+def post_requests_batch(
+    requests_data: List[Request], token: User = Depends(user_manager.get_active_user)
+) -> List[str]:
+    """API endpoint to post several new requests at once. The requests are all
+    validated before any of them is stored, so either all or none are created."""
+    engine = Engine()
+    try:
+        return engine.create_requests(requests_data)
+    except ValueError as error_message:
+        logger.error(error_message)
+        raise HTTPException(status_code=400, detail=str(error_message))
+
+
+@operations_router.post("/requests/claim")
+def post_claim_request(
+    quantity: str,
+    method: str,
+    tenant_uuid: str,
+    token: User = Depends(user_manager.get_active_user),
+) -> Optional[RequestInfo]:
+    """API endpoint to reserve the pending request with the highest priority for a
+    quantity and method.
+
+    Requests gain priority while they wait, so older requests are eventually reserved
+    even if requests with a higher priority keep arriving. The request is returned
+    with the status 'reserved', or null if there is no pending request. Each request
+    is only given to one tenant, even if several tenants claim requests for the same
+    method at the same time."""
+    engine = Engine()
+    try:
+        return engine.claim_request(
+            quantity=quantity, method=method, tenant_uuid=tenant_uuid
+        )
+    except ValueError as error_message:
+        logger.error(error_message)
+        raise HTTPException(status_code=400, detail=str(error_message))
+    except RuntimeError as error_message:
+        logger.error(error_message)
+        raise HTTPException(status_code=409, detail=str(error_message))
+
+
 @operations_router.post("/results/")
 def post_result(
     result_data: Result, token: User = Depends(user_manager.get_active_user)
@@ -84,6 +183,22 @@ def post_result(
     except ValueError as error_message:
         logger.error(error_message)
         raise HTTPException(status_code=400, detail=str(error_message))
+    except RuntimeError as error_message:
+        logger.error(error_message)
+        raise HTTPException(status_code=409, detail=str(error_message))
+
+
+@operations_router.post("/results/batch")
+def post_results_batch(
+    results_data: List[Result], token: User = Depends(user_manager.get_active_user)
+) -> List[BatchItemOutcome]:
+    """API endpoint to post several new results at once.
+
+    Each result is validated like a single posted result. All valid results are stored
+    together, and the outcome of each result (with its uuid if it was stored) is
+    returned in the order of the input list."""
+    engine = Engine()
+    return engine.create_results(results_data)
 
 
 @operations_router.post("/results/post_unsolicited_result")
@@ -95,7 +210,7 @@ def post_result_with_no_prior_request(
     engine = Engine()
     try:
         # create request object
-        request_data = {
+        request_data: Dict[str, Any] = {
             "quantity": result_data.quantity,
             "methods": result_data.method,
             "parameters": result_data.parameters,
@@ -112,62 +227,291 @@ def post_result_with_no_prior_request(
 
 @operations_router.get("/pending_requests/")
 def get_pending_requests(
+    response: Response,
     quantity: Optional[str] = None,
     method: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    tenant_uuid: Optional[str] = None,
     token: User = Depends(user_manager.get_active_user),
 ) -> List[RequestInfo]:
-    """API endpoint to get all pending requests."""
+    """API endpoint to get all pending requests.
+
+    The requests are ordered by their priority, which grows while they wait. When a
+    time window is given, the requests are ordered by the time they were received
+    instead. When a limit is given, the cursor for the next page is returned in the
+    X-Next-Cursor header (if there are more requests) and can be passed as the cursor
+    of the next call, which keeps the order of the first call. To page through the
+    requests by time, start with created_after set to the earliest time of interest.
+
+    When a tenant is given, only the requests within the limitations of the tenant
+    are returned."""
     engine = Engine()
     try:
-        return engine.get_pending_requests(quantity=quantity, method=method)
+        pending_requests, next_cursor = engine.get_pending_requests(
+            quantity=quantity,
+            method=method,
+            limit=limit,
+            cursor=cursor,
+            created_after=created_after,
+            created_before=created_before,
+            tenant_uuid=tenant_uuid,
+        )
     except ValueError as error_message:
         logger.error(error_message)
         raise HTTPException(status_code=400, detail=str(error_message))
 
+    set_next_cursor_header(response, next_cursor)
+    return pending_requests
 
-@operations_router.get("/all_requests/")
-def get_all_requests(
+
+@operations_router.get("/pending_requests/wait")
+async def get_pending_requests_wait(
+    quantity: Optional[str] = None,
+    method: Optional[str] = None,
+    tenant_uuid: Optional[str] = None,
+    timeout: float = Query(default=30.0, ge=0, le=MAX_WAIT_TIMEOUT_S),
+    limit: Optional[int] = None,
     token: User = Depends(user_manager.get_active_user),
 ) -> List[RequestInfo]:
-    """API endpoint to get all requests."""
+    """API endpoint to wait for pending requests.
+
+    Returns the pending requests for the quantity and method (if given) that the
+    tenant (if given) can work on as soon as there is at least one, which is
+    immediately if there already is one. Otherwise the call blocks until a matching
+    request is created or set back to pending, or until the timeout (in seconds)
+    expires, in which case an empty list is returned."""
+    engine = Engine()
+
+    tenant_limitations = None
+    if tenant_uuid is not None:
+        try:
+            tenant_limitations = await run_in_threadpool(
+                limitations_cache.get, tenant_uuid
+            )
+        except ValueError as error_message:
+            logger.error(error_message)
+            raise HTTPException(status_code=400, detail=str(error_message))
+
+    def matches(event: PendingRequestEvent) -> bool:
+        if not event.matches(quantity, method):
+            return False
+        return tenant_limitations is None or tenant_limitations.accepts_request(
+            event.quantity, event.methods, event.parameters, only_method=method
+        )
+
+    def pending_requests() -> List[RequestInfo]:
+        return engine.get_pending_requests(
+            quantity=quantity, method=method, limit=limit, tenant_uuid=tenant_uuid
+        )[0]
+
+    # The subscription is done before looking for pending requests, so no request
+    # created in between can be missed
+    with event_broker.subscribe(PENDING_REQUEST_TOPIC, match=matches) as subscription:
+        try:
+            matching_requests = await run_in_threadpool(pending_requests)
+        except ValueError as error_message:
+            logger.error(error_message)
+            raise HTTPException(status_code=400, detail=str(error_message))
+        if len(matching_requests) > 0:
+            return matching_requests
+
+        if await subscription.next_event(timeout=timeout) is None:
+            return []
+
+    return await run_in_threadpool(pending_requests)
+
+
+@operations_router.get("/all_requests/", response_model=List[RequestInfo])
+def get_all_requests(
+    response: Response,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    accept: Optional[str] = Header(default=None),
+    token: User = Depends(user_manager.get_active_user),
+) -> Union[List[RequestInfo], StreamingResponse]:
+    """API endpoint to get all requests.
+
+    The requests of all statuses are returned ordered by the time they were
+    received, optionally restricted to a time window. When a limit is given, the
+    cursor for the next page is returned in the X-Next-Cursor header (if there are
+    more requests) and can be passed as the cursor of the next call.
+
+    If the client accepts application/x-ndjson, all requests (after the cursor) are
+    streamed instead as one JSON object per line, ignoring the limit."""
     engine = Engine()
     try:
-        return engine.get_all_requests()
+        if accepts_ndjson(accept):
+            return ndjson_response(
+                engine.iter_all_requests(
+                    cursor=cursor,
+                    created_after=created_after,
+                    created_before=created_before,
+                )
+            )
+        all_requests, next_cursor = engine.get_all_requests(
+            limit=limit,
+            cursor=cursor,
+            created_after=created_after,
+            created_before=created_before,
+        )
     except ValueError as error_message:
         logger.error(error_message)
         raise HTTPException(status_code=400, detail=str(error_message))
 
+    set_next_cursor_header(response, next_cursor)
+    return all_requests
+
 
 @operations_router.get("/results_requested/{request_id}")
-def get_results_requested(
+async def get_results_requested(
     request_id: str, token: User = Depends(user_manager.get_active_user)
 ) -> Optional[ResultInfo]:
     """API endpoint to get a result by corresponding request ID."""
-    engine = Engine()
     try:
-        return engine.get_result_by_request(request_id)
+        return await run_with_async_db(
+            lambda database_context: Engine(database_context).get_result_by_request(
+                request_id
+            )
+        )
     except ValueError as error_message:
         logger.error(error_message)
         raise HTTPException(status_code=400, detail=str(error_message))
 
 
-@operations_router.get("/results_requested/")
+@operations_router.get("/results_requested/", response_model=List[ResultInfo])
 def get_results_requested_all(
+    response: Response,
     quantity: Optional[str] = None,
     method: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    accept: Optional[str] = Header(default=None),
     token: User = Depends(user_manager.get_active_user),
-) -> List[ResultInfo]:
-    """API endpoint to get all result available to the tenant requesting."""
+) -> Union[List[ResultInfo], StreamingResponse]:
+    """API endpoint to get all result available to the tenant requesting.
+
+    The results are ordered by the time they were posted. When a limit is given, the
+    cursor for the next page is returned in the X-Next-Cursor header (if there are
+    more results) and can be passed as the cursor of the next call.
+
+    If the client accepts application/x-ndjson, all results (after the cursor) are
+    streamed instead as one JSON object per line, ignoring the limit."""
     engine = Engine()
     try:
-        return engine.get_all_results(quantity=quantity, method=method)
+        if accepts_ndjson(accept):
+            return ndjson_response(
+                engine.iter_all_results(
+                    quantity=quantity,
+                    method=method,
+                    cursor=cursor,
+                    created_after=created_after,
+                    created_before=created_before,
+                )
+            )
+        all_results, next_cursor = engine.get_all_results(
+            quantity=quantity,
+            method=method,
+            limit=limit,
+            cursor=cursor,
+            created_after=created_after,
+            created_before=created_before,
+        )
     except ValueError as error_message:
         logger.error(error_message)
         raise HTTPException(status_code=400, detail=str(error_message))
 
+    set_next_cursor_header(response, next_cursor)
+    return all_results
+
+
+@operations_router.get("/events/results", response_class=StreamingResponse)
+async def get_result_events(
+    http_request: HTTPRequest,
+    request_ids: List[str] = Query(),
+    token: User = Depends(user_manager.get_active_user),
+) -> StreamingResponse:
+    """API endpoint to subscribe to the results of a set of requests.
+
+    The results are pushed as server-sent events (one 'result' event with the
+    ResultInfo as data per request) as soon as they are posted, including the ones
+    already posted before subscribing. The stream ends when there is a result for
+    every request."""
+    try:
+        requested_ids = {str(uuid.UUID(request_id)) for request_id in request_ids}
+    except ValueError as error_message:
+        logger.error(error_message)
+        raise HTTPException(status_code=400, detail=str(error_message))
+
+    engine = Engine()
+
+    async def result_events():
+        # The subscription is done before looking for posted results, so no result
+        # posted in between can be missed. It is made in the generator, so it is
+        # closed with it when the client disconnects, and not made at all if the
+        # response is never streamed
+        with event_broker.subscribe(
+            NEW_RESULT_TOPIC,
+            match=lambda result_info: result_info.result.request_uuid in requested_ids,
+        ) as subscription:
+            posted_results = await run_in_threadpool(
+                lambda: [
+                    engine.get_result_by_request(request_id)
+                    for request_id in requested_ids
+                ]
+            )
+            missing_ids = set(requested_ids)
+            for result_info in posted_results:
+                if result_info is not None:
+                    missing_ids.discard(result_info.result.request_uuid)
+                    yield server_sent_event("result", result_info)
+
+            while len(missing_ids) > 0:
+                result_info = await subscription.next_event(
+                    timeout=SSE_KEEPALIVE_INTERVAL_S
+                )
+                if result_info is None:
+                    if await http_request.is_disconnected():
+                        return
+                    # Comment line to keep the connection open through proxies
+                    yield ": keep-alive\n\n"
+                elif result_info.result.request_uuid in missing_ids:
+                    missing_ids.discard(result_info.result.request_uuid)
+                    yield server_sent_event("result", result_info)
+
+    return StreamingResponse(
+        result_events(),
+        media_type=SSE_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+@operations_router.get("/stats")
+async def get_stats(
+    quantity: Optional[str] = None,
+    method: Optional[str] = None,
+    token: User = Depends(user_manager.get_active_user),
+) -> Dict[str, Dict[str, Dict[str, Dict[str, int]]]]:
+    """API endpoint to get the number of requests and results with each status.
+
+    The counts are returned by kind ('request' or 'result'), quantity, method and
+    status, optionally only for the given quantity and method. A request with several
+    methods is counted for each of its methods."""
+    return await run_with_async_db(
+        lambda database_context: Engine(database_context).get_status_counts(
+            quantity=quantity, method=method
+        )
+    )
+
 
 @operations_router.get("/capabilities/")
-def get_capabilities(
+async def get_capabilities(
     currently_available: bool = True,
     token: User = Depends(user_manager.get_active_user),
 ) -> List[CapabilityInfo]:
@@ -180,16 +524,19 @@ def get_capabilities(
     :param currently_available: A flag to decide if the capabilities returned are from
         all registered tenants (if False) or only currently available ones (if True).
     """
-    server_manager = ServerManager(database_context=get_db)
     try:
-        return server_manager.get_capabilities(currently_available=currently_available)
+        return await run_with_async_db(
+            lambda database_context: ServerManager(database_context).get_capabilities(
+                currently_available=currently_available
+            )
+        )
     except ValueError as error_message:
         logger.error(error_message)
         raise HTTPException(status_code=400, detail=str(error_message))
 
 
 @operations_router.get("/limitations/")
-def get_limitations(
+async def get_limitations(
     currently_available: bool = True,
     token: User = Depends(user_manager.get_active_user),
 ) -> List[LimitationsInfo]:
@@ -202,9 +549,12 @@ def get_limitations(
         from all tenants registered in the database (if False) or from avaliable
         tenants that are currently active (if True)
     """
-    server_manager = ServerManager(database_context=get_db)
     try:
-        return server_manager.get_limitations(currently_available=currently_available)
+        return await run_with_async_db(
+            lambda database_context: ServerManager(database_context).get_limitations(
+                currently_available=currently_available
+            )
+        )
     except ValueError as error_message:
         logger.error(error_message)
         raise HTTPException(status_code=400, detail=str(error_message))
@@ -234,6 +584,65 @@ def post_new_status_for_request(
     except ValueError as error_message:
         logger.error(error_message)
         raise HTTPException(status_code=400, detail=str(error_message))
+    except RuntimeError as error_message:
+        logger.error(error_message)
+        raise HTTPException(status_code=409, detail=str(error_message))
+
+
+@operations_router.post("/requests/update_status/batch")
+def post_new_status_for_requests_batch(
+    status_changes: List[StatusChange],
+    token: User = Depends(user_manager.get_active_user),
+) -> List[BatchItemOutcome]:
+    """API endpoint to change the status of several requests at once.
+
+    The same rules as for changing the status of a single request apply to each
+    change. All allowed changes are stored together, and the outcome of each change is
+    returned in the order of the input list."""
+    engine = Engine()
+    return engine.change_status_requests(status_changes)
+
+
+@operations_router.post("/requests/{object_id}/heartbeat")
+async def post_request_heartbeat(
+    object_id: str,
+    tenant_uuid: str,
+    token: User = Depends(user_manager.get_active_user),
+) -> datetime:
+    """API endpoint for the tenant that claimed a request to extend the lease of the
+    reservation.
+
+    Returns the new deadline of the lease. A claimed request without a heartbeat
+    before its deadline is returned to the pending requests, and a heartbeat for a
+    request which is not reserved by the tenant anymore fails with the status code 409,
+    in which case the tenant should stop working on it. Requests reserved through the
+    update of their status have no lease."""
+    try:
+        return await run_with_async_db(
+            lambda database_context: Engine(database_context).extend_lease(
+                request_id=object_id, tenant_uuid=tenant_uuid
+            )
+        )
+    except ValueError as error_message:
+        logger.error(error_message)
+        raise HTTPException(status_code=400, detail=str(error_message))
+    except RuntimeError as error_message:
+        logger.error(error_message)
+        raise HTTPException(status_code=409, detail=str(error_message))
+
+
+@operations_router.post("/results/update_status/batch")
+def post_new_status_for_results_batch(
+    status_changes: List[StatusChange],
+    token: User = Depends(user_manager.get_active_user),
+) -> List[BatchItemOutcome]:
+    """API endpoint to change the status of several results at once.
+
+    The same rules as for changing the status of a single result apply to each change.
+    All allowed changes are stored together, and the outcome of each change is
+    returned in the order of the input list."""
+    engine = Engine()
+    return engine.change_status_results(status_changes)
 
 
 @operations_router.post("/results/{object_id}/update_status/")
@@ -281,16 +690,17 @@ def get_templates(
 
 
 @operations_router.get("/tenants/")
-def get_tenants(
+async def get_tenants(
     token: User = Depends(user_manager.get_active_user),
 ) -> List[TenantInfo]:
     """
     API endpoint to return all tenants in MAP. Is necessary for creating the possibility
     of a data dump with sufficient information
     """
-    server_manager = ServerManager(database_context=get_db)
     try:
-        return server_manager.get_tenants()
+        return await run_with_async_db(
+            lambda database_context: ServerManager(database_context).get_tenants()
+        )
     except ValueError as error_message:
         logger.error(error_message)
         raise HTTPException(status_code=400, detail=str(error_message))
@@ -318,14 +728,29 @@ def get_db_for_dump(
     logger.info(
         "KEY_DATABASE_ARCHIVE key authenticated, database dump endpoint accessed"
     )
-    file_path = get_db_path()
+    db_path = get_db_path()
+    if db_path is None:
+        raise HTTPException(
+            status_code=400,
+            detail="The database dump is only available for sqlite databases.",
+        )
+
+    # The dump is taken from a consistent copy of the database, since the database
+    # file alone misses the changes still in the write-ahead log
+    dump_dirpath = tempfile.mkdtemp()
+    file_path = os.path.join(dump_dirpath, os.path.basename(db_path))
 
     # Returning file
     try:
+        backup_database(file_path)
         return FileResponse(
-            path=file_path, filename=file_path, media_type="application/octet-stream"
+            path=file_path,
+            filename=os.path.basename(db_path),
+            media_type="application/octet-stream",
+            background=BackgroundTask(shutil.rmtree, dump_dirpath),
         )
-    except RuntimeError:
+    except (RuntimeError, sqlite3.Error):
+        shutil.rmtree(dump_dirpath)
         raise HTTPException(
             status_code=400, detail="Error occured during transfer of database."
         )
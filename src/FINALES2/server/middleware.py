@@ -0,0 +1,22 @@
+from fastapi import Request
+from fastapi.responses import Response
+
+from FINALES2.db.instrumentation import track_queries
+
+QUERY_COUNT_HEADER = "X-Query-Count"
+QUERY_TIME_HEADER = "X-Query-Time-Ms"
+
+
+async def query_statistics_middleware(request: Request, call_next) -> Response:
+    """Counts and times the SQL statements executed to answer each HTTP request.
+
+    The statistics are returned in the X-Query-Count and X-Query-Time-Ms headers of
+    the response. Statements executed while a streaming response is sent are not
+    included.
+    """
+    with track_queries() as statistics:
+        response = await call_next(request)
+
+    response.headers[QUERY_COUNT_HEADER] = str(statistics.count)
+    response.headers[QUERY_TIME_HEADER] = f"{statistics.total_duration_s * 1000:.1f}"
+    return response
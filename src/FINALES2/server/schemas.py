@@ -1,9 +1,10 @@
 import datetime
 import json
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel
 from sqlalchemy import select
+from sqlalchemy.orm import joinedload
 
 from FINALES2.db import LinkQuantityRequest as DBLinkQuantityRequest
 from FINALES2.db import LinkQuantityResult as DBLinkQuantityResult
@@ -11,7 +12,6 @@ from FINALES2.db import Quantity as DbQuantity
 from FINALES2.db import Request as DbRequest
 from FINALES2.db import Result as DbResult
 from FINALES2.db import Tenant as DbTenant
-from FINALES2.db.session import get_db
 
 from . import logger
 
@@ -21,22 +21,22 @@ class Request(BaseModel):
     methods: List[str]
     parameters: Dict[str, Dict[str, Any]]
     tenant_uuid: str
+    priority: int = 0
 
     @classmethod
     def from_db_request(cls, db_request: DbRequest):
-        """Initializes the object from the data of an orm object"""
+        """Initializes the object from the data of an orm object
 
-        # Retrieving methods and quantity
-        query_inp = (
-            select(DbQuantity.quantity, DbQuantity.method)
-            .join(DBLinkQuantityRequest)
-            .join(DbRequest)
-            .where(db_request.uuid == DBLinkQuantityRequest.request_uuid)
-            .where(DbQuantity.uuid == DBLinkQuantityRequest.method_uuid)
-        )
+        The quantity and methods are retrieved through the quantity_links relationship
+        of the orm object, which should be eagerly loaded by the query retrieving it
+        (see `RequestInfo.loader_options`).
+        """
 
-        with get_db() as session:
-            query_out = session.execute(query_inp).all()
+        # Retrieving methods and quantity
+        query_out = [
+            (link.quantity.quantity, link.quantity.method)
+            for link in db_request.quantity_links
+        ]
 
         if len(query_out) < 1:
             logger.raise_runtime_error(
@@ -70,11 +70,24 @@ class Request(BaseModel):
             methods.append(methods_iter)
         quantity = quantity_iter
 
+        # The parameters are keyed by method in the order they were requested, which
+        # the order of the rows in the link table does not guarantee
+        parameters = json.loads(db_request.parameters)
+        methods_order = list(parameters.keys())
+        methods.sort(
+            key=lambda method: (
+                methods_order.index(method)
+                if method in methods_order
+                else len(methods_order)
+            )
+        )
+
         init_params = {
             "quantity": quantity,
             "methods": methods,
-            "parameters": json.loads(db_request.parameters),
+            "parameters": parameters,
             "tenant_uuid": str(db_request.requesting_tenant_uuid),
+            "priority": db_request.priority,
         }
         return cls(**init_params)
 
@@ -84,6 +97,7 @@ class RequestInfo(BaseModel):
     ctime: datetime.datetime
     status: str
     request: Request
+    lease_expires_at: Optional[datetime.datetime] = None
 
     @classmethod
     def from_db_request(cls, db_request: DbRequest):
@@ -94,10 +108,21 @@ class RequestInfo(BaseModel):
             "ctime": db_request.requesting_recieved_timestamp,
             "status": db_request.status,
             "request": request_internals,
+            "lease_expires_at": db_request.lease_expires_at,
         }
 
         return cls(**init_params)
 
+    @staticmethod
+    def loader_options():
+        """
+        Loader options for queries of request orm objects, so that the quantity and
+        methods needed by `from_db_request` are retrieved within the same query
+        """
+        return joinedload(DbRequest.quantity_links).joinedload(
+            DBLinkQuantityRequest.quantity
+        )
+
 
 class Result(BaseModel):
     data: Dict[str, Any]
@@ -108,30 +133,13 @@ class Result(BaseModel):
     request_uuid: str
 
     @classmethod
-    def from_db_result(cls, db_result: DbResult):
-        """Initializes the object from the data of an orm object"""
-        # Retrieving methods and quantity from the quantity table
-        query_inp = (
-            select(DbQuantity.quantity, DbQuantity.method)
-            .join(DBLinkQuantityResult)
-            .join(DbResult)
-            .where(db_result.uuid == DBLinkQuantityResult.result_uuid)
-            .where(DbQuantity.uuid == DBLinkQuantityResult.method_uuid)
-        )
-
-        with get_db() as session:
-            query_out = session.execute(query_inp).all()
+    def from_db_result(cls, db_result: DbResult, quantity: str, method: str):
+        """Initializes the object from the data of an orm object
 
-        if len(query_out) != 1:
-            logger.raise_value_error(
-                logger=logger,
-                msg=(
-                    f"Db corrupted: Several output ({len(query_out)}) for retrieval of "
-                    f"method and quantity related to a result, only 1 output expected"
-                ),
-            )
-
-        quantity, method = query_out[0]
+        The quantity and method of the result are not stored in the result table, so
+        they are expected to be selected from the quantity table by the same query
+        retrieving the orm object (see `ResultInfo.query_with_capability`).
+        """
         init_params = {
             "data": json.loads(db_result.data),
             "quantity": quantity,
@@ -150,9 +158,9 @@ class ResultInfo(BaseModel):
     result: Result
 
     @classmethod
-    def from_db_result(cls, db_result: DbResult):
+    def from_db_result(cls, db_result: DbResult, quantity: str, method: str):
         """Initializes the object from the data of an orm object"""
-        result_internals = Result.from_db_result(db_result)
+        result_internals = Result.from_db_result(db_result, quantity, method)
         init_params = {
             "uuid": str(db_result.uuid),
             "ctime": db_result.load_time,
@@ -162,6 +170,32 @@ class ResultInfo(BaseModel):
 
         return cls(**init_params)
 
+    @staticmethod
+    def query_with_capability():
+        """
+        Query of the result orm objects together with the quantity and method of each
+        result, which are needed by `from_db_result`
+        """
+        return (
+            select(DbResult, DbQuantity.quantity, DbQuantity.method)
+            .join(
+                DBLinkQuantityResult, DBLinkQuantityResult.result_uuid == DbResult.uuid
+            )
+            .join(DbQuantity, DbQuantity.uuid == DBLinkQuantityResult.method_uuid)
+        )
+
+
+class StatusChange(BaseModel):
+    uuid: str
+    new_status: str
+    status_change_message: Optional[str] = None
+
+
+class BatchItemOutcome(BaseModel):
+    uuid: Optional[str]
+    success: bool
+    detail: str
+
 
 class CapabilityInfo(BaseModel):
     quantity: str
@@ -1,10 +1,12 @@
 import json
+import threading
 import time
 from datetime import datetime
 from typing import Any, Callable, Optional, Union, cast
 
 import requests
-from pydantic import BaseModel
+from jose import jwt
+from pydantic import BaseModel, PrivateAttr
 
 from FINALES2.engine.main import RequestStatus, ResultStatus
 from FINALES2.schemas import GeneralMetaData, Quantity, ServerConfig
@@ -25,15 +27,26 @@ class Tenant(BaseModel):
     quantities: dict[str, Quantity]
     queue: list = []
     sleep_time_s: int = 1
+    wait_timeout_s: int = 60
+    # must be shorter than the lease of the reservations configured on the server
+    heartbeat_interval_s: int = 60
     tenant_config: Any = None
     run_method: Callable
     prepare_results: Callable
     FINALES_server_config: ServerConfig
     end_run_time: Optional[datetime] = None
     authorization_header: Optional[dict] = None
+    # unix timestamp of the expiration of the access token in the authorization header
+    token_expiration: Optional[float] = None
+    # the access token is renewed this long before it expires
+    token_refresh_margin_s: int = 60
+    # API key of the tenant user (see `finales db add api-key`), which is used instead
+    # of logging in with the password of the tenant user
+    api_key: Optional[str] = None
     operators: list[User]
     tenant_user: User
     tenant_uuid: str
+    _token_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
 
     def tenant_object_to_json(self):
         """
@@ -74,6 +87,52 @@ class Tenant(BaseModel):
         # Impelemented using this tutorial as an example:
         # https://realpython.com/primer-on-python-decorators/#is-the-user-logged-in
         def _login_func(self, *args, **kwargs):
+            self._ensure_access_token()
+            try:
+                return func(self, *args, **kwargs)
+            except requests.HTTPError as error:
+                # the token is not accepted anymore (e.g. the server was restarted
+                # with a new secret key), so log in again and retry once
+                if (
+                    error.response is None
+                    or error.response.status_code != 401
+                    or self.api_key is not None
+                ):
+                    raise
+                self._ensure_access_token(force_refresh=True)
+                return func(self, *args, **kwargs)
+
+        return _login_func
+
+    def _ensure_access_token(self, force_refresh: bool = False) -> None:
+        """This function logs in to the FINALES server, if the tenant has no access
+        token yet or its access token expires within token_refresh_margin_s, and
+        reuses the access token otherwise. Tenants with an api_key use it instead of
+        an access token.
+
+        :param force_refresh: log in even if the access token is still valid, e.g.
+            after the server rejected it
+        :type force_refresh: bool
+        """
+        if self.api_key is not None:
+            # API keys do not expire and need no login
+            self.authorization_header = {
+                "accept": "application/json",
+                "Authorization": f"Bearer {self.api_key}",
+            }
+            return
+
+        with self._token_lock:
+            if (
+                not force_refresh
+                and self.authorization_header is not None
+                and (
+                    self.token_expiration is None
+                    or time.time() < self.token_expiration - self.token_refresh_margin_s
+                )
+            ):
+                return
+
             print("Logging in ...")
             access_information = requests.post(
                 (
@@ -93,7 +152,12 @@ class Tenant(BaseModel):
                     "Content-Type": "application/x-www-form-urlencoded",
                 },
             )
+            access_information.raise_for_status()
             access_information = access_information.json()
+            # the expiration time of the token is read without verifying the
+            # signature, which only the server can do
+            token_claims = jwt.get_unverified_claims(access_information["access_token"])
+            self.token_expiration = token_claims.get("exp")
             self.authorization_header = {
                 "accept": "application/json",
                 "Authorization": (
@@ -101,9 +165,6 @@ class Tenant(BaseModel):
                     f"{access_information['access_token']}"
                 ),
             }
-            return func(self, *args, **kwargs)
-
-        return _login_func
 
     def _checkQuantity(self, request: Request) -> bool:
         """This function checks, if a quantity in a request can be provided by the
@@ -276,9 +337,74 @@ class Tenant(BaseModel):
         pendingRequests = requests.get(
             f"http://{self.FINALES_server_config.host}"
             f":{self.FINALES_server_config.port}/pending_requests/",
-            params={},
+            params={"tenant_uuid": self.tenant_uuid},
+            headers=self.authorization_header,
+        )
+        pendingRequests.raise_for_status()
+        return pendingRequests.json()
+
+    @_login
+    def _claim_request(self) -> Optional[dict]:
+        """This function reserves the pending request with the highest priority for one
+        of the methods of the tenant and adds it to the queue.
+
+        :return: the reserved request in JSON format, with only the method claimed
+            in its list of methods, or None if there is no pending request for the
+            tenant
+        :rtype: Optional[dict]
+        """
+        print("Looking for tasks ...")
+        for quantity, quantity_info in self.quantities.items():
+            for method in quantity_info.methods.keys():
+                claimed_request = requests.post(
+                    f"http://{self.FINALES_server_config.host}"
+                    f":{self.FINALES_server_config.port}/requests/claim",
+                    params={
+                        "quantity": quantity,
+                        "method": method,
+                        "tenant_uuid": self.tenant_uuid,
+                    },
+                    headers=self.authorization_header,
+                )
+                claimed_request.raise_for_status()
+                claimed_item = claimed_request.json()
+                if claimed_item is None:
+                    continue
+
+                # Only the claimed method is kept, since this is the one the tenant
+                # will use for creating the result
+                claimed_item["request"]["methods"] = [method]
+                print(f"{claimed_item['uuid']}: Reserved for {self.tenant_uuid}!")
+                self.queue.append(claimed_item)
+                return claimed_item
+
+        return None
+
+    @_login
+    def _wait_for_pending_requests(self) -> list[dict]:
+        """This function waits on the server until there are pending requests for the
+        capabilities of the tenant, or until the wait_timeout_s expires.
+
+        The server only returns the requests within the limitations of the tenant.
+
+        :return: a list of pending requests in JSON format (empty if the timeout
+            expired)
+        :rtype: list[dict]
+        """
+        print("Waiting for tasks ...")
+        params: dict[str, Any] = {
+            "timeout": self.wait_timeout_s,
+            "limit": 1,
+            "tenant_uuid": self.tenant_uuid,
+        }
+        pendingRequests = requests.get(
+            f"http://{self.FINALES_server_config.host}"
+            f":{self.FINALES_server_config.port}/pending_requests/wait",
+            params=params,
             headers=self.authorization_header,
+            timeout=self.wait_timeout_s + 30,
         )
+        pendingRequests.raise_for_status()
         return pendingRequests.json()
 
     # TODO: implement (input) validations.
@@ -288,6 +414,7 @@ class Tenant(BaseModel):
         quantity: str,
         methods: list[str],
         parameters: dict[str, dict[str, Any]],
+        priority: int = 0,
     ) -> None:
         """This function posts a request.
 
@@ -299,6 +426,9 @@ class Tenant(BaseModel):
             running the method; first key is the name of the method, the second level
             keys are the names of the parameters
         :type parameters: dict[str, dict[str, Any]]
+        :param priority: the priority of the request, requests with a higher priority
+            are worked on first
+        :type priority: int
         """
 
         request = Request(
@@ -306,6 +436,7 @@ class Tenant(BaseModel):
             methods=methods,
             parameters=parameters,
             tenant_uuid=self.tenant_uuid,
+            priority=priority,
         ).model_dump()
 
         _posted_request = requests.post(
@@ -357,6 +488,7 @@ class Tenant(BaseModel):
                 params={"quantity": quantity, "method": method},
                 headers=self.authorization_header,
             )
+            results.raise_for_status()
             return results.json()
         else:
             if (quantity is not None) or (method is not None):
@@ -371,6 +503,7 @@ class Tenant(BaseModel):
                 params={},
                 headers=self.authorization_header,
             )
+            result.raise_for_status()
             return result.json()
 
     @_login
@@ -407,15 +540,55 @@ class Tenant(BaseModel):
             print(f"Request with UUID {requestUUID} still in queue!")
 
     @_login
+    def _send_heartbeat(self, request_uuid: str) -> None:
+        """This function extends the lease of a request reserved by the tenant, so it
+        is not returned to the pending requests while the tenant works on it.
+
+        :param request_uuid: the uuid of the reserved request
+        :type request_uuid: str
+        """
+        heartbeat = requests.post(
+            f"http://{self.FINALES_server_config.host}"
+            f":{self.FINALES_server_config.port}/requests/{request_uuid}/heartbeat",
+            params={"tenant_uuid": self.tenant_uuid},
+            headers=self.authorization_header,
+        )
+        heartbeat.raise_for_status()
+
+    def _keep_lease(
+        self, request_uuid: str, stop: threading.Event, lost: threading.Event
+    ) -> None:
+        """This function sends a heartbeat for the request every heartbeat_interval_s
+        until the stop event is set, or until the server refuses the heartbeat because
+        the request is not reserved by the tenant anymore, in which case the lost
+        event is set.
+
+        :param request_uuid: the uuid of the reserved request
+        :type request_uuid: str
+        :param stop: the event to set when the tenant finished working on the request
+        :type stop: threading.Event
+        :param lost: the event set when the reservation is lost
+        :type lost: threading.Event
+        """
+        while not stop.wait(self.heartbeat_interval_s):
+            try:
+                self._send_heartbeat(request_uuid)
+            except requests.HTTPError as error:
+                if error.response is not None and error.response.status_code == 409:
+                    # the lease expired and the request was returned to the pending
+                    # requests, so it may already be worked on by another tenant
+                    print(f"{request_uuid}: Reservation lost: {error}")
+                    lost.set()
+                    return
+                print(f"{request_uuid}: Heartbeat failed: {error}")
+            except requests.RequestException as error:
+                # the next heartbeat may still reach the server before the lease
+                # expires
+                print(f"{request_uuid}: Heartbeat failed: {error}")
+
     def _run_method(self, request_info: dict[str, Any]):
         print("Running method ...")
-        # mark the request as "reserved", (cast required to assert mypy, this will be
-        # not None, when this is called)
-        self._change_status(
-            req_res_dict=request_info,
-            new_status=RequestStatus.RESERVED,
-            status_change_message=f"Reserved for {self.tenant_user.username}.",
-        )
+        # the request was already marked as "reserved" when it was claimed
         return self.run_method(request_info)
 
     def _prepare_results(self, request: dict, data: Any) -> dict[str, Any]:
@@ -423,36 +596,64 @@ class Tenant(BaseModel):
         return self.prepare_results(request, data)
 
     def run(self):
-        """This function runs the tenant in a loop - getting all the requests from
-        the server, checking them for their compatibility with the tenant and posting
-        them to the server.
+        """This function runs the tenant in a loop - reserving the pending request
+        with the highest priority compatible with the tenant on the server, processing
+        it and posting the result to the server.
         """
         # run until the end_run_time is exceeded
         # this is intended for maintenance like refilling consumables,
         # for which a time can roughly be estimated
         while datetime.now() < self.end_run_time:
-            # wait in between two requests to the server
-            time.sleep(self.sleep_time_s)
-            self._update_queue()
-            if len(self.queue) > 0:
-                # get the first request in the queue to work on -> first in - first out
-                activeRequest = self.queue[0]
-
-                try:
-                    # get the method, which matches
-                    resultData = self._run_method(request_info=activeRequest)
-                    # post the result
-                    self._post_result(request=activeRequest, data=resultData)
-                # To catch errors during the execution of the method or if the
-                # execution is interrupted intentionally by the user
-                # using KeyboardInterrupt
-                except (Exception, KeyboardInterrupt):
-                    self._change_status(
-                        req_res_dict=activeRequest,
-                        new_status=RequestStatus.PENDING,
-                        status_change_message=(
-                            f"Processing of request {activeRequest['uuid']} failed."
-                        ),
+            # the request is reserved on the server when it is claimed, so no other
+            # tenant can work on it at the same time
+            activeRequest = self._claim_request()
+            if activeRequest is None:
+                # wait on the server until a new request for the tenant arrives; if
+                # there are pending requests the tenant could not claim (e.g. claimed
+                # by another tenant in between), wait before trying again
+                if len(self._wait_for_pending_requests()) > 0:
+                    time.sleep(self.sleep_time_s)
+                continue
+
+            # keep the reservation alive while working on the request; if the tenant
+            # dies, the server returns the request to the pending requests once the
+            # lease expires
+            stopHeartbeat = threading.Event()
+            leaseLost = threading.Event()
+            heartbeat = threading.Thread(
+                target=self._keep_lease,
+                args=(activeRequest["uuid"], stopHeartbeat, leaseLost),
+                daemon=True,
+            )
+            heartbeat.start()
+            try:
+                # get the method, which matches
+                resultData = self._run_method(request_info=activeRequest)
+                # the result is not posted if the reservation was lost in the meantime,
+                # since the request may be worked on by another tenant by now
+                if leaseLost.is_set():
+                    print(
+                        f"{activeRequest['uuid']}: Result discarded, the reservation "
+                        "was lost."
                     )
+                    continue
+                # post the result
+                self._post_result(request=activeRequest, data=resultData)
+            # To catch errors during the execution of the method or if the
+            # execution is interrupted intentionally by the user
+            # using KeyboardInterrupt
+            except (Exception, KeyboardInterrupt):
+                # a lost reservation is not the tenant's to give back anymore
+                if leaseLost.is_set():
                     raise
-            continue
+                self._change_status(
+                    req_res_dict=activeRequest,
+                    new_status=RequestStatus.PENDING,
+                    status_change_message=(
+                        f"Processing of request {activeRequest['uuid']} failed."
+                    ),
+                )
+                raise
+            finally:
+                stopHeartbeat.set()
+                heartbeat.join()
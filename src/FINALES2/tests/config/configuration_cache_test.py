@@ -0,0 +1,31 @@
+import json
+
+from FINALES2.config import ConfigurationCache
+
+
+def test_configuration_cache(tmp_path, monkeypatch):
+    """Checks that the config file is only read again when it changed."""
+    config_filepath = tmp_path / "config.json"
+    monkeypatch.setenv("FINALES_CONFIG_FILEPATH", str(config_filepath))
+    configuration_cache = ConfigurationCache()
+    configuration_cache.refresh_check_interval_s = 0.0
+
+    # The config file is created with the default values
+    configuration = configuration_cache.get()
+    assert config_filepath.exists()
+    assert configuration.user_cache_size == 1024
+    assert configuration_cache.get() is configuration
+
+    config_filepath.write_text(json.dumps({"user_cache_size": 16}))
+    configuration = configuration_cache.get()
+    assert configuration.user_cache_size == 16
+    assert configuration_cache.get() is configuration
+
+    configuration_cache.invalidate()
+    assert configuration_cache.get() is not configuration
+
+    # Within the check interval the cached configuration is used
+    configuration_cache.refresh_check_interval_s = 60.0
+    configuration = configuration_cache.get()
+    config_filepath.write_text(json.dumps({"user_cache_size": 8}))
+    assert configuration_cache.get() is configuration
@@ -0,0 +1,38 @@
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from FINALES2.config import FinalesConfiguration
+from FINALES2.db import Base
+from FINALES2.db.session import create_database_engine
+
+
+@pytest.fixture
+def database_engine(tmp_path):
+    """Returns an engine, set up like the one of the server, for a new sqlite database
+    with all the tables."""
+    config = FinalesConfiguration(database_url=f"sqlite:///{tmp_path / 'test.db'}")
+    database_engine = create_database_engine(config)
+    Base.metadata.create_all(bind=database_engine)
+    yield database_engine
+    database_engine.dispose()
+
+
+@pytest.fixture
+def empty_database_context(database_engine):
+    """Returns the database_context (like `get_db`) of the new database, which has no
+    rows yet."""
+    session_factory = sessionmaker(
+        autocommit=False, autoflush=False, bind=database_engine
+    )
+
+    @contextmanager
+    def get_test_db():
+        session = session_factory()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    return get_test_db
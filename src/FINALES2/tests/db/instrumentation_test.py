@@ -0,0 +1,31 @@
+from sqlalchemy import create_engine, text
+
+from FINALES2.db.instrumentation import instrument_engine, track_queries
+
+
+def test_track_queries():
+    """Checks that only the statements executed within the context are counted."""
+    engine = create_engine("sqlite://")
+    instrument_engine(engine, slow_query_threshold_ms=float("inf"))
+
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+        with track_queries() as statistics:
+            connection.execute(text("SELECT 1"))
+            connection.execute(text("SELECT 2"))
+        connection.execute(text("SELECT 3"))
+
+    assert statistics.count == 2
+    assert statistics.total_duration_s >= statistics.max_duration_s > 0
+
+
+def test_slow_query_log(caplog):
+    """Checks that the statements above the threshold are logged."""
+    engine = create_engine("sqlite://")
+    instrument_engine(engine, slow_query_threshold_ms=0)
+
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 42"))
+
+    assert "Slow query" in caplog.text
+    assert "SELECT 42" in caplog.text
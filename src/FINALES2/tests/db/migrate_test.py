@@ -0,0 +1,59 @@
+import uuid
+
+import pytest
+from sqlalchemy import inspect, text
+
+from FINALES2.db import Base
+from FINALES2.db.migrate import migrate_database
+
+
+def test_migrate_database_keeps_data(database_engine):
+    """Checks the migration of a database created without the indexes."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.drop(bind=database_engine)
+    with database_engine.begin() as connection:
+        connection.execute(text("ALTER TABLE tenant DROP COLUMN contact_person"))
+        connection.execute(text("DROP TABLE status_counter"))
+        connection.execute(
+            text(
+                "INSERT INTO quantity (uuid, quantity, method, specifications, "
+                "result_output, is_active) VALUES (:uuid, 'q', 'm', '{}', '{}', 1)"
+            ),
+            {"uuid": str(uuid.uuid4())},
+        )
+
+    changes = migrate_database(database_engine)
+
+    assert "Added column tenant.contact_person" in changes
+    assert "Created index uq_quantity_quantity_method_active on quantity" in changes
+    assert "Created table status_counter" in changes
+    inspector = inspect(database_engine)
+    assert "ix_request_status" in {
+        index["name"] for index in inspector.get_indexes("request")
+    }
+    with database_engine.connect() as connection:
+        assert connection.execute(text("SELECT count(*) FROM quantity")).scalar() == 1
+
+    # The database is now up to date
+    assert migrate_database(database_engine) == []
+
+
+def test_migrate_database_duplicated_active_capability(database_engine):
+    """Checks that duplicated active capabilities are reported, not removed."""
+    with database_engine.begin() as connection:
+        connection.execute(text("DROP INDEX uq_quantity_quantity_method_active"))
+        for _ in range(2):
+            connection.execute(
+                text(
+                    "INSERT INTO quantity (uuid, quantity, method, specifications, "
+                    "result_output, is_active) VALUES (:uuid, 'q', 'm', '{}', '{}', 1)"
+                ),
+                {"uuid": str(uuid.uuid4())},
+            )
+
+    with pytest.raises(ValueError, match="duplicated entries"):
+        migrate_database(database_engine)
+
+    with database_engine.connect() as connection:
+        assert connection.execute(text("SELECT count(*) FROM quantity")).scalar() == 2
@@ -0,0 +1,56 @@
+from sqlalchemy.orm import Session
+
+from FINALES2.db.status_counters import (
+    REQUEST_KIND,
+    RESULT_KIND,
+    StatusCounterChanges,
+    read_status_counts,
+    rebuild_status_counters,
+)
+
+
+def test_status_counter_changes(database_engine):
+    """Checks that status changes are added up in the counters."""
+    with Session(database_engine) as session:
+        status_counter_changes = StatusCounterChanges()
+        for _ in range(3):
+            status_counter_changes.change(
+                REQUEST_KIND,
+                [("density", "method1"), ("density", "method2")],
+                None,
+                "pending",
+            )
+        status_counter_changes.change(
+            RESULT_KIND, [("density", "method1")], None, "original"
+        )
+        status_counter_changes.apply(session)
+        session.commit()
+
+        status_counter_changes = StatusCounterChanges()
+        status_counter_changes.change(
+            REQUEST_KIND, [("density", "method1")], "pending", "reserved"
+        )
+        status_counter_changes.change(
+            REQUEST_KIND, [("density", "method1")], "pending", "pending"
+        )
+        status_counter_changes.apply(session)
+        session.commit()
+
+        assert read_status_counts(session) == {
+            REQUEST_KIND: {
+                "density": {
+                    "method1": {"pending": 2, "reserved": 1},
+                    "method2": {"pending": 3},
+                }
+            },
+            RESULT_KIND: {"density": {"method1": {"original": 1}}},
+        }
+        assert read_status_counts(session, method="method2") == {
+            REQUEST_KIND: {"density": {"method2": {"pending": 3}}},
+            RESULT_KIND: {},
+        }
+
+        # Without any requests and results in the tables, all counters are dropped
+        assert rebuild_status_counters(session) == 0
+        session.commit()
+        assert read_status_counts(session) == {REQUEST_KIND: {}, RESULT_KIND: {}}
@@ -0,0 +1,68 @@
+import json
+import uuid
+
+import pytest
+
+from FINALES2.db import Quantity
+from FINALES2.engine.capability_registry import CapabilityRegistry
+
+
+@pytest.fixture
+def database_context(empty_database_context):
+    """Returns the database_context of a database without capabilities."""
+    return empty_database_context
+
+
+def add_capability(database_context, quantity, method, is_active=True):
+    """Adds a row to the quantity table and returns its uuid."""
+    schema = {"type": "object", "properties": {"temperature": {"type": "number"}}}
+    capability = Quantity(
+        uuid=uuid.uuid4(),
+        quantity=quantity,
+        method=method,
+        specifications=json.dumps(schema),
+        result_output=json.dumps({}),
+        is_active=is_active,
+    )
+    with database_context() as session:
+        session.add(capability)
+        session.commit()
+        return capability.uuid
+
+
+class TestCapabilityRegistry:
+    """Tests for the `CapabilityRegistry` class."""
+
+    def test_lookup(self, database_context):
+        """Test that active capabilities are resolved to their uuid."""
+        capability_uuid = add_capability(database_context, "density", "method1")
+        add_capability(database_context, "density", "method2", is_active=False)
+        registry = CapabilityRegistry(database_context=database_context)
+
+        capability = registry.lookup("density", "method1")
+        assert capability.uuid == capability_uuid
+        assert capability.info.json_schema_specifications["type"] == "object"
+        assert registry.has_quantity("density")
+        assert not registry.has_capability("density", "method2")
+        with pytest.raises(ValueError):
+            registry.lookup("density", "method2")
+
+    def test_invalidate(self, database_context):
+        """Test that an invalidated registry is rebuilt on the next access."""
+        registry = CapabilityRegistry(database_context=database_context)
+        assert not registry.has_quantity("density")
+        version = registry.version
+
+        add_capability(database_context, "density", "method1")
+        registry.invalidate()
+        assert registry.has_capability("density", "method1")
+        assert registry.version == version + 1
+
+    def test_external_changes(self, database_context):
+        """Test that changes by other processes are detected by the fingerprint."""
+        registry = CapabilityRegistry(database_context=database_context)
+        registry.refresh_check_interval_s = 0.0
+        assert len(registry.capabilities()) == 0
+
+        add_capability(database_context, "density", "method1")
+        assert len(registry.capabilities(quantity="density")) == 1
@@ -0,0 +1,69 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from FINALES2.db.status_counters import REQUEST_KIND
+from FINALES2.engine.main import Engine, RequestStatus
+from FINALES2.server.schemas import Request
+
+
+def post_request(engine, tenant_uuid, temperature, method="method1"):
+    """Posts a pending request for the method of density, returns its uuid."""
+    return engine.create_request(
+        Request(
+            quantity="density",
+            methods=[method],
+            parameters={method: {"temperature": temperature}},
+            tenant_uuid=tenant_uuid,
+        )
+    )
+
+
+class TestClaimRequest:
+    """Tests for tenants claiming pending requests."""
+
+    def test_single_winner(self, database_context, tenant_uuid):
+        """Test that each request is reserved by exactly one of several concurrent
+        claims, and that the remaining claims get nothing."""
+        engine = Engine(database_context=database_context)
+        request_uuids = [post_request(engine, tenant_uuid, 20) for _ in range(3)]
+
+        def claim(_):
+            claimed_request = Engine(database_context=database_context).claim_request(
+                "density", "method1", tenant_uuid
+            )
+            return None if claimed_request is None else claimed_request.uuid
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            claimed_uuids = list(executor.map(claim, range(8)))
+
+        winners = [claimed for claimed in claimed_uuids if claimed is not None]
+        assert sorted(winners) == sorted(request_uuids)
+        assert claimed_uuids.count(None) == 5
+        for request_uuid in request_uuids:
+            request_info = engine.get_request(request_uuid)
+            assert request_info.status == RequestStatus.RESERVED.value
+            assert request_info.lease_expires_at is not None
+        assert engine.get_status_counts()[REQUEST_KIND]["density"]["method1"] == {
+            "reserved": 3
+        }
+
+    def test_tenant_limitations(self, engine, tenant_uuid):
+        """Test that only requests within the limitations of the tenant are claimed."""
+        post_request(engine, tenant_uuid, 80)
+        request_uuid = post_request(engine, tenant_uuid, 20)
+
+        assert engine.claim_request("density", "method1", tenant_uuid).uuid == (
+            request_uuid
+        )
+        assert engine.claim_request("density", "method1", tenant_uuid) is None
+        with pytest.raises(ValueError):
+            engine.claim_request("density", "method2", tenant_uuid)
+
+    def test_nothing_claimable(self, engine, tenant_uuid):
+        """Test that None is returned when there are no pending requests."""
+        assert engine.claim_request("density", "method1", tenant_uuid) is None
+
+        request_uuid = post_request(engine, tenant_uuid, 20)
+        engine.change_status_request(request_uuid, RequestStatus.RETRACTED)
+        assert engine.claim_request("density", "method1", tenant_uuid) is None
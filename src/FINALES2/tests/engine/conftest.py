@@ -0,0 +1,70 @@
+import pytest
+from sqlalchemy import select
+
+from FINALES2.db import Tenant
+from FINALES2.engine.capability_registry import capability_registry
+from FINALES2.engine.limitations import limitations_cache
+from FINALES2.engine.main import Engine
+from FINALES2.engine.scheduler import request_scheduler
+from FINALES2.engine.server_manager import ServerManager
+
+PARAMETERS_SCHEMA = {
+    "type": "object",
+    "properties": {"temperature": {"type": "number"}},
+    "required": ["temperature"],
+}
+
+
+@pytest.fixture
+def database_context(empty_database_context, monkeypatch):
+    """Returns the database_context of a new sqlite database with the capabilities
+    density/method1 and density/method2 and a tenant for density/method1 between 0 and
+    50 degrees. The caches of the engine use this database during the test."""
+    caches = (capability_registry, limitations_cache, request_scheduler)
+    for cache in caches:
+        monkeypatch.setattr(cache, "_database_context", empty_database_context)
+        cache.invalidate()
+
+    server_manager = ServerManager(database_context=empty_database_context)
+    for method in ("method1", "method2"):
+        server_manager.add_capability(
+            {
+                "quantity": "density",
+                "method": method,
+                "json_schema_specifications": PARAMETERS_SCHEMA,
+                "json_schema_result_output": {},
+                "is_active": True,
+            }
+        )
+    server_manager.add_tenant(
+        {
+            "name": "tenant1",
+            "contact_person": "operator",
+            "limitations": [
+                {
+                    "quantity": "density",
+                    "method": "method1",
+                    "limitations": {"temperature": [{"min": 0, "max": 50}]},
+                }
+            ],
+        }
+    )
+
+    yield empty_database_context
+
+    # Rebuilt from the database of the server on their next use
+    for cache in caches:
+        cache.invalidate()
+
+
+@pytest.fixture
+def engine(database_context):
+    """Returns an engine for the test database."""
+    return Engine(database_context=database_context)
+
+
+@pytest.fixture
+def tenant_uuid(database_context):
+    """Returns the uuid of the tenant of the test database."""
+    with database_context() as session:
+        return str(session.execute(select(Tenant.uuid)).scalar_one())
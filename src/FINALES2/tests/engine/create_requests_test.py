@@ -0,0 +1,81 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+
+from FINALES2.db import Request as DbRequest
+from FINALES2.server.endpoints import operations_router
+from FINALES2.server.schemas import Request
+from FINALES2.user_management import user_manager
+
+
+def make_request(tenant_uuid, temperature):
+    """Returns a request for density/method1 at the given temperature."""
+    return Request(
+        quantity="density",
+        methods=["method1"],
+        parameters={"method1": {"temperature": temperature}},
+        tenant_uuid=tenant_uuid,
+    )
+
+
+def count_requests(database_context):
+    """Returns the number of requests in the database."""
+    with database_context() as session:
+        return session.execute(select(func.count()).select_from(DbRequest)).scalar()
+
+
+class TestCreateRequests:
+    """Tests for posting several requests at once."""
+
+    def test_create_requests_keeps_order(self, engine, tenant_uuid):
+        """Test that the requests of a batch keep the order of the input list."""
+        request_uuids = engine.create_requests(
+            [make_request(tenant_uuid, temperature) for temperature in range(5)]
+        )
+
+        all_requests, _ = engine.get_all_requests()
+        assert [request.uuid for request in all_requests] == request_uuids
+        pending_requests, _ = engine.get_pending_requests()
+        assert [request.uuid for request in pending_requests] == request_uuids
+
+    def test_create_requests_rejects_invalid_batch(
+        self, engine, database_context, tenant_uuid
+    ):
+        """Test that a request failing the parameter schema rejects the whole batch,
+        and that its position is only named if several requests were posted."""
+        invalid_request = Request(
+            quantity="density",
+            methods=["method1"],
+            parameters={"method1": {"temperature": "hot"}},
+            tenant_uuid=tenant_uuid,
+        )
+        with pytest.raises(ValueError, match="position 1"):
+            engine.create_requests([make_request(tenant_uuid, 10), invalid_request])
+        assert count_requests(database_context) == 0
+
+        with pytest.raises(ValueError) as error:
+            engine.create_request(invalid_request)
+        assert "position" not in str(error.value)
+        assert "parameters of the request are invalid" in str(error.value)
+        assert count_requests(database_context) == 0
+
+    def test_post_requests_batch_invalid(self, database_context, tenant_uuid):
+        """Test that the endpoint answers an invalid batch with a 400."""
+        app = FastAPI()
+        app.include_router(operations_router)
+        app.dependency_overrides[user_manager.get_active_user] = lambda: {}
+        batch = [
+            make_request(tenant_uuid, 10).model_dump(),
+            {
+                "quantity": "density",
+                "methods": ["method1"],
+                "parameters": {"method1": {}},
+                "tenant_uuid": tenant_uuid,
+            },
+        ]
+
+        response = TestClient(app).post("/requests/batch", json=batch)
+        assert response.status_code == 400
+        assert "position 1" in response.json()["detail"]
+        assert count_requests(database_context) == 0
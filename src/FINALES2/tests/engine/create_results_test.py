@@ -0,0 +1,84 @@
+import uuid
+
+from FINALES2.db.status_counters import REQUEST_KIND, RESULT_KIND
+from FINALES2.engine.main import RequestStatus
+from FINALES2.server.schemas import Request, Result
+
+
+def post_request(engine, tenant_uuid, temperature=20):
+    """Posts a pending request for density/method1, returns its uuid."""
+    return engine.create_request(
+        Request(
+            quantity="density",
+            methods=["method1"],
+            parameters={"method1": {"temperature": temperature}},
+            tenant_uuid=tenant_uuid,
+        )
+    )
+
+
+def make_result(tenant_uuid, request_uuid, temperature=20):
+    """Returns a result of density/method1 for the request."""
+    return Result(
+        data={"density": 1.0},
+        quantity="density",
+        method=["method1"],
+        parameters={"method1": {"temperature": temperature}},
+        tenant_uuid=tenant_uuid,
+        request_uuid=request_uuid,
+    )
+
+
+class TestCreateResults:
+    """Tests for posting several results at once."""
+
+    def test_outcomes(self, engine, tenant_uuid):
+        """Test that every result gets its own outcome, and that the invalid ones do
+        not stop the others from being stored."""
+        request_uuid = post_request(engine, tenant_uuid)
+        other_request_uuid = post_request(engine, tenant_uuid)
+
+        outcomes = engine.create_results(
+            [
+                make_result(tenant_uuid, request_uuid),
+                make_result(tenant_uuid, request_uuid, temperature="hot"),
+                make_result(tenant_uuid, "not-a-uuid"),
+                make_result(tenant_uuid, str(uuid.uuid4())),
+                make_result(tenant_uuid, request_uuid),
+            ]
+        )
+
+        assert [outcome.success for outcome in outcomes] == [
+            True,
+            False,
+            False,
+            False,
+            True,
+        ]
+        assert "no request" in outcomes[3].detail
+        for outcome in outcomes:
+            assert (outcome.uuid is not None) == outcome.success
+
+        # Both results of the request are stored, and it is resolved once
+        stored_results, _ = engine.get_all_results("density", "method1")
+        assert sorted(result.uuid for result in stored_results) == sorted(
+            [outcomes[0].uuid, outcomes[4].uuid]
+        )
+        assert engine.get_request(request_uuid).status == RequestStatus.RESOLVED.value
+        status_counts = engine.get_status_counts()
+        assert status_counts[REQUEST_KIND]["density"]["method1"] == {
+            "pending": 1,
+            "resolved": 1,
+        }
+        assert status_counts[RESULT_KIND]["density"]["method1"] == {"original": 2}
+
+        # The resolved request is not scheduled anymore
+        pending_requests, _ = engine.get_pending_requests()
+        assert [request.uuid for request in pending_requests] == [other_request_uuid]
+        claimed_request = engine.claim_request("density", "method1", tenant_uuid)
+        assert claimed_request.uuid == other_request_uuid
+
+    def test_empty_batch(self, engine):
+        """Test that an empty batch stores nothing."""
+        assert engine.create_results([]) == []
+        assert engine.get_status_counts().get(RESULT_KIND, {}) == {}
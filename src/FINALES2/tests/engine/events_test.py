@@ -0,0 +1,51 @@
+import asyncio
+import threading
+import uuid
+
+from FINALES2.engine.events import EventBroker, PendingRequestEvent
+
+
+def pending_request_event(quantity="density", methods=("method1",)):
+    """Returns an event for a new pending request."""
+    return PendingRequestEvent(
+        request_uuid=uuid.uuid4(),
+        quantity=quantity,
+        methods=list(methods),
+        parameters={method: {} for method in methods},
+    )
+
+
+def test_event_broker_delivers_matching_events():
+    """Checks that events published from another thread wake up the subscriber."""
+    broker = EventBroker()
+    expected_event = pending_request_event(methods=["method1", "method2"])
+
+    async def wait_for_event():
+        with broker.subscribe(
+            "topic", match=lambda event: event.matches("density", "method2")
+        ) as subscription:
+            publisher = threading.Thread(
+                target=lambda: [
+                    broker.publish("other_topic", pending_request_event()),
+                    broker.publish("topic", pending_request_event()),
+                    broker.publish("topic", expected_event),
+                ]
+            )
+            publisher.start()
+            event = await subscription.next_event(timeout=5)
+            publisher.join()
+        return event
+
+    assert asyncio.run(wait_for_event()) == expected_event
+    assert broker.subscriber_count("topic") == 0
+
+
+def test_event_broker_timeout():
+    """Checks that waiting without events returns None after the timeout."""
+    broker = EventBroker()
+
+    async def wait_for_event():
+        with broker.subscribe("topic") as subscription:
+            return await subscription.next_event(timeout=0.01)
+
+    assert asyncio.run(wait_for_event()) is None
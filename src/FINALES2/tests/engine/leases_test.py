@@ -0,0 +1,126 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select, update
+
+from FINALES2.db import Request as DbRequest
+from FINALES2.db import StatusLogRequest as DbStatusLogRequest
+from FINALES2.db.status_counters import REQUEST_KIND
+from FINALES2.engine.main import RequestStatus
+from FINALES2.server.schemas import Request
+
+
+def reserve_requests(engine, tenant_uuid, count):
+    """Posts and claims the given number of requests, returns their uuids."""
+    for temperature in range(count):
+        engine.create_request(
+            Request(
+                quantity="density",
+                methods=["method1"],
+                parameters={"method1": {"temperature": temperature}},
+                tenant_uuid=tenant_uuid,
+            )
+        )
+    return [
+        engine.claim_request("density", "method1", tenant_uuid).uuid
+        for _ in range(count)
+    ]
+
+
+def expire_leases(database_context, request_uuids):
+    """Moves the deadline of the leases of the requests into the past."""
+    with database_context() as session:
+        session.execute(
+            update(DbRequest)
+            .where(DbRequest.uuid.in_([uuid.UUID(i) for i in request_uuids]))
+            .values(lease_expires_at=datetime.now() - timedelta(seconds=1))
+        )
+        session.commit()
+
+
+class TestLeases:
+    """Tests for the leases of the reserved requests."""
+
+    def test_extend_lease(self, engine, tenant_uuid):
+        """Test that the lease of a claimed request is extended by the tenant that
+        claimed it, and that extending it fails for other tenants and for requests
+        that are not reserved or do not exist."""
+        (request_uuid,) = reserve_requests(engine, tenant_uuid, 1)
+        lease_expires_at = engine.extend_lease(request_uuid, tenant_uuid)
+        assert lease_expires_at > datetime.now()
+        assert engine.get_request(request_uuid).lease_expires_at == lease_expires_at
+        with pytest.raises(RuntimeError):
+            engine.extend_lease(request_uuid, str(uuid.uuid4()))
+
+        engine.change_status_request(request_uuid, RequestStatus.PENDING)
+        with pytest.raises(RuntimeError):
+            engine.extend_lease(request_uuid, tenant_uuid)
+        with pytest.raises(ValueError):
+            engine.extend_lease(str(uuid.uuid4()), tenant_uuid)
+
+    def test_claimed_again(self, engine, database_context, tenant_uuid):
+        """Test that a tenant whose lease expired can not extend the lease of the
+        tenant that claimed the request after it."""
+        (request_uuid,) = reserve_requests(engine, tenant_uuid, 1)
+        expire_leases(database_context, [request_uuid])
+        assert engine.release_expired_leases() == [request_uuid]
+
+        # Claimed again, as if by another tenant with the same limitations
+        other_tenant_uuid = str(uuid.uuid4())
+        with database_context() as session:
+            session.execute(
+                update(DbRequest)
+                .where(DbRequest.uuid == uuid.UUID(request_uuid))
+                .values(
+                    status=RequestStatus.RESERVED.value,
+                    lease_expires_at=datetime.now() + timedelta(seconds=60),
+                    reserved_by_tenant_uuid=uuid.UUID(other_tenant_uuid),
+                )
+            )
+            session.commit()
+
+        with pytest.raises(RuntimeError):
+            engine.extend_lease(request_uuid, tenant_uuid)
+        assert engine.extend_lease(request_uuid, other_tenant_uuid) > datetime.now()
+
+    def test_reserved_by_status_change(self, engine, database_context, tenant_uuid):
+        """Test that a request reserved by changing its status has no lease, so it is
+        not returned to the pending requests."""
+        (request_uuid,) = reserve_requests(engine, tenant_uuid, 1)
+        engine.change_status_request(request_uuid, RequestStatus.PENDING)
+        engine.change_status_request(request_uuid, RequestStatus.RESERVED)
+
+        assert engine.get_request(request_uuid).lease_expires_at is None
+        with pytest.raises(RuntimeError):
+            engine.extend_lease(request_uuid, tenant_uuid)
+        assert engine.release_expired_leases() == []
+        assert engine.get_request(request_uuid).status == RequestStatus.RESERVED.value
+
+    def test_release_expired_leases(self, engine, database_context, tenant_uuid):
+        """Test that all requests with an expired lease are released in one sweep,
+        while requests with a valid lease stay reserved."""
+        request_uuids = reserve_requests(engine, tenant_uuid, 4)
+        expire_leases(database_context, request_uuids[:3])
+
+        assert sorted(engine.release_expired_leases()) == sorted(request_uuids[:3])
+        assert engine.release_expired_leases() == []
+
+        for request_uuid in request_uuids[:3]:
+            request_info = engine.get_request(request_uuid)
+            assert request_info.status == RequestStatus.PENDING.value
+            assert request_info.lease_expires_at is None
+        assert engine.get_request(request_uuids[3]).status == "reserved"
+
+        with database_context() as session:
+            log_messages = session.execute(
+                select(DbStatusLogRequest.status_change_message).where(
+                    DbStatusLogRequest.status == RequestStatus.PENDING.value
+                )
+            ).all()
+        assert sum("lease" in message for (message,) in log_messages) == 3
+
+        assert engine.get_status_counts()[REQUEST_KIND]["density"]["method1"] == {
+            "pending": 3,
+            "reserved": 1,
+        }
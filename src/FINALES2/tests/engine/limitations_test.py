@@ -0,0 +1,86 @@
+from FINALES2.engine.limitations import TenantLimitations, compile_limitation
+
+
+def test_compile_limitation_ranges_and_alternatives():
+    """Checks the ranges with steps and the alternatives of a limitation."""
+    matches = compile_limitation(
+        {
+            "temperature": [{"min": 10, "max": 50, "step": 0.5}, 100],
+            "solvent": ["water", "ethanol"],
+        }
+    )
+
+    assert matches({"temperature": 12.5, "solvent": "water"})
+    assert matches({"temperature": 100, "solvent": "ethanol"})
+    # properties missing in the value are not restricted
+    assert matches({"temperature": 50})
+    assert not matches({"temperature": 12.6, "solvent": "water"})
+    assert not matches({"temperature": 60, "solvent": "water"})
+    assert not matches({"temperature": 20, "solvent": "acetone"})
+    assert not matches({"temperature": True})
+
+
+def test_compile_limitation_nested_objects_and_lists():
+    """Checks the limitations of nested objects and of list values."""
+    matches = compile_limitation(
+        {
+            "formulation": [
+                [
+                    {
+                        "chemical": {"SMILES": ["O", "CCO"]},
+                        "fraction": {"min": 0, "max": 1},
+                    }
+                ]
+            ],
+            "steps": [["heat", "stir"]],
+        }
+    )
+
+    assert matches(
+        {
+            "formulation": [
+                {"chemical": {"SMILES": "O"}, "fraction": 0.4},
+                {"chemical": {"SMILES": "CCO"}, "fraction": 0.6},
+            ],
+            "steps": ["stir", "heat", "stir"],
+        }
+    )
+    assert not matches(
+        {"formulation": [{"chemical": {"SMILES": "C"}, "fraction": 0.4}]}
+    )
+    assert not matches({"formulation": [{"fraction": 1.5}]})
+    assert not matches({"steps": ["cool"]})
+
+
+def test_tenant_limitations_accepts_request():
+    """Checks that a request is accepted if one of its methods is within the
+    limitations of the tenant."""
+    tenant_limitations = TenantLimitations(
+        [
+            {
+                "quantity": "density",
+                "method": "method1",
+                "limitations": {"temperature": [{"min": 0, "max": 50}]},
+            },
+            {
+                "quantity": "density",
+                "method": "method2",
+                "limitations": {"temperature": [{"min": 100, "max": 150}]},
+            },
+        ]
+    )
+    parameters = {
+        "method1": {"temperature": 120},
+        "method2": {"temperature": 120},
+        "method3": {"temperature": 20},
+    }
+
+    assert tenant_limitations.has_capability("density", "method1")
+    assert not tenant_limitations.has_capability("viscosity", "method1")
+    assert tenant_limitations.accepts_request(
+        "density", ["method1", "method2", "method3"], parameters
+    )
+    assert not tenant_limitations.accepts_request(
+        "density", ["method1", "method2"], parameters, only_method="method1"
+    )
+    assert not tenant_limitations.accepts_request("viscosity", ["method2"], parameters)
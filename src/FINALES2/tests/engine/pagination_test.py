@@ -0,0 +1,76 @@
+import uuid
+from datetime import datetime
+
+import pytest
+
+from FINALES2.engine.pagination import (
+    decode_cursor,
+    decode_scheduler_cursor,
+    encode_cursor,
+    encode_scheduler_cursor,
+    split_page,
+)
+
+
+class TestCursor:
+    """Tests for the encoding and decoding of the pagination cursors."""
+
+    def test_roundtrip(self):
+        """Test that a decoded cursor gives back the encoded position."""
+        timestamp = datetime(2023, 5, 17, 12, 30, 15, 123456)
+        object_uuid = uuid.uuid4()
+        cursor = encode_cursor(timestamp, object_uuid)
+        assert decode_cursor(cursor) == (timestamp, object_uuid)
+
+    @pytest.mark.parametrize(
+        "cursor",
+        [
+            # Not base64 encoded
+            "garbage!",
+            # Base64 encoded, but not json
+            "Z2FyYmFnZQ==",
+            # Base64 encoded json, but without the position keys
+            "eyJhIjogMX0=",
+        ],
+    )
+    def test_invalid_cursor(self, cursor):
+        """Test that invalid cursors raise a ValueError."""
+        with pytest.raises(ValueError):
+            decode_cursor(cursor)
+
+    def test_scheduler_cursor(self):
+        """Test that a decoded scheduler cursor gives back the encoded position, and
+        that a cursor of a listing by time is not taken for one."""
+        object_uuid = uuid.uuid4()
+        cursor = encode_scheduler_cursor(-12345.678901234567, object_uuid)
+        assert decode_scheduler_cursor(cursor) == (-12345.678901234567, object_uuid)
+        with pytest.raises(ValueError):
+            decode_cursor(cursor)
+
+        cursor = encode_cursor(datetime(2023, 5, 17), object_uuid)
+        assert decode_scheduler_cursor(cursor) is None
+        with pytest.raises(ValueError):
+            decode_scheduler_cursor("garbage!")
+
+
+class TestSplitPage:
+    """Tests for the `split_page` function."""
+
+    @staticmethod
+    def position(row):
+        return row
+
+    def test_last_page(self):
+        """Test that there is no next cursor when all rows fit in the page."""
+        rows = [(datetime(2023, 5, 17), uuid.uuid4()) for _ in range(3)]
+        assert split_page(rows, 3, self.position) == (rows, None)
+        assert split_page(rows, None, self.position) == (rows, None)
+
+    def test_next_cursor(self):
+        """Test that the next cursor points to the last row of the page."""
+        rows = [
+            (datetime(2023, 5, 17, 12, second), uuid.uuid4()) for second in range(3)
+        ]
+        page, next_cursor = split_page(rows, 2, self.position)
+        assert page == rows[:2]
+        assert decode_cursor(next_cursor) == rows[1]
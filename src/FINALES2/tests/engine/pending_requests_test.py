@@ -0,0 +1,61 @@
+from FINALES2.server.schemas import Request
+
+
+def post_request(engine, tenant_uuid, temperature, priority=0):
+    """Posts a pending request for density/method1, returns its uuid."""
+    return engine.create_request(
+        Request(
+            quantity="density",
+            methods=["method1"],
+            parameters={"method1": {"temperature": temperature}},
+            tenant_uuid=tenant_uuid,
+            priority=priority,
+        )
+    )
+
+
+def page_through(engine, limit, **kwargs):
+    """Returns the uuids of the pages of the pending requests, following the cursors
+    until there is no next page."""
+    pages = []
+    cursor = None
+    while True:
+        page, cursor = engine.get_pending_requests(limit=limit, cursor=cursor, **kwargs)
+        pages.append([request_info.uuid for request_info in page])
+        if cursor is None:
+            return pages
+
+
+class TestPendingRequests:
+    """Tests for the listing of the pending requests."""
+
+    def test_pages_by_priority(self, engine, tenant_uuid):
+        """Test that a limited listing returns a cursor as long as there are more
+        requests, and that the pages keep the order of the priorities."""
+        low = [post_request(engine, tenant_uuid, 20) for _ in range(3)]
+        high = [post_request(engine, tenant_uuid, 20, priority=10) for _ in range(2)]
+
+        assert page_through(engine, 2) == [high, low[:2], low[2:]]
+        assert page_through(engine, 5) == [high + low]
+
+        # A request that is claimed in between pages is skipped
+        first_page, cursor = engine.get_pending_requests(limit=1)
+        assert [request_info.uuid for request_info in first_page] == high[:1]
+        assert engine.claim_request("density", "method1", tenant_uuid).uuid == high[0]
+        assert engine.claim_request("density", "method1", tenant_uuid).uuid == high[1]
+        next_page, _ = engine.get_pending_requests(limit=5, cursor=cursor)
+        assert [request_info.uuid for request_info in next_page] == low
+
+    def test_pages_of_tenant(self, engine, tenant_uuid):
+        """Test that the pages only have the requests within the limitations of the
+        tenant, and that the cursor is only returned if there are more of those."""
+        accepted = []
+        for temperature in (20, 80, 30, 90, 40):
+            request_uuid = post_request(engine, tenant_uuid, temperature)
+            if temperature <= 50:
+                accepted.append(request_uuid)
+
+        assert page_through(engine, 2, tenant_uuid=tenant_uuid) == [
+            accepted[:2],
+            accepted[2:],
+        ]
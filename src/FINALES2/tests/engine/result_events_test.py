@@ -0,0 +1,46 @@
+import asyncio
+
+from FINALES2.engine.events import NEW_RESULT_TOPIC, event_broker
+from FINALES2.engine.main import Engine
+from FINALES2.server import endpoints
+from FINALES2.server.schemas import Request, Result
+
+
+def test_result_events_subscription(database_context, tenant_uuid, monkeypatch):
+    """Test that the stream of result events only subscribes while it is streamed,
+    so a client that is gone before the streaming starts leaves no subscription."""
+    monkeypatch.setattr(
+        endpoints, "Engine", lambda: Engine(database_context=database_context)
+    )
+    engine = Engine(database_context=database_context)
+    request_uuid = engine.create_request(
+        Request(
+            quantity="density",
+            methods=["method1"],
+            parameters={"method1": {"temperature": 20}},
+            tenant_uuid=tenant_uuid,
+        )
+    )
+    engine.create_result(
+        Result(
+            data={"density": 1.0},
+            quantity="density",
+            method=["method1"],
+            parameters={"method1": {"temperature": 20}},
+            tenant_uuid=tenant_uuid,
+            request_uuid=request_uuid,
+        )
+    )
+
+    async def stream_result_events():
+        response = await endpoints.get_result_events(
+            http_request=None, request_ids=[request_uuid], token={}
+        )
+        assert event_broker.subscriber_count(NEW_RESULT_TOPIC) == 0
+        return [event async for event in response.body_iterator]
+
+    events = asyncio.run(stream_result_events())
+
+    assert len(events) == 1
+    assert events[0].startswith("event: result")
+    assert event_broker.subscriber_count(NEW_RESULT_TOPIC) == 0
@@ -0,0 +1,142 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from FINALES2.db import Request as DbRequest
+from FINALES2.db import StatusLogRequest as DbStatusLogRequest
+from FINALES2.engine.scheduler import RequestScheduler, request_scheduler
+from FINALES2.server.schemas import Request
+
+
+@pytest.fixture
+def scheduler(empty_database_context):
+    """Returns a scheduler for a database without pending requests."""
+    request_scheduler = RequestScheduler(
+        database_context=empty_database_context, aging_per_hour=1.0
+    )
+    request_scheduler.load()
+    return request_scheduler
+
+
+class TestRequestScheduler:
+    """Tests for the `RequestScheduler` class."""
+
+    def test_priority_and_aging(self, scheduler):
+        """Test that requests are ordered by priority plus the time waited."""
+        now = datetime.now()
+        old_low = uuid.uuid4()
+        new_high = uuid.uuid4()
+        new_low = uuid.uuid4()
+        scheduler.add(old_low, "density", ["method1"], 0, now - timedelta(hours=3))
+        scheduler.add(new_high, "density", ["method1"], 2, now)
+        scheduler.add(new_low, "density", ["method1"], 0, now)
+
+        # The request waiting for 3 hours overtakes the one with priority 2
+        assert list(scheduler.iter_pending()) == [old_low, new_high, new_low]
+
+        scheduler.remove(old_low)
+        assert list(scheduler.iter_pending()) == [new_high, new_low]
+        assert len(scheduler) == 2
+
+    def test_capabilities(self, scheduler):
+        """Test that only the requests for the given capabilities are returned, each
+        of them once."""
+        now = datetime.now()
+        both_methods = uuid.uuid4()
+        method2 = uuid.uuid4()
+        viscosity = uuid.uuid4()
+        scheduler.add(method2, "density", ["method2"], 1, now)
+        scheduler.add(both_methods, "density", ["method1", "method2"], 0, now)
+        scheduler.add(viscosity, "viscosity", ["method1"], 5, now)
+
+        assert list(scheduler.iter_pending([("density", "method1")])) == [both_methods]
+        assert list(
+            scheduler.iter_pending([("density", "method1"), ("density", "method2")])
+        ) == [method2, both_methods]
+        assert list(scheduler.iter_pending([(None, "method1")])) == [
+            viscosity,
+            both_methods,
+        ]
+
+    def test_changes_during_iteration(self, scheduler):
+        """Test that requests added and removed while iterating are taken into
+        account, without returning any request twice."""
+        now = datetime.now()
+        request_uuids = [uuid.uuid4() for _ in range(5)]
+        for index, request_uuid in enumerate(request_uuids):
+            scheduler.add(
+                request_uuid, "density", ["method1"], 0, now + timedelta(index)
+            )
+
+        returned = []
+        new_request = uuid.uuid4()
+        for request_uuid in scheduler.iter_pending():
+            returned.append(request_uuid)
+            if len(returned) == 2:
+                scheduler.remove(request_uuids[2])
+                scheduler.add(new_request, "density", ["method1"], 10, now)
+
+        assert returned == request_uuids[:2] + [new_request] + request_uuids[3:]
+
+    def test_added_again(self, scheduler):
+        """Test that the entries of a request that was removed are not taken for the
+        ones of the request when it is added again with the same sort key."""
+        now = datetime.now()
+        first, readded = uuid.uuid4(), uuid.uuid4()
+        scheduler.add(first, "density", ["method1"], 0, now - timedelta(hours=1))
+        scheduler.add(readded, "density", ["method1"], 0, now)
+        scheduler.remove(readded)
+        scheduler.add(readded, "density", ["method2"], 0, now)
+
+        assert list(scheduler.iter_pending()) == [first, readded]
+        assert list(scheduler.iter_pending([("density", "method1")])) == [first]
+        assert list(scheduler.iter_pending([("density", "method2")])) == [readded]
+
+        # Once both are removed, no entries are left in the heaps
+        scheduler.remove(first)
+        scheduler.remove(readded)
+        assert list(scheduler.iter_pending()) == []
+        assert scheduler._heap_entries == scheduler._live_heap_entries == 0
+        assert all(len(heap) == 0 for heap in scheduler._heaps.values())
+
+    def test_changes_of_other_processes(self, engine, tenant_uuid, monkeypatch):
+        """Test that the queues are rebuilt when other processes changed the pending
+        requests, even if the number of pending requests stayed the same."""
+        monkeypatch.setattr(request_scheduler, "refresh_check_interval_s", 0.0)
+        resolved_uuid, created_uuid = [
+            engine.create_request(
+                Request(
+                    quantity="density",
+                    methods=["method1"],
+                    parameters={"method1": {"temperature": 20}},
+                    tenant_uuid=tenant_uuid,
+                )
+            )
+            for _ in range(2)
+        ]
+        assert [str(i) for i in request_scheduler.iter_pending()] == [
+            resolved_uuid,
+            created_uuid,
+        ]
+
+        # Another process created the second request (so it is not known here) and
+        # resolved the first one
+        request_scheduler.remove(uuid.UUID(created_uuid))
+        with engine._database_context() as session:
+            session.execute(
+                update(DbRequest)
+                .where(DbRequest.uuid == uuid.UUID(resolved_uuid))
+                .values(status="resolved")
+            )
+            session.add(
+                DbStatusLogRequest(
+                    uuid=str(uuid.uuid4()),
+                    request_uuid=resolved_uuid,
+                    status="resolved",
+                )
+            )
+            session.commit()
+
+        assert [str(i) for i in request_scheduler.iter_pending()] == [created_uuid]
@@ -0,0 +1,49 @@
+import json
+import uuid
+
+import jsonschema
+import pytest
+
+from FINALES2.engine.schema_validators import SchemaValidatorCache
+
+
+@pytest.fixture
+def specifications():
+    """Returns the specifications of a capability as stored in the quantity table."""
+    schema = {
+        "type": "object",
+        "properties": {"temperature": {"type": "number"}},
+        "required": ["temperature"],
+    }
+    return json.dumps(schema)
+
+
+class TestSchemaValidatorCache:
+    """Tests for the `SchemaValidatorCache` class."""
+
+    def test_validator_is_compiled_once(self, specifications):
+        """Test that the same validator is reused for the same capability."""
+        cache = SchemaValidatorCache()
+        capability_uuid = uuid.uuid4()
+        validator = cache.get(capability_uuid, specifications)
+        assert cache.get(str(capability_uuid), specifications) is validator
+        assert len(cache) == 1
+
+    def test_valid_instance(self, specifications):
+        """Test that a valid instance passes the validation."""
+        cache = SchemaValidatorCache()
+        cache.validate(uuid.uuid4(), specifications, {"temperature": 300})
+
+    def test_invalid_instance(self, specifications):
+        """Test that an invalid instance raises like `jsonschema.validate`."""
+        cache = SchemaValidatorCache()
+        with pytest.raises(jsonschema.exceptions.ValidationError):
+            cache.validate(uuid.uuid4(), specifications, {"temperature": "hot"})
+
+    def test_invalidate(self, specifications):
+        """Test that invalidating the cache removes the compiled validators."""
+        cache = SchemaValidatorCache()
+        validator = cache.get(uuid.uuid4(), specifications)
+        cache.invalidate()
+        assert len(cache) == 0
+        assert cache.get(uuid.uuid4(), specifications) is not validator
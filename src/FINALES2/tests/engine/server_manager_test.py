@@ -5,7 +5,7 @@ import pytest
 from jsonref import JsonRef
 from pydantic import BaseModel
 
-from FINALES2.engine.server_manager import limitations_schema_translation
+from FINALES2.engine.server_manager import ServerManager, limitations_schema_translation
 
 
 @pytest.fixture(scope="module")
@@ -97,3 +97,37 @@ class TestLimitationsSchemaTranslation:
         limitations_schema = limitations_schema_translation(capability_schema)
         with pytest.raises(jsonschema.exceptions.ValidationError):
             jsonschema.validate(instance=limitations, schema=limitations_schema)
+
+
+class TestGetCapabilities:
+    """Tests for the `get_capabilities` method."""
+
+    def test_database_of_the_server_manager(self, empty_database_context):
+        """Test that the capabilities are read from the database of the server
+        manager, not the one of the capability registry of the server."""
+        server_manager = ServerManager(database_context=empty_database_context)
+        for method, is_active in (("method1", True), ("method2", False)):
+            server_manager.add_capability(
+                {
+                    "quantity": "density",
+                    "method": method,
+                    "json_schema_specifications": {"type": "object"},
+                    "json_schema_result_output": {},
+                    "is_active": is_active,
+                }
+            )
+        server_manager.add_tenant(
+            {
+                "name": "tenant1",
+                "contact_person": "operator",
+                "limitations": [
+                    {"quantity": "density", "method": "method1", "limitations": {}}
+                ],
+            }
+        )
+
+        capabilities = server_manager.get_capabilities(currently_available=False)
+        assert [(c.quantity, c.method) for c in capabilities] == [
+            ("density", "method1")
+        ]
+        assert server_manager.get_capabilities(quantity="viscosity") == []
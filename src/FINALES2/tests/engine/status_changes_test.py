@@ -0,0 +1,114 @@
+import pytest
+
+from FINALES2.db.status_counters import REQUEST_KIND, RESULT_KIND
+from FINALES2.engine.main import Engine, RequestStatus
+from FINALES2.server.schemas import Request, Result, StatusChange
+
+
+def post_request(engine, tenant_uuid):
+    """Posts a pending request for density/method1, returns its uuid."""
+    return engine.create_request(
+        Request(
+            quantity="density",
+            methods=["method1"],
+            parameters={"method1": {"temperature": 20}},
+            tenant_uuid=tenant_uuid,
+        )
+    )
+
+
+def compete_before_status_change(engine, monkeypatch, competing_change):
+    """Makes the engine run the competing change (once) right before it writes the
+    status of a request it already read."""
+    apply_request_status = engine._apply_request_status
+    competed = []
+
+    def apply_after_competing_change(session, original_request, status):
+        if not competed:
+            competed.append(True)
+            competing_change()
+        return apply_request_status(session, original_request, status)
+
+    monkeypatch.setattr(engine, "_apply_request_status", apply_after_competing_change)
+
+
+class TestCompetingStatusChanges:
+    """Tests for two transitions of the status of the same request at the same
+    time, where only the one written first may count."""
+
+    def test_change_status_request(
+        self, engine, database_context, tenant_uuid, monkeypatch
+    ):
+        """Test that a status change fails if the request was claimed meanwhile."""
+        request_uuid = post_request(engine, tenant_uuid)
+        competing_engine = Engine(database_context=database_context)
+        compete_before_status_change(
+            engine,
+            monkeypatch,
+            lambda: competing_engine.claim_request("density", "method1", tenant_uuid),
+        )
+
+        with pytest.raises(RuntimeError):
+            engine.change_status_request(request_uuid, RequestStatus.RETRACTED)
+
+        assert engine.get_request(request_uuid).status == RequestStatus.RESERVED.value
+        assert engine.get_status_counts()[REQUEST_KIND]["density"]["method1"] == {
+            "reserved": 1
+        }
+
+    def test_change_status_requests(
+        self, engine, database_context, tenant_uuid, monkeypatch
+    ):
+        """Test that the change of a batch fails if the request was claimed
+        meanwhile, without stopping the other changes."""
+        claimed_uuid = post_request(engine, tenant_uuid)
+        other_uuid = post_request(engine, tenant_uuid)
+        competing_engine = Engine(database_context=database_context)
+        compete_before_status_change(
+            engine,
+            monkeypatch,
+            lambda: competing_engine.claim_request("density", "method1", tenant_uuid),
+        )
+
+        outcomes = engine.change_status_requests(
+            [
+                StatusChange(uuid=claimed_uuid, new_status="retracted"),
+                StatusChange(uuid=other_uuid, new_status="retracted"),
+            ]
+        )
+
+        assert [outcome.success for outcome in outcomes] == [False, True]
+        assert engine.get_request(claimed_uuid).status == RequestStatus.RESERVED.value
+        assert engine.get_status_counts()[REQUEST_KIND]["density"]["method1"] == {
+            "reserved": 1,
+            "retracted": 1,
+        }
+
+    def test_create_result(self, engine, database_context, tenant_uuid, monkeypatch):
+        """Test that a result is not stored if its request was retracted meanwhile."""
+        request_uuid = post_request(engine, tenant_uuid)
+        competing_engine = Engine(database_context=database_context)
+        compete_before_status_change(
+            engine,
+            monkeypatch,
+            lambda: competing_engine.change_status_request(
+                request_uuid, RequestStatus.RETRACTED
+            ),
+        )
+
+        with pytest.raises(RuntimeError):
+            engine.create_result(
+                Result(
+                    data={"density": 1.0},
+                    quantity="density",
+                    method=["method1"],
+                    parameters={"method1": {"temperature": 20}},
+                    tenant_uuid=tenant_uuid,
+                    request_uuid=request_uuid,
+                )
+            )
+
+        assert engine.get_request(request_uuid).status == RequestStatus.RETRACTED.value
+        status_counts = engine.get_status_counts()
+        assert status_counts[REQUEST_KIND]["density"]["method1"] == {"retracted": 1}
+        assert "density" not in status_counts.get(RESULT_KIND, {})
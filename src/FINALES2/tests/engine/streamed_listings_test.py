@@ -0,0 +1,94 @@
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from FINALES2.server import endpoints
+from FINALES2.server.endpoints import NDJSON_MEDIA_TYPE, operations_router
+from FINALES2.server.schemas import Request, Result
+from FINALES2.user_management import user_manager
+
+
+@pytest.fixture
+def client(engine, monkeypatch):
+    """Returns a client for the endpoints, which use the engine of the test database
+    (reading the streamed rows in batches of 2) and accept any token."""
+    engine.stream_batch_size = 2
+    monkeypatch.setattr(endpoints, "Engine", lambda: engine)
+    app = FastAPI()
+    app.include_router(operations_router)
+    app.dependency_overrides[user_manager.get_active_user] = lambda: {}
+    return TestClient(app)
+
+
+def stream(client, path, **params):
+    """Returns the uuids of the objects streamed by the endpoint, one per line."""
+    response = client.get(path, params=params, headers={"Accept": NDJSON_MEDIA_TYPE})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith(NDJSON_MEDIA_TYPE)
+    # Every object is on a line of its own, terminated by a newline
+    lines = response.text.splitlines()
+    assert response.text == "".join(line + "\n" for line in lines)
+    return [json.loads(line)["uuid"] for line in lines]
+
+
+class TestStreamedListings:
+    """Tests for the listings streamed as newline delimited JSON."""
+
+    def test_all_requests(self, client, engine, tenant_uuid):
+        """Test that all requests are streamed one per line in the order of the
+        listing, and that only the ones after the cursor are streamed with one."""
+        request_uuids = engine.create_requests(
+            [
+                Request(
+                    quantity="density",
+                    methods=["method1"],
+                    parameters={"method1": {"temperature": temperature}},
+                    tenant_uuid=tenant_uuid,
+                )
+                for temperature in range(5)
+            ]
+        )
+
+        assert stream(client, "/all_requests/") == request_uuids
+
+        response = client.get("/all_requests/", params={"limit": 2})
+        assert [request["uuid"] for request in response.json()] == request_uuids[:2]
+        cursor = response.headers["X-Next-Cursor"]
+        assert stream(client, "/all_requests/", cursor=cursor, limit=1) == (
+            request_uuids[2:]
+        )
+
+    def test_all_results(self, client, engine, tenant_uuid):
+        """Test that the results are streamed one per line after the cursor."""
+        result_uuids = []
+        for temperature in range(3):
+            request_uuid = engine.create_request(
+                Request(
+                    quantity="density",
+                    methods=["method1"],
+                    parameters={"method1": {"temperature": temperature}},
+                    tenant_uuid=tenant_uuid,
+                )
+            )
+            result_uuids.append(
+                engine.create_result(
+                    Result(
+                        data={"density": 1.0},
+                        quantity="density",
+                        method=["method1"],
+                        parameters={"method1": {"temperature": temperature}},
+                        tenant_uuid=tenant_uuid,
+                        request_uuid=request_uuid,
+                    )
+                )
+            )
+
+        assert stream(client, "/results_requested/") == result_uuids
+        assert stream(client, "/results_requested/", method="method2") == []
+
+        _, cursor = engine.get_all_results(limit=1)
+        assert stream(client, "/results_requested/", cursor=cursor) == (
+            result_uuids[1:]
+        )
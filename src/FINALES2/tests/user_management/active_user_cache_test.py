@@ -0,0 +1,42 @@
+import time
+
+from FINALES2.user_management.user_manager import ActiveUserCache
+
+
+class TestActiveUserCache:
+    """Tests for the `ActiveUserCache` class."""
+
+    def test_expiration(self):
+        """Test that users are only returned until their entry or token expires."""
+        cache = ActiveUserCache(max_size=10, ttl_s=60.0)
+        cache.put("token1", {"username": "user1"}, token_expiration=None)
+        cache.put("token2", {"username": "user2"}, token_expiration=time.time() - 1)
+
+        cached_user = cache.get("token1")
+        assert cached_user == {"username": "user1"}
+        assert cache.get("token2") is None
+
+        # Changing the returned user does not change the cached one
+        cached_user["username"] = "changed"
+        assert cache.get("token1") == {"username": "user1"}
+
+        cache = ActiveUserCache(max_size=10, ttl_s=0.0)
+        cache.put("token1", {"username": "user1"}, token_expiration=None)
+        assert cache.get("token1") is None
+
+    def test_size_and_invalidation(self):
+        """Test that the least recently used tokens are dropped when the cache is full,
+        and that invalidating the cache drops all tokens."""
+        cache = ActiveUserCache(max_size=2, ttl_s=60.0)
+        cache.put("token1", {"username": "user1"}, token_expiration=None)
+        cache.put("token2", {"username": "user2"}, token_expiration=None)
+        assert cache.get("token1") is not None
+        cache.put("token3", {"username": "user3"}, token_expiration=None)
+
+        assert cache.get("token2") is None
+        assert cache.get("token1") is not None
+        assert cache.get("token3") is not None
+
+        cache.invalidate()
+        assert cache.get("token1") is None
+        assert cache.get("token3") is None
@@ -0,0 +1,124 @@
+import sqlite3
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from FINALES2.config import FinalesConfiguration
+from FINALES2.user_management import User, user_manager
+from FINALES2.user_management.user_manager import UserDB
+
+
+def test_user_db(tmp_path, monkeypatch):
+    """Checks that users are stored and found again, including the users of a user
+    database written before the usergroups were stored as JSON."""
+    # Hashing the passwords is not needed here, and slow
+    monkeypatch.setattr(user_manager, "hash_password", lambda password: password)
+    savepath = str(tmp_path / "users.db")
+
+    connection = sqlite3.connect(savepath)
+    connection.execute(
+        "CREATE TABLE users (username, uuid, password, usergroups, timestamp_added"
+        ", timestamp_lastEdited)"
+    )
+    connection.execute(
+        "INSERT INTO users VALUES ('old_user', 'b7d2b8c6-25a6-4a8b-9a63-0c7a6b2b1b1e', "
+        "'hash', \"['group1', 'group2']\", '', '')"
+    )
+    connection.commit()
+    connection.close()
+
+    user_db = UserDB(savepath=savepath)
+    assert user_db.get_single_user("old_user").usergroups == ["group1", "group2"]
+
+    user_db.add_new_user(
+        User(username="new_user", password="password", usergroups=["group3"])
+    )
+    assert user_db.get_single_user("new_user").usergroups == ["group3"]
+    assert len(user_db.get_all_users()) == 2
+
+    with pytest.raises(HTTPException) as error:
+        user_db.add_new_user(User(username="new_user", password="password"))
+    assert error.value.status_code == 409
+
+    with pytest.raises(HTTPException) as error:
+        user_db.get_single_user("unknown_user")
+    assert error.value.status_code == 404
+
+
+def use_secret_key(monkeypatch, secret_key):
+    """Sets the secret key of the configuration used by the user manager."""
+    configuration = FinalesConfiguration(secret_key=secret_key)
+    monkeypatch.setattr(user_manager, "get_configuration", lambda: configuration)
+
+
+def test_api_keys(tmp_path, monkeypatch):
+    """Checks that users are found by their API keys, which are only stored as
+    hashes."""
+    monkeypatch.setattr(user_manager, "hash_password", lambda password: password)
+    use_secret_key(monkeypatch, "secret")
+    user_db = UserDB(savepath=str(tmp_path / "users.db"))
+    user_db.add_new_user(User(username="tenant_user", password="password"))
+
+    api_key = user_db.add_api_key("tenant_user", description="instrument")
+    assert api_key.startswith(user_manager.API_KEY_PREFIX)
+    assert user_db.get_user_by_api_key(api_key).username == "tenant_user"
+
+    with user_db.engine.connect() as connection:
+        stored_hashes = connection.execute(
+            select(user_manager.api_keys_table.c.key_hash)
+        ).all()
+    assert stored_hashes == [(user_manager.hash_api_key(api_key),)]
+
+    with pytest.raises(HTTPException) as error:
+        user_db.get_user_by_api_key(api_key + "x")
+    assert error.value.status_code == 404
+
+    with pytest.raises(HTTPException) as error:
+        user_db.add_api_key("unknown_user")
+    assert error.value.status_code == 404
+
+
+def test_revoke_api_keys(tmp_path, monkeypatch):
+    """Checks that API keys are listed by their hashes and can be revoked by their
+    hash or the API key itself."""
+    monkeypatch.setattr(user_manager, "hash_password", lambda password: password)
+    use_secret_key(monkeypatch, "secret")
+    user_db = UserDB(savepath=str(tmp_path / "users.db"))
+    user_db.add_new_user(User(username="user1", password="password"))
+    user_db.add_new_user(User(username="user2", password="password"))
+    api_key1 = user_db.add_api_key("user1", description="instrument1")
+    api_key2 = user_db.add_api_key("user2", description="instrument2")
+
+    assert len(user_db.get_api_keys()) == 2
+    (listed_key,) = user_db.get_api_keys(username="user1")
+    assert listed_key["description"] == "instrument1"
+
+    user_manager.active_user_cache.put(api_key1, {"username": "user1"}, None)
+    user_db.revoke_api_key(listed_key["key_hash"])
+    assert user_manager.active_user_cache.get(api_key1) is None
+    with pytest.raises(HTTPException):
+        user_db.get_user_by_api_key(api_key1)
+
+    user_db.revoke_api_key(api_key2)
+    assert user_db.get_api_keys() == []
+    with pytest.raises(HTTPException) as error:
+        user_db.revoke_api_key(api_key2)
+    assert error.value.status_code == 404
+
+
+def test_api_keys_need_secret_key(tmp_path, monkeypatch):
+    """Checks that API keys are neither created nor accepted without a secret key."""
+    monkeypatch.setattr(user_manager, "hash_password", lambda password: password)
+    use_secret_key(monkeypatch, "secret")
+    user_db = UserDB(savepath=str(tmp_path / "users.db"))
+    user_db.add_new_user(User(username="tenant_user", password="password"))
+    api_key = user_db.add_api_key("tenant_user")
+
+    use_secret_key(monkeypatch, "")
+    with pytest.raises(ValueError):
+        user_db.add_api_key("tenant_user")
+    monkeypatch.setattr(user_manager, "UserDB", lambda: user_db)
+    with pytest.raises(HTTPException) as error:
+        user_manager.get_active_user(api_key)
+    assert error.value.status_code == 401
@@ -1,3 +1,7 @@
+from FINALES2.logging.logger import loggerConfig
+
 from .classes_user_manager import User
 
+logger = loggerConfig().get_logger()
+
 __all__ = ["User"]
@@ -1,15 +1,37 @@
+import ast
 import datetime
-import sqlite3
-from typing import Any, Optional, Union
+import hashlib
+import hmac
+import json
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Mapping, Optional, Tuple, Union
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from sqlalchemy import (
+    Column,
+    Engine,
+    Index,
+    MetaData,
+    String,
+    Table,
+    create_engine,
+    delete,
+    insert,
+    select,
+)
+from sqlalchemy.exc import IntegrityError
 
 from FINALES2.config import get_configuration
 from FINALES2.user_management.classes_user_manager import AccessToken, User
 
+from . import logger
+
 # Create a router
 user_router = APIRouter(prefix="/user_management", tags=["user_management"])
 
@@ -19,6 +41,8 @@ authentication_scheme = OAuth2PasswordBearer(
 )
 token = Depends(authentication_scheme)
 crypto_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Prefix of the API keys, which distinguishes them from the access tokens (JWT)
+API_KEY_PREFIX = "finales_"
 authentication_error = HTTPException(
     status_code=status.HTTP_401_UNAUTHORIZED,
     detail="Authentication failed. Wrong username or password.",
@@ -26,61 +50,84 @@ authentication_error = HTTPException(
 )
 
 
-# User Database
+# Cache of the active users
 
 
-class UserDB:
-    """This class provides a database object, which allows to interface an SQL user
-    database using sqlite3."""
+class ActiveUserCache:
+    """This class provides an in-process cache of the users that access tokens belong
+    to, so the token does not need to be decoded and the user does not need to be
+    queried from the user database on every request.
 
-    def __init__(self, savepath: Optional[str] = None) -> None:
-        """This function initializes a database for storing the user data.
+    The cache holds at most max_size tokens, dropping the least recently used ones. A
+    user is kept for at most ttl_s seconds and never beyond the expiration of its
+    token, so changes of users done by other processes (e.g. the command line
+    interface) are picked up after at most ttl_s seconds. Changes done by this process
+    invalidate the cache right away.
+    """
+
+    def __init__(self, max_size: int, ttl_s: float) -> None:
+        """This function initializes an empty cache.
 
         Inputs:
-        savepath: a string specifying the path, where the user database shall be stored
+        max_size: the maximum number of tokens kept in the cache
+        ttl_s: the maximum time in seconds a user is kept in the cache
 
-        Output:
-        This function has no output
+        Outputs:
+        This function has no output.
         """
-        if savepath is None:
-            config = get_configuration()
-            savepath = config.safeget_userdb()
+        self.max_size = max_size
+        self.ttl_s = ttl_s
+        # token -> (time until which the entry is valid, user)
+        self._entries: OrderedDict[str, Tuple[float, dict[str, Any]]] = OrderedDict()
+        self._lock = threading.Lock()
 
-        # Connect to this database and set the cursor
-        self.connection: sqlite3.Connection = sqlite3.connect(savepath)
-        self.connection.row_factory = sqlite3.Row
-        self.cursor: sqlite3.Cursor = self.connection.cursor()
-        self.savepath: str = savepath
+    def get(self, token: str) -> Optional[dict[str, Any]]:
+        """This function returns the cached user for a token.
 
-        # Only create the new table, if it does not already exist
-
-        # Deduce the column names from the fields in the User class (to allow for
-        # some flexibility in development; this could be hard-coded in a final
-        # version)
-        column_names = ", ".join(User().__dict__.keys())
-        # Create a table called users with the fields of user as column names
-        # plus a timestamp for when the user was added and another for when it
-        # was last edited
-        self.cursor.execute(
-            f"CREATE TABLE IF NOT EXISTS users ({column_names}, timestamp_added"
-            ", timestamp_lastEdited)"
-        )
+        Inputs:
+        token: the access token of the user
 
-    def close_connection(self) -> None:
-        """This function closes the connection to the user database.
+        Outputs:
+        user: a copy of the dictionary of the user, or None if the token is not in the
+              cache (or its entry expired)
+        """
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            valid_until, user = entry
+            if time.time() >= valid_until:
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+        # The callers get a copy, so they cannot change the cached user
+        return dict(user)
+
+    def put(
+        self, token: str, user: dict[str, Any], token_expiration: Optional[float]
+    ) -> None:
+        """This function adds the user of a token to the cache.
 
         Inputs:
-        This function takes no inputs.
+        token: the (verified) access token of the user
+        user: the dictionary of the user
+        token_expiration: the expiration time of the token as a unix timestamp (the
+                          exp claim of the token), or None if it does not expire
 
         Outputs:
         This function has no output.
         """
-
-        # Close the connection to the user database
-        self.connection.close()
-
-    def connect(self) -> None:
-        """This function connects to an existing instance of a database.
+        valid_until = time.time() + self.ttl_s
+        if token_expiration is not None:
+            valid_until = min(valid_until, token_expiration)
+        with self._lock:
+            self._entries[token] = (valid_until, dict(user))
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self) -> None:
+        """This function drops all entries of the cache, e.g. after a user changed.
 
         Inputs:
         This function takes no inputs.
@@ -88,10 +135,101 @@ class UserDB:
         Outputs:
         This function has no output.
         """
+        with self._lock:
+            self._entries.clear()
+
 
-        self.connection = sqlite3.connect(self.savepath)
-        self.connection.row_factory = sqlite3.Row
-        self.cursor = self.connection.cursor()
+active_user_cache = ActiveUserCache(
+    max_size=get_configuration().user_cache_size,
+    ttl_s=get_configuration().user_cache_ttl_s,
+)
+
+
+# User Database
+
+user_metadata = MetaData()
+
+# The columns are the fields of the User class, plus a timestamp for when the user was
+# added and another for when it was last edited
+users_table = Table(
+    "users",
+    user_metadata,
+    Column("username", String),
+    Column("uuid", String),
+    Column("password", String),
+    # JSON list of the usergroups
+    Column("usergroups", String),
+    Column("timestamp_added", String),
+    Column("timestamp_lastEdited", String),
+)
+users_username_index = Index("ix_users_username", users_table.c.username, unique=True)
+
+# The API keys of the users are only stored as keyed hashes (see hash_api_key)
+api_keys_table = Table(
+    "api_keys",
+    user_metadata,
+    Column("key_hash", String, nullable=False),
+    Column("username", String, nullable=False),
+    Column("description", String),
+    Column("timestamp_added", String),
+    Index("ix_api_keys_key_hash", "key_hash", unique=True),
+)
+
+_user_db_engines: dict[str, Engine] = {}
+_user_db_engines_lock = threading.Lock()
+
+
+def get_user_db_engine(savepath: str) -> Engine:
+    """This function returns the engine for the user database at the given path. The
+    engine (and its pool of connections) is created once per path and reused, and
+    the users table and its index are created when the engine is created.
+
+    Inputs:
+    savepath: a string specifying the path of the user database
+
+    Outputs:
+    user_db_engine: the engine connected to the user database
+    """
+    with _user_db_engines_lock:
+        user_db_engine = _user_db_engines.get(savepath)
+        if user_db_engine is None:
+            user_db_engine = create_engine(
+                f"sqlite:///{savepath}", connect_args={"check_same_thread": False}
+            )
+            # Only creates the table if it does not already exist
+            user_metadata.create_all(bind=user_db_engine)
+            # The table of user databases from before the index existed is not
+            # recreated, so the index is added separately
+            try:
+                users_username_index.create(bind=user_db_engine, checkfirst=True)
+            except IntegrityError:
+                logger.warning(
+                    f"The user database {savepath} contains several users with the "
+                    "same username, so usernames are not enforced to be unique"
+                )
+            _user_db_engines[savepath] = user_db_engine
+    return user_db_engine
+
+
+class UserDB:
+    """This class provides a database object, which allows to interface an SQL user
+    database through a pooled SQLAlchemy engine."""
+
+    def __init__(self, savepath: Optional[str] = None) -> None:
+        """This function initializes a database for storing the user data.
+
+        Inputs:
+        savepath: a string specifying the path, where the user database shall be stored
+
+        Output:
+        This function has no output
+        """
+        if savepath is None:
+            config = get_configuration()
+            savepath = config.safeget_userdb()
+
+        self.savepath: str = savepath
+        self.engine: Engine = get_user_db_engine(savepath)
 
     def add_new_user(self, user: User) -> None:
         """This function adds a new user with all its fields to the database.
@@ -105,26 +243,29 @@ class UserDB:
         This function has no output.
         """
 
-        self.connect()
-
-        # Get the dictionary of the user
-        user_dict = user.__dict__.copy()
-        # Hash the password
-        user_dict["password"] = hash_password(user.password)
-        # Assemble the tuple of keys
-        column_names = tuple(
-            list(user_dict.keys()) + ["timestamp_added", "timestamp_lastEdited"]
-        )
-        column_values = tuple(
-            [str(v) for v in user_dict.values()]
-            + [str(datetime.datetime.now()), str(datetime.datetime.now())]
-        )
+        timestamp = str(datetime.datetime.now())
+        new_row = {
+            "username": user.username,
+            "uuid": str(user.uuid),
+            # Hash the password
+            "password": hash_password(user.password),
+            "usergroups": json.dumps(user.usergroups),
+            "timestamp_added": timestamp,
+            "timestamp_lastEdited": timestamp,
+        }
         # Add the data to the user database
-        self.cursor.execute(f"INSERT INTO users{column_names} VALUES {column_values}")
-        self.connection.commit()
-        self.close_connection()
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(insert(users_table), new_row)
+        except IntegrityError:
+            raise HTTPException(
+                status_code=409,
+                detail="A user with this username already exists.",
+            )
+        # The cached users may be outdated now
+        active_user_cache.invalidate()
 
-    def user_from_row(self, row: dict) -> User:
+    def user_from_row(self, row: Mapping) -> User:
         """This function initializes a user object based on the input dictionary.
         This may be used to get a user from the result of a database query.
 
@@ -138,10 +279,10 @@ class UserDB:
               entries in the row parameter
         """
 
-        row_update = {}
+        row_update: dict[str, Any] = {}
         for key in row.keys():
             if key == "usergroups":
-                row_update["usergroups"] = eval(row["usergroups"])
+                row_update["usergroups"] = parse_usergroups(row["usergroups"])
             else:
                 row_update[key] = row[key]
 
@@ -159,23 +300,23 @@ class UserDB:
                  entries in the user database corresponding to this username
         """
 
-        self.connect()
-
         # Query all the users for this username from the user database
-        single_user = self.cursor.execute(
-            "SELECT * FROM users WHERE username=(?)", (username,)
-        )
-        row = single_user.fetchall()
+        with self.engine.connect() as connection:
+            rows = (
+                connection.execute(
+                    select(users_table).where(users_table.c.username == username)
+                )
+                .mappings()
+                .all()
+            )
         # If there is only one user with this username
-        if len(row) == 1:
+        if len(rows) == 1:
             # Create a user from the result of the query and return it
-            single_u = self.user_from_row(row[0])
-            self.close_connection()
+            single_u = self.user_from_row(rows[0])
             return single_u
-        elif len(row) > 1:
+        elif len(rows) > 1:
             # If there are more than one user with this username,
             # raise an exception
-            self.close_connection()
             raise HTTPException(
                 status_code=409,
                 detail="More than one user with this username was found.",
@@ -183,7 +324,6 @@ class UserDB:
         else:
             # If there is no user with this username,
             # raise an exception
-            self.close_connection()
             raise HTTPException(
                 status_code=404,
                 detail="No user with this username was found.",
@@ -201,22 +341,120 @@ class UserDB:
                   according to the corresponding row in the user database.
         """
 
-        self.connect()
-
         # Query the user database for all its entries
-        all_users_cursor = self.cursor.execute("SELECT * FROM users")
-        # Initialize the empty list to collect all the user objects
-        all_users = []
-        # Iterate over all the users found in the user database
-        for user in all_users_cursor.fetchall():
-            # Get the user object for the respective row
-            one_user = self.user_from_row(user)
-            # Append the user to the list of all users
-            all_users.append(one_user)
-        self.close_connection
-        # Return the list of users
+        with self.engine.connect() as connection:
+            rows = connection.execute(select(users_table)).mappings().all()
+        # Get the user object for each row and return the list of users
+        all_users = [self.user_from_row(row) for row in rows]
         return all_users
 
+    def add_api_key(self, username: str, description: str = "") -> str:
+        """This function creates a new API key for a user. Only the keyed hash of the
+        API key is saved to the database, so the API key cannot be retrieved later.
+
+        Inputs:
+        username: a string specifying the username of the user the API key belongs to
+        description: a string describing what the API key is used for (e.g. the name
+                     of the instrument using it)
+
+        Outputs:
+        api_key: a string representing the new API key
+        """
+
+        # Make sure the user exists
+        self.get_single_user(username=username)
+
+        api_key = generate_api_key()
+        new_row = {
+            "key_hash": hash_api_key(api_key),
+            "username": username,
+            "description": description,
+            "timestamp_added": str(datetime.datetime.now()),
+        }
+        with self.engine.begin() as connection:
+            connection.execute(insert(api_keys_table), new_row)
+        return api_key
+
+    def get_user_by_api_key(self, api_key: str) -> User:
+        """This function finds the user an API key belongs to.
+
+        Inputs:
+        api_key: a string representing the API key
+
+        Outputs:
+        single_u: an instance of the User class with the attributes set according to the
+                 entries in the user database for the user of the API key
+        """
+
+        # The keyed hash is looked up through the index of the api_keys table
+        with self.engine.connect() as connection:
+            rows = (
+                connection.execute(
+                    select(users_table)
+                    .join(
+                        api_keys_table,
+                        api_keys_table.c.username == users_table.c.username,
+                    )
+                    .where(api_keys_table.c.key_hash == hash_api_key(api_key))
+                )
+                .mappings()
+                .all()
+            )
+        if len(rows) != 1:
+            raise HTTPException(
+                status_code=404,
+                detail="No user with this API key was found.",
+            )
+        single_u = self.user_from_row(rows[0])
+        return single_u
+
+    def get_api_keys(self, username: Optional[str] = None) -> list[dict[str, Any]]:
+        """This function lists the API keys, or only the ones of a user. The API keys
+        themselves are not stored, so they are identified by their keyed hashes.
+
+        Inputs:
+        username: a string specifying the username of the user whose API keys are
+                  listed, or None to list the API keys of all users
+
+        Outputs:
+        api_keys: a list of dictionaries with the key_hash, username, description and
+                  timestamp_added of each API key
+        """
+
+        query_inp = select(api_keys_table).order_by(api_keys_table.c.timestamp_added)
+        if username is not None:
+            query_inp = query_inp.where(api_keys_table.c.username == username)
+        with self.engine.connect() as connection:
+            rows = connection.execute(query_inp).mappings().all()
+        return [dict(row) for row in rows]
+
+    def revoke_api_key(self, api_key: str) -> None:
+        """This function revokes an API key, so it cannot be used anymore.
+
+        Inputs:
+        api_key: a string representing either the API key or its keyed hash (as
+                 listed by get_api_keys)
+
+        Outputs:
+        This function has no output.
+        """
+
+        if api_key.startswith(API_KEY_PREFIX):
+            key_hash = hash_api_key(api_key)
+        else:
+            key_hash = api_key
+        with self.engine.begin() as connection:
+            rowcount = connection.execute(
+                delete(api_keys_table).where(api_keys_table.c.key_hash == key_hash)
+            ).rowcount
+        if rowcount == 0:
+            raise HTTPException(
+                status_code=404,
+                detail="No such API key was found.",
+            )
+        # The user of the API key may still be cached for it
+        active_user_cache.invalidate()
+
     # def removeUser():
     #     ''' This function permanently deletes a user from the database. '''
     #     pass
@@ -229,6 +467,23 @@ class UserDB:
     #     pass
 
 
+def parse_usergroups(usergroups: str) -> list[str]:
+    """This function turns the usergroups stored in the user database back into a list.
+
+    Inputs:
+    usergroups: a string with the JSON list of usergroups, or the string of a python
+                list for users added before the usergroups were stored as JSON
+
+    Outputs:
+    usergroups_list: the list of usergroups
+    """
+    try:
+        return json.loads(usergroups)
+    except json.JSONDecodeError:
+        # literal_eval only accepts literals, unlike eval
+        return ast.literal_eval(usergroups)
+
+
 def create_user(username: str, password: str, usergroups: list[str]) -> User:
     """This function creates a new user object connected to the given password and saves
     it to the database.
@@ -290,6 +545,56 @@ def new_user(username: str, password: str, usergroups: list[str]) -> str:
     return f"New user {new_user.username} created in user database."
 
 
+def new_api_key(username: str, description: str = "") -> str:
+    """This function creates a new API key for a user in a user database.
+
+    Inputs:
+    username: a string defining the username of the user
+    description: a string describing what the API key is used for
+
+    Outputs:
+    An information for the user is returned, including the API key.
+    """
+    try:
+        api_key = UserDB().add_api_key(username=username, description=description)
+    except HTTPException as e:
+        raise ValueError(f"No API key can be added for user {username}: {e.detail}")
+    return (
+        f"New API key created for user {username}. It is not stored and cannot be "
+        f"shown again:\n{api_key}"
+    )
+
+
+def all_api_keys(username: Optional[str] = None) -> list[dict[str, Any]]:
+    """This function collects the API keys saved in the user database.
+
+    Inputs:
+    username: a string specifying the username of the user whose API keys are
+              collected, or None to collect the API keys of all users
+
+    Outputs:
+    all_api_keys: a list of dictionaries comprising a dictionary for each API key,
+                  identified by its keyed hash
+    """
+    return UserDB().get_api_keys(username=username)
+
+
+def revoke_api_key(api_key: str) -> str:
+    """This function revokes an API key in a user database.
+
+    Inputs:
+    api_key: a string representing either the API key or its keyed hash
+
+    Outputs:
+    An information for the user is returned.
+    """
+    try:
+        UserDB().revoke_api_key(api_key=api_key)
+    except HTTPException as e:
+        raise ValueError(f"The API key cannot be revoked: {e.detail}")
+    return "The API key was revoked."
+
+
 # @user_router.get("/single_user")
 def single_user(username: str) -> dict[str, Any]:
     """This function fetches a single user from the user database based on its username
@@ -337,12 +642,29 @@ def get_active_user(token: str = Depends(authentication_scheme)) -> dict[str, An
 
     Inputs:
     token: a string used to extract the username from to search for the user in the
-           user database
+           user database, or an API key of the user
 
     Outputs:
     active_user: a user object created based on a query to the user database with the
                 username obtained from the token
     """
+    # Tokens which were already verified are found in the cache until they expire
+    cached_user = active_user_cache.get(token)
+    if cached_user is not None:
+        return cached_user
+
+    # API keys are accepted instead of an access token, without logging in
+    if token.startswith(API_KEY_PREFIX):
+        try:
+            active_user = UserDB().get_user_by_api_key(api_key=token).__dict__
+        except (HTTPException, ValueError):
+            # ValueError: API keys are refused while there is no secret key
+            raise authentication_error
+        # API keys do not expire, but the user is not kept longer than for the time
+        # to live of the cache
+        active_user_cache.put(token, active_user, None)
+        return active_user
+
     config = get_configuration()
     # Try to decode the token
     try:
@@ -360,6 +682,7 @@ def get_active_user(token: str = Depends(authentication_scheme)) -> dict[str, An
     # If there is a username, find the corresponding user in the user database and
     # return it
     active_user = single_user(username=active_username)
+    active_user_cache.put(token, active_user, decoded_JWT.get("exp"))
     return active_user
 
 
@@ -369,6 +692,41 @@ def get_active_user(token: str = Depends(authentication_scheme)) -> dict[str, An
 https://fastapi.tiangolo.com/tutorial/security/ """
 
 
+def generate_api_key() -> str:
+    """This function generates a new random API key.
+
+    Inputs:
+    This function takes no inputs.
+
+    Outputs:
+    api_key: a string representing the API key, starting with the API_KEY_PREFIX
+    """
+    return API_KEY_PREFIX + secrets.token_urlsafe(32)
+
+
+def hash_api_key(api_key: str) -> str:
+    """This function hashes an API key with HMAC-SHA256, keyed with the secret key of
+    the server. API keys are long random strings, so a fast keyed hash is enough to
+    protect them (unlike passwords, which need a slow hash like bcrypt). Changing the
+    secret key invalidates all API keys.
+
+    Inputs:
+    api_key: a string representing the API key
+
+    Outputs:
+    key_hash: a string representing the hex digest of the keyed hash of the API key
+    """
+    config = get_configuration()
+    # Without a secret key the hash is not keyed at all, so API keys are refused
+    if config.secret_key == "":
+        raise ValueError(
+            "API keys can only be used if a secret_key is set in the configuration."
+        )
+    return hmac.new(
+        config.secret_key.encode(), api_key.encode(), hashlib.sha256
+    ).hexdigest()
+
+
 def hash_password(password: str) -> str:
     """This function hashes a plain text password.
 